@@ -1,8 +1,8 @@
 from fastapi import APIRouter
 
-from .routers import (category_router, health_router, item_router,
-                      login_router, stock_router, stockmovement_router,
-                      user_router, warehouse_router)
+from .routers import (admin_router, category_router, health_router,
+                      item_router, login_router, metrics_router, stock_router,
+                      stockmovement_router, user_router, warehouse_router)
 
 api_router = APIRouter()
 api_router.include_router(health_router.router)
@@ -13,3 +13,5 @@ api_router.include_router(stockmovement_router.router)
 api_router.include_router(warehouse_router.router)
 api_router.include_router(login_router.router)
 api_router.include_router(user_router.router)
+api_router.include_router(admin_router.router)
+api_router.include_router(metrics_router.router)
@@ -0,0 +1,172 @@
+from typing import List, Optional
+
+from core import (async_engine, engine, get_current_user, pool_status,
+                  profile_store, read_replicas, reference_cache, settings,
+                  slow_query_log)
+from fastapi import APIRouter, Depends, HTTPException, Query
+from models import User
+from schemas import (CacheStatsModel, DatabasePoolsModel, ProfileModel,
+                     ProfileSummaryModel, SlowQueryLogModel)
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/db-pool",
+            response_model=DatabasePoolsModel,
+            response_description="Occupancy and checkout wait times of the connection pools",
+            summary="Get database pool status",
+            description="Reports checked-out and overflow connections and checkout wait times of this worker's pools.")
+async def get_db_pool_status(
+    reset: bool = Query(False, description="Reset the checkout counters after reading them"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retrieve the state of the database connection pools.
+    - Only accessible by admin users.
+    - Figures are per worker process; multiply by the number of workers to size the database side.
+    - Returns a `DatabasePoolsModel` for the async and sync engines and every read replica.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+
+    def describe(pool):
+        return {**pool_status(pool), "max_overflow": settings.DB_MAX_OVERFLOW}
+
+    replica_pools = [replica.engine.sync_engine.pool for replica in read_replicas]
+    status = {
+        "async_pool": describe(async_engine.sync_engine.pool),
+        "sync_pool": describe(engine.pool),
+        "replicas": [
+            {**describe(pool), "lag_seconds": replica.lag} for replica, pool in zip(read_replicas, replica_pools)
+        ],
+        "pgbouncer": settings.DB_PGBOUNCER,
+    }
+    if reset:
+        for pool in [async_engine.sync_engine.pool, engine.pool, *replica_pools]:
+            pool.stats.reset()
+    return status
+
+
+@router.get("/cache",
+            response_model=CacheStatsModel,
+            response_description="Size and hit/miss counters of the reference data cache",
+            summary="Get cache statistics",
+            description="Reports the size and hit/miss counters of this worker's reference data cache.")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """
+    Retrieve the statistics of the reference data cache.
+    - Only accessible by admin users.
+    - Figures are per worker process.
+    - Returns a `CacheStatsModel`.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+    return reference_cache.stats()
+
+
+@router.delete("/cache",
+               response_model=CacheStatsModel,
+               response_description="The cache statistics after clearing",
+               summary="Clear the cache",
+               description="Drops every entry of this worker's reference data cache and resets its counters.")
+async def clear_cache(current_user: User = Depends(get_current_user)):
+    """
+    Clear the reference data cache.
+    - Only accessible by admin users.
+    - Only affects the worker process handling the request.
+    - Returns the `CacheStatsModel` after clearing.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+    reference_cache.clear()
+    return reference_cache.stats()
+
+
+def describe_slow_query_log(entries):
+    return {
+        "enabled": settings.SLOW_QUERY_LOG_ENABLED,
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "analyze_sample_rate": settings.SLOW_QUERY_ANALYZE_SAMPLE_RATE,
+        "maxsize": slow_query_log.maxsize,
+        "entries": entries,
+    }
+
+
+@router.get("/slow-queries",
+            response_model=SlowQueryLogModel,
+            response_description="The logged slow statements with their plans",
+            summary="Get slow queries",
+            description="Lists the statements of this worker that took longer than the slow query threshold, "
+                        "newest first, with their route, parameter count and captured EXPLAIN plan.")
+async def get_slow_queries(
+    route: Optional[str] = Query(None, description="Only statements of this route, e.g. 'POST /stock/movement/add'"),
+    min_duration_ms: float = Query(0.0, ge=0, description="Only statements that took at least this long"),
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of statements to return"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retrieve the slow query log.
+    - Only accessible by admin users.
+    - Figures are per worker process.
+    - Returns a `SlowQueryLogModel` with the matching statements, newest first.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+    return describe_slow_query_log(slow_query_log.entries(route, min_duration_ms, limit))
+
+
+@router.delete("/slow-queries",
+               response_model=SlowQueryLogModel,
+               response_description="The slow query log after clearing",
+               summary="Clear the slow query log",
+               description="Drops every statement of this worker's slow query log.")
+async def clear_slow_queries(current_user: User = Depends(get_current_user)):
+    """
+    Clear the slow query log.
+    - Only accessible by admin users.
+    - Only affects the worker process handling the request.
+    - Returns the empty `SlowQueryLogModel`.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+    slow_query_log.clear()
+    return describe_slow_query_log([])
+
+
+@router.get("/profiles",
+            response_model=List[ProfileSummaryModel],
+            response_description="The profiled requests kept by this worker",
+            summary="List request profiles",
+            description="Lists the requests this worker profiled because an admin sent them with `?profile=1` or an "
+                        "`X-Profile: 1` header, newest first. Profiling must be enabled with `PROFILING_ENABLED`.")
+async def get_profiles(current_user: User = Depends(get_current_user)):
+    """
+    Retrieve the profiled requests.
+    - Only accessible by admin users.
+    - Profiles are kept per worker process; the oldest are dropped after `PROFILE_LOG_SIZE`.
+    - Returns a list of `ProfileSummaryModel`, newest first.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+    return profile_store.profiles()
+
+
+@router.get("/profiles/{profile_id}",
+            response_model=ProfileModel,
+            response_description="The profile of the request",
+            summary="Get a request profile",
+            description="Fetches the call tree, busiest functions and SQL statements of a profiled request, by the id "
+                        "returned in its `X-Profile-Id` header.")
+async def get_profile(profile_id: int, current_user: User = Depends(get_current_user)):
+    """
+    Retrieve the profile of one request.
+    - Only accessible by admin users.
+    - Must be sent to the worker that profiled the request.
+    - Returns a `ProfileModel`.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return profile
@@ -1,20 +1,28 @@
-from typing import List
+from typing import List, Optional
 
-from models import Category, Item, User
-from core import get_db, get_current_user
-from fastapi import APIRouter, Depends, HTTPException
+from models import Category, Item, User, item_loader_options
+from core import (PageParams, Paginator, cached, conditional_get,
+                  get_current_user, get_db, get_read_db, reference_cache,
+                  validate_rows)
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from schemas import CategoryBase, CategoryModel, ItemModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
+categories_versions = conditional_get("categories")
+category_items_versions = conditional_get("items", "categories")
+
+categories_paginator = Paginator(Category.id, {"id": Category.id, "name": Category.name})
+
 
 @router.post("/add",
              response_model=CategoryModel,
              response_description="The created category",
              summary="Create a new category",
              description="Creates a new category and returns the created category.")
-async def create_category(category: CategoryBase, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_category(category: CategoryBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Create a new category.
     - Accepts category data in the form of `CategoryBase`.
@@ -24,8 +32,8 @@ async def create_category(category: CategoryBase, db: Session = Depends(get_db),
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
     new_category = Category(**category.model_dump())
     db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
+    await db.commit()
+    reference_cache.invalidate("categories")
     return new_category
 
 
@@ -33,13 +41,31 @@ async def create_category(category: CategoryBase, db: Session = Depends(get_db),
             response_model=List[CategoryModel],
             response_description="A list of all categories",
             summary="Get all categories",
-            description="Fetches a list of all categories.")
-async def get_categories(db: Session = Depends(get_db)):
+            description="Fetches a list of all categories, optionally filtered, sorted and paginated.")
+async def get_categories(
+    response: Response,
+    name: Optional[str] = Query(None, description="Only categories whose name contains this text"),
+    page: PageParams = Depends(),
+    versions: tuple = categories_versions,
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all categories in the system.
+    - Can be filtered by name and sorted by `id` or `name`.
+    - Pass `limit` to paginate; the next page's cursor is in the `X-Next-Cursor` header.
+    - Served from the reference data cache when possible.
     - Returns a list of `CategoryModel` representing all categories.
     """
-    return db.query(Category).all()
+    async def load():
+        query = select(Category)
+        if name:
+            query = query.where(Category.name.icontains(name, autoescape=True))
+        categories = await categories_paginator.paginate(db, query, page, response)
+        return validate_rows(CategoryModel, categories)
+
+    return await cached(
+        "categories", ("list", name, page.cache_key(), versions), List[CategoryModel], load, response
+    )
 
 
 @router.get("/get/{category_id}",
@@ -47,16 +73,20 @@ async def get_categories(db: Session = Depends(get_db)):
             response_description="The requested category",
             summary="Get a specific category",
             description="Fetches a single category by its ID.")
-async def get_category(category_id: int, db: Session = Depends(get_db)):
+async def get_category(category_id: int, response: Response, versions: tuple = categories_versions, db: AsyncSession = Depends(get_read_db)):
     """
     Retrieve a specific category by its ID.
     - If the category with the specified ID doesn't exist, raises a 404 error.
+    - Served from the reference data cache when possible.
     - Returns the `CategoryModel` for the requested category.
     """
-    category = db.query(Category).filter(Category.id == category_id).one_or_none()
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found.")
-    return category
+    async def load():
+        category = await db.get(Category, category_id)
+        if not category:
+            raise HTTPException(status_code=404, detail="Category not found.")
+        return CategoryModel.model_validate(category)
+
+    return await cached("categories", ("get", category_id, versions), CategoryModel, load, response)
 
 
 @router.patch("/{category_id}",
@@ -64,7 +94,7 @@ async def get_category(category_id: int, db: Session = Depends(get_db)):
               response_description="The updated category",
               summary="Update an existing category",
               description="Updates a category's details and returns the updated category.")
-async def update_category(category_id: int, category: CategoryBase, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_category(category_id: int, category: CategoryBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Update an existing category by its ID.
     - Accepts a partial update in the form of `CategoryBase`.
@@ -72,13 +102,14 @@ async def update_category(category_id: int, category: CategoryBase, db: Session
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
-    category_to_update = db.query(Category).filter(Category.id == category_id).one_or_none()
+    category_to_update = await db.get(Category, category_id)
     if not category_to_update:
         raise HTTPException(status_code=404, detail="Category not found.")
     for key, value in category.model_dump(exclude_unset=True).items():
         setattr(category_to_update, key, value)
-    db.commit()
-    db.refresh(category_to_update)
+    await db.commit()
+    # Items embed their category, so cached items are stale as well.
+    reference_cache.invalidate("categories", "items")
     return category_to_update
 
 
@@ -87,13 +118,22 @@ async def update_category(category_id: int, category: CategoryBase, db: Session
             response_description="List of items in the category",
             summary="Get items in a category",
             description="Fetches all items that belong to a specific category.")
-async def get_category_items(category_id: int, db: Session = Depends(get_db)):
+async def get_category_items(category_id: int, response: Response, versions: tuple = category_items_versions, db: AsyncSession = Depends(get_read_db)):
     """
     Retrieve all items under a specific category.
+    - Served from the reference data cache when possible.
     - Returns a list of `ItemModel` objects associated with the given category.
     """
-    category = db.query(Category).filter(Category.id == category_id).one_or_none()
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found.")
-    items = db.query(Item).filter(Item.category_id == category_id).all()
-    return items
\ No newline at end of file
+    async def load():
+        category = await db.get(Category, category_id)
+        if not category:
+            raise HTTPException(status_code=404, detail="Category not found.")
+        items = await db.scalars(
+            select(Item).options(*item_loader_options).where(Item.category_id == category_id)
+        )
+        return validate_rows(ItemModel, items)
+
+    # Cached with the items, which change far more often than the category.
+    return await cached(
+        "items", ("category", category_id, versions), List[ItemModel], load, response
+    )
\ No newline at end of file
@@ -1,20 +1,28 @@
-from typing import List
+from typing import List, Optional
 
-from models import Category, Item, User
-from core import get_db, get_current_user
-from fastapi import APIRouter, Depends, HTTPException
+from models import Category, Item, User, item_loader_options
+from core import (PageParams, Paginator, cached, conditional_get,
+                  get_current_user, get_db, get_read_db, reference_cache,
+                  validate_rows)
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from schemas import ItemBase, ItemModel, ItemUpdate
-from sqlalchemy.orm import Session
+from services import move_item_rollup
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/items", tags=["Items"])
 
+items_versions = conditional_get("items", "categories")
+
+items_paginator = Paginator(Item.id, {"id": Item.id, "name": Item.name})
+
 
 @router.post("/add",
              response_model=ItemModel,
              response_description="The created item",
              summary="Create a new item",
              description="Creates a new item, ensuring the category exists, and returns the created item.")
-async def create_item(item: ItemBase, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_item(item: ItemBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Create a new item.
     - Ensures that the specified category exists.
@@ -23,15 +31,16 @@ async def create_item(item: ItemBase, db: Session = Depends(get_db), current_use
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
     
-    category = db.query(Category).filter(Category.id == item.category_id).one_or_none()
+    category = await db.get(Category, item.category_id)
 
     if not category:
         raise HTTPException(status_code=404, detail="Category not found.")
 
     new_item = Item(**item.model_dump())
     db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
+    await db.commit()
+    reference_cache.invalidate("items")
+    await db.refresh(new_item, ["category"])
     return new_item
 
 
@@ -39,13 +48,34 @@ async def create_item(item: ItemBase, db: Session = Depends(get_db), current_use
             response_model=List[ItemModel],
             response_description="A list of all items",
             summary="Get all items",
-            description="Fetches a list of all items in the system.")
-async def get_items(db: Session = Depends(get_db)):
+            description="Fetches a list of all items in the system, optionally filtered, sorted and paginated.")
+async def get_items(
+    response: Response,
+    name: Optional[str] = Query(None, description="Only items whose name contains this text"),
+    category_id: Optional[int] = Query(None, ge=1, description="Only items in this category"),
+    page: PageParams = Depends(),
+    versions: tuple = items_versions,
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all items.
+    - Can be filtered by name and category, and sorted by `id` or `name`.
+    - Pass `limit` to paginate; the next page's cursor is in the `X-Next-Cursor` header.
+    - Served from the reference data cache when possible.
     - Returns a list of all items in the system, represented by `ItemModel`.
     """
-    return db.query(Item).all()
+    async def load():
+        query = select(Item).options(*item_loader_options)
+        if name:
+            query = query.where(Item.name.icontains(name, autoescape=True))
+        if category_id:
+            query = query.where(Item.category_id == category_id)
+        items = await items_paginator.paginate(db, query, page, response)
+        return validate_rows(ItemModel, items)
+
+    return await cached(
+        "items", ("list", name, category_id, page.cache_key(), versions), List[ItemModel], load, response
+    )
 
 
 @router.get("/get/{item_id}",
@@ -53,18 +83,22 @@ async def get_items(db: Session = Depends(get_db)):
             response_description="The requested item",
             summary="Get a specific item",
             description="Fetches a single item by its ID.")
-async def get_item(item_id: int, db: Session = Depends(get_db)):
+async def get_item(item_id: int, response: Response, versions: tuple = items_versions, db: AsyncSession = Depends(get_read_db)):
     """
     Retrieve a specific item by its ID.
     - If the item with the specified ID doesn't exist, raises a 404 error.
+    - Served from the reference data cache when possible.
     - Returns the `ItemModel` for the requested item.
     """
-    item = db.query(Item).filter(Item.id == item_id).first()
+    async def load():
+        item = await db.get(Item, item_id, options=item_loader_options)
 
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found.")
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found.")
+
+        return ItemModel.model_validate(item)
 
-    return item
+    return await cached("items", ("get", item_id, versions), ItemModel, load, response)
 
 
 @router.patch("/update/{item_id}",
@@ -72,23 +106,28 @@ async def get_item(item_id: int, db: Session = Depends(get_db)):
               response_description="The updated item",
               summary="Update an existing item",
               description="Updates an existing item's details and returns the updated item.")
-async def update_item(item_id: int, item: ItemUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_item(item_id: int, item: ItemUpdate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Update an existing item by its ID.
     - Accepts partial updates in the form of `ItemUpdate`.
+    - Moving the item to another category moves its stock totals to that category's rollup.
     - Returns the updated `ItemModel`.
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
     
-    item_to_update = db.query(Item).filter(Item.id == item_id).one_or_none()
+    item_to_update = await db.get(Item, item_id)
     if not item_to_update:
         raise HTTPException(status_code=404, detail="Item not found.")
 
+    old_category_id = item_to_update.category_id
     for key, value in item.model_dump(exclude_unset=True).items():
         setattr(item_to_update, key, value)
-    db.commit()
-    db.refresh(item_to_update)
+    if item_to_update.category_id != old_category_id:
+        await db.run_sync(move_item_rollup, item_id, old_category_id, item_to_update.category_id)
+    await db.commit()
+    reference_cache.invalidate("items")
+    await db.refresh(item_to_update, ["category"])
     return item_to_update
 
 
@@ -96,7 +135,7 @@ async def update_item(item_id: int, item: ItemUpdate, db: Session = Depends(get_
                response_description="Item deletion status",
                summary="Delete an item",
                description="Deletes an item by its ID and returns a deletion message.")
-async def delete_item(item_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Delete an item by its ID.
     - If the item doesn't exist, raises a 404 error.
@@ -106,9 +145,10 @@ async def delete_item(item_id: int, db: Session = Depends(get_db), current_user:
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
     
-    item = db.query(Item).filter(Item.id == item_id).one_or_none()
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found.")
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await db.commit()
+    reference_cache.invalidate("items")
     return {"message": f"Item {item_id} deleted successfully."}
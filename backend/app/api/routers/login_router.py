@@ -1,8 +1,9 @@
-from core import create_access_token, get_db, verify_password
+from core import create_access_token, get_db, verify_password_async
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from models import User
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/login", tags=["Login"])
 
@@ -11,15 +12,25 @@ router = APIRouter(prefix="/login", tags=["Login"])
              response_description="Login response with access token",
              summary="User login",
              description="Authenticates a user and returns an access token.")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Authenticate a user and return an access token.
-    - Validates the username and password.
+    - Validates the username and password, off the event loop.
+    - Rehashes the password if it was hashed with another bcrypt cost.
     - Returns a JWT access token if authentication is successful.
     """
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.username == form_data.username).limit(1))
+    if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    # Return the connection to the pool while the password is checked
+    await db.commit()
+    valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        # Stored with an outdated bcrypt cost; upgrade it while the plain password is at hand
+        user.hashed_password = new_hash
+        await db.commit()
 
     token = create_access_token({"sub": user.username, "role": user.role})
     return {"access_token": token, "token_type": "bearer"}
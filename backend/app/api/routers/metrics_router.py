@@ -0,0 +1,23 @@
+from core import METRICS_MEDIA_TYPE, http_metrics, settings
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("",
+            response_class=PlainTextResponse,
+            response_description="Request, latency and SQL metrics in the Prometheus text format",
+            summary="Get metrics",
+            description="Exposes request counts, latency histograms, in-flight requests and SQL statement counts and "
+                        "times per route template of this worker process, for Prometheus to scrape.")
+async def get_metrics():
+    """
+    Retrieve the metrics of this worker process.
+    - Not authenticated, as scrapers don't log in; keep the path off the public network.
+    - Figures are per worker process and since it started.
+    - Returns the metrics in the Prometheus text exposition format.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(content=http_metrics.render(), media_type=METRICS_MEDIA_TYPE)
@@ -1,60 +1,284 @@
-from typing import List
+from datetime import date
+from typing import List, Optional
 
-from core import get_db
-from fastapi import APIRouter, Depends, HTTPException
-from models import Item, Stock, Warehouse
-from schemas import StockModel
-from sqlalchemy.orm import Session
+from core import (FieldSelection, Fieldset, PageParams, Paginator,
+                  conditional_get, get_current_user, get_db, get_read_db)
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from models import Item, Stock, User, Warehouse, stock_expansions
+from schemas import (CostOfGoodsSoldModel, StockAsOfModel, StockModel,
+                     StockSummaryModel, StockValuationModel)
+from services import (EXPORT_MEDIA_TYPES, check_export_format,
+                      cost_of_goods_sold, latest_snapshot_query,
+                      stock_as_of_query, stock_export_query,
+                      stock_summary_query, stock_valuation, stream_export)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/stock", tags=["Stock"])
 
+stock_versions = conditional_get("stock", "items", "categories", "warehouses")
+stock_as_of_versions = conditional_get("stock_movements", "stock_snapshots", "stock_snapshot_runs")
+stock_value_versions = conditional_get("stock", "stock_movements", "items", authenticated=True)
+item_summary_versions = conditional_get("stock_item_rollups", "items", authenticated=True)
+warehouse_summary_versions = conditional_get("stock_warehouse_rollups", "warehouses", authenticated=True)
+category_summary_versions = conditional_get("stock_category_rollups", "categories", authenticated=True)
+
+stock_fieldset = Fieldset(
+    Stock, StockModel, stock_expansions,
+    always_load=[Stock.id, Stock.item_id, Stock.warehouse_id, Stock.stock_level],
+)
+
+stock_paginator = Paginator(
+    Stock.id,
+    {"id": Stock.id, "item_id": Stock.item_id, "warehouse_id": Stock.warehouse_id, "stock_level": Stock.stock_level},
+)
+
 
 @router.get("/get",
             response_model=List[StockModel],
             response_description="A list of all stock items",
             summary="Get all stock",
-            description="Fetches a list of all stock items across all warehouses.")
-async def get_stock(db: Session = Depends(get_db)):
+            description="Fetches a list of all stock items across all warehouses, optionally filtered, sorted and paginated.",
+            dependencies=[stock_versions])
+async def get_stock(
+    response: Response,
+    item_id: Optional[int] = Query(None, ge=1, description="Only stock of this item"),
+    warehouse_id: Optional[int] = Query(None, ge=1, description="Only stock in this warehouse"),
+    min_level: Optional[int] = Query(None, description="Only stock levels of at least this quantity"),
+    page: PageParams = Depends(),
+    selection: FieldSelection = Depends(stock_fieldset),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all stock items.
+    - Can be filtered by item, warehouse and minimum level, and sorted by `id`, `item_id`,
+      `warehouse_id` or `stock_level`.
+    - Pass `limit` to paginate; the next page's cursor is in the `X-Next-Cursor` header.
+    - Items and warehouses are returned by id; pass `expand=item,warehouse` to embed them
+      and `fields=` to return only some fields.
     - Returns a list of `StockModel` representing all stock items.
     """
-    return db.query(Stock).all()
+    query = select(Stock).options(*selection.options)
+    if item_id:
+        query = query.where(Stock.item_id == item_id)
+    if warehouse_id:
+        query = query.where(Stock.warehouse_id == warehouse_id)
+    if min_level is not None:
+        query = query.where(Stock.stock_level >= min_level)
+    return selection.render(await stock_paginator.paginate(db, query, page, response), response)
 
 
 @router.get("/get/item/{item_id}",
             response_model=List[StockModel],
             response_description="List of stock for the specified item",
             summary="Get stock for a specific item",
-            description="Fetches all stock records associated with a specific item.")
-async def get_stock_for_item(item_id: int, db: Session = Depends(get_db)):
+            description="Fetches all stock records associated with a specific item.",
+            dependencies=[stock_versions])
+async def get_stock_for_item(
+    item_id: int,
+    response: Response,
+    selection: FieldSelection = Depends(stock_fieldset),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all stock records for a specific item.
+    - Supports `fields=` and `expand=` like `/stock/get`.
     - Returns a list of `StockModel` for the specified item.
     """
-    item = db.query(Item).filter(Item.id == item_id).one_or_none()
+    item = await db.get(Item, item_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found.")
 
-    stock = db.query(Stock).filter(Stock.item_id == item_id).all()
-    return stock
+    stock = await db.scalars(select(Stock).options(*selection.options).where(Stock.item_id == item_id))
+    return selection.render(stock.all(), response)
 
 
 @router.get("/get/warehouse/{warehouse_id}",
             response_model=List[StockModel],
             response_description="List of stock for the specified warehouse",
             summary="Get stock for a specific warehouse",
-            description="Fetches all stock records associated with a specific warehouse.")
-async def get_stock_for_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
+            description="Fetches all stock records associated with a specific warehouse.",
+            dependencies=[stock_versions])
+async def get_stock_for_warehouse(
+    warehouse_id: int,
+    response: Response,
+    selection: FieldSelection = Depends(stock_fieldset),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all stock records for a specific warehouse.
+    - Supports `fields=` and `expand=` like `/stock/get`.
     - Returns a list of `StockModel` for the specified warehouse.
     """
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).one_or_none()
+    warehouse = await db.get(Warehouse, warehouse_id)
 
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found.")
 
-    stock = db.query(Stock).filter(Stock.warehouse_id == warehouse_id).all()
-    return stock
+    stock = await db.scalars(select(Stock).options(*selection.options).where(Stock.warehouse_id == warehouse_id))
+    return selection.render(stock.all(), response)
+
+
+@router.get("/as-of",
+            response_model=StockAsOfModel,
+            response_description="The stock levels at the end of the given date",
+            summary="Get stock as of a date",
+            description="Computes the stock levels at the end of a past date from the nearest earlier daily snapshot.",
+            dependencies=[stock_as_of_versions])
+async def get_stock_as_of(
+    as_of: date = Query(..., alias="date", description="The date to report stock levels for"),
+    item_id: Optional[int] = Query(None, ge=1, description="Only stock of this item"),
+    warehouse_id: Optional[int] = Query(None, ge=1, description="Only stock in this warehouse"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Retrieve the stock levels at the end of a date.
+    - Starts from the latest snapshot on or before the date and applies only the movements
+      dated after it, so the cost depends on the gap, not on the length of the ledger.
+    - Replays the ledger from the start for dates before the first snapshot.
+    - Levels of zero are left out.
+    - Returns a `StockAsOfModel` naming the snapshot that was used.
+    """
+    snapshot_date = await db.scalar(latest_snapshot_query(as_of))
+    rows = await db.execute(stock_as_of_query(as_of, snapshot_date, item_id, warehouse_id))
+    return {"as_of": as_of, "snapshot_date": snapshot_date, "stock": rows.mappings().all()}
+
+
+@router.get("/valuation",
+            response_model=StockValuationModel,
+            response_description="The units on hand and their value at FIFO cost",
+            summary="Get the stock valuation",
+            description="Values the stock on hand at FIFO cost, per item, warehouse or category.",
+            dependencies=[stock_value_versions])
+async def get_stock_valuation(
+    group_by: str = Query("item", description="One of item, warehouse or category"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Value the stock on hand.
+    - Each unit is valued at the price of the open inflow lot it remains in.
+    - Figures are cached per item and warehouse until a movement touches them, so only
+      changed keys are recomputed.
+    - Returns a `StockValuationModel` with a group per item, warehouse or category.
+    """
+    return await db.run_sync(stock_valuation, group_by)
+
+
+@router.get("/cogs",
+            response_model=CostOfGoodsSoldModel,
+            response_description="The units shipped over the period and their FIFO cost",
+            summary="Get the cost of goods sold",
+            description="Computes the FIFO cost of the outflows between two dates, per item, warehouse or category.",
+            dependencies=[stock_value_versions])
+async def get_cost_of_goods_sold(
+    date_from: date = Query(..., alias="from", description="The first day of the period"),
+    date_to: date = Query(..., alias="to", description="The last day of the period"),
+    group_by: str = Query("item", description="One of item, warehouse or category"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Compute the cost of goods sold over a period.
+    - Outflows dated from `from` to `to`, inclusive, are costed at the prices of the
+      inflow lots they consumed in FIFO order.
+    - Figures are cached per period, item and warehouse until a movement touches them.
+    - Returns a `CostOfGoodsSoldModel` with a group per item, warehouse or category.
+    """
+    return await db.run_sync(cost_of_goods_sold, date_from, date_to, group_by)
+
+
+async def _stock_summary(db: AsyncSession, group_by: str, group_id: int, not_found: str) -> dict:
+    row = (await db.execute(stock_summary_query(group_by, group_id))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail=not_found)
+    return {"group_by": group_by, "id": row.id, "quantity": row.quantity, "value": row.value}
+
+
+@router.get("/summary/item/{item_id}",
+            response_model=StockSummaryModel,
+            response_description="The units of the item on hand and their value",
+            summary="Get the stock summary of an item",
+            description="Reads the units of an item on hand across all warehouses, and their FIFO value, from its rollup.",
+            dependencies=[item_summary_versions])
+async def get_item_stock_summary(
+    item_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retrieve the stock totals of an item.
+    - Read from a rollup kept up to date by every movement, so the cost does not depend on
+      the number of warehouses.
+    - If the item doesn't exist, raises a 404 error.
+    - Returns a `StockSummaryModel`.
+    """
+    return await _stock_summary(db, "item", item_id, "Item not found.")
+
+
+@router.get("/summary/warehouse/{warehouse_id}",
+            response_model=StockSummaryModel,
+            response_description="The units on hand in the warehouse and their value",
+            summary="Get the stock summary of a warehouse",
+            description="Reads the units on hand in a warehouse across all items, and their FIFO value, from its rollup.",
+            dependencies=[warehouse_summary_versions])
+async def get_warehouse_stock_summary(
+    warehouse_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retrieve the stock totals of a warehouse.
+    - Read from a rollup kept up to date by every movement, so the cost does not depend on
+      the number of items.
+    - If the warehouse doesn't exist, raises a 404 error.
+    - Returns a `StockSummaryModel`.
+    """
+    return await _stock_summary(db, "warehouse", warehouse_id, "Warehouse not found.")
+
+
+@router.get("/summary/category/{category_id}",
+            response_model=StockSummaryModel,
+            response_description="The units of the category's items on hand and their value",
+            summary="Get the stock summary of a category",
+            description="Reads the units on hand of the items of a category, and their FIFO value, from its rollup.",
+            dependencies=[category_summary_versions])
+async def get_category_stock_summary(
+    category_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retrieve the stock totals of a category.
+    - Read from a rollup kept up to date by every movement and by moving items between
+      categories, so the cost does not depend on the number of items or warehouses.
+    - If the category doesn't exist, raises a 404 error.
+    - Returns a `StockSummaryModel`.
+    """
+    return await _stock_summary(db, "category", category_id, "Category not found.")
+
+
+@router.get("/export",
+            response_class=StreamingResponse,
+            response_description="The matching stock levels as a CSV, NDJSON or Parquet file",
+            summary="Export stock",
+            description="Streams stock levels, optionally filtered by item and warehouse, as a file download.")
+async def export_stock(
+    file_format: str = Query("csv", alias="format", description="One of csv, ndjson or parquet"),
+    item_id: Optional[int] = Query(None, ge=1, description="Only stock of this item"),
+    warehouse_id: Optional[int] = Query(None, ge=1, description="Only stock in this warehouse"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export stock levels as a file.
+    - Rows are read with a server-side cursor and written out batch by batch.
+    - Returns a streamed CSV, NDJSON or Parquet download.
+    """
+    check_export_format(file_format)
+    return StreamingResponse(
+        stream_export(stock_export_query(item_id, warehouse_id), file_format),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="stock.{file_format}"'},
+    )
@@ -1,41 +1,136 @@
-from typing import List
-
-from core import get_db, get_current_user
-from fastapi import APIRouter, Depends, HTTPException
-from models import Item, Stock, StockMovement, Warehouse, User
-from schemas import StockMovementBase, StockMovementModel
+import io
+import logging
+from datetime import date
+from typing import List, Optional
+
+from core import (FieldSelection, Fieldset, PageParams, Paginator,
+                  conditional_get, get_current_user, get_db, get_read_db,
+                  get_sync_db)
+from fastapi import (APIRouter, Depends, File, HTTPException, Query, Response,
+                     UploadFile)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from models import (Item, StockMovement, User, Warehouse,
+                    stock_movement_expansions, stock_movement_loader_options)
+from schemas import (StockMovementBase, StockMovementBulkCreate,
+                     StockMovementBulkResult, StockMovementImportSummary,
+                     StockMovementModel, StockMovementReversalModel)
+from services import (EXPORT_MEDIA_TYPES, IMPORT_FORMATS, check_export_format,
+                      import_format_for, import_stock_movements,
+                      record_movement, record_movements_bulk,
+                      reverse_movement, stock_movement_export_query,
+                      stream_export)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+logger = logging.getLogger("uvicorn")
+
 router = APIRouter(prefix="/stock/movement", tags=["Stock Movement"])
 
+stock_movements_versions = conditional_get("stock_movements", "items", "categories", "warehouses")
+
+stock_movements_fieldset = Fieldset(
+    StockMovement, StockMovementModel, stock_movement_expansions,
+    always_load=[StockMovement.id, StockMovement.item_id, StockMovement.warehouse_id,
+                 StockMovement.movement_date, StockMovement.quantity],
+)
+
+stock_movements_paginator = Paginator(
+    StockMovement.id,
+    {"id": StockMovement.id, "movement_date": StockMovement.movement_date, "quantity": StockMovement.quantity},
+)
+
 
 @router.get("/get",
             response_model=List[StockMovementModel],
             response_description="A list of all stock movements",
             summary="Get all stock movements",
-            description="Fetches a list of all stock movements.")
-async def get_stock_movements(db: Session = Depends(get_db)):
+            description="Fetches a list of all stock movements, optionally filtered, sorted and paginated.",
+            dependencies=[stock_movements_versions])
+async def get_stock_movements(
+    response: Response,
+    item_id: Optional[int] = Query(None, ge=1, description="Only movements of this item"),
+    warehouse_id: Optional[int] = Query(None, ge=1, description="Only movements in this warehouse"),
+    movement_type: Optional[str] = Query(None, description="Only movements of this type (inflow or outflow)"),
+    date_from: Optional[date] = Query(None, description="Only movements on or after this date"),
+    date_to: Optional[date] = Query(None, description="Only movements on or before this date"),
+    page: PageParams = Depends(),
+    selection: FieldSelection = Depends(stock_movements_fieldset),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all stock movements.
+    - Can be filtered by item, warehouse, type and date range, and sorted by `id`,
+      `movement_date` or `quantity`.
+    - Pass `limit` to paginate; the next page's cursor is in the `X-Next-Cursor` header.
+    - Items and warehouses are returned by id; pass `expand=item,warehouse` to embed them
+      and `fields=` to return only some fields.
     - Returns a list of `StockMovementModel` representing all stock movements.
     """
-    return db.query(StockMovement).all()
+    query = select(StockMovement).options(*selection.options)
+    if item_id:
+        query = query.where(StockMovement.item_id == item_id)
+    if warehouse_id:
+        query = query.where(StockMovement.warehouse_id == warehouse_id)
+    if movement_type:
+        query = query.where(StockMovement.movement_type == movement_type)
+    if date_from:
+        query = query.where(StockMovement.movement_date >= date_from)
+    if date_to:
+        query = query.where(StockMovement.movement_date <= date_to)
+    return selection.render(await stock_movements_paginator.paginate(db, query, page, response), response)
+
+@router.get("/export",
+            response_class=StreamingResponse,
+            response_description="The matching stock movements as a CSV, NDJSON or Parquet file",
+            summary="Export stock movements",
+            description="Streams stock movements, optionally filtered by date, item and warehouse, as a file download.")
+async def export_stock_movements(
+    file_format: str = Query("csv", alias="format", description="One of csv, ndjson or parquet"),
+    date_from: Optional[date] = Query(None, description="Only movements on or after this date"),
+    date_to: Optional[date] = Query(None, description="Only movements on or before this date"),
+    item_id: Optional[int] = Query(None, ge=1, description="Only movements of this item"),
+    warehouse_id: Optional[int] = Query(None, ge=1, description="Only movements in this warehouse"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export stock movements as a file.
+    - Rows are read with a server-side cursor and written out batch by batch,
+      so exports of any size use a constant amount of memory.
+    - Returns a streamed CSV, NDJSON or Parquet download.
+    """
+    check_export_format(file_format)
+    query = stock_movement_export_query(date_from, date_to, item_id, warehouse_id)
+    return StreamingResponse(
+        stream_export(query, file_format),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="stock_movements.{file_format}"'},
+    )
+
 
 @router.get("/get/{stock_movement_id}",
             response_model=StockMovementModel,
             response_description="The stock movement with the given ID",
             summary="Get a stock movement by ID",
-            description="Fetches a stock movement by its ID.")
-async def get_stock_movement(stock_movement_id: int, db: Session = Depends(get_db)):
+            description="Fetches a stock movement by its ID.",
+            dependencies=[stock_movements_versions])
+async def get_stock_movement(
+    stock_movement_id: int,
+    response: Response,
+    selection: FieldSelection = Depends(stock_movements_fieldset),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve a stock movement by its ID.
     - Validates the existence of the stock movement.
+    - Supports `fields=` and `expand=` like `/stock/movement/get`.
     - Returns the `StockMovementModel` of the specified stock movement.
     """
-    stock_movement = db.query(StockMovement).filter(StockMovement.id == stock_movement_id).one_or_none()
+    stock_movement = await db.get(StockMovement, stock_movement_id, options=selection.options)
     if not stock_movement:
         raise HTTPException(status_code=404, detail="Stock movement not found.")
-    return stock_movement
+    return selection.render_one(stock_movement, response)
 
 
 @router.post("/add",
@@ -43,10 +138,11 @@ async def get_stock_movement(stock_movement_id: int, db: Session = Depends(get_d
              response_description="The stock movement that was added",
              summary="Add a stock movement",
              description="Adds a new stock movement record.")
-async def add_stock_movement(stock_movement: StockMovementBase, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def add_stock_movement(stock_movement: StockMovementBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Add a new stock movement.
     - Validates the existence of the item and warehouse.
+    - Locks the item/warehouse pair so concurrent outflows cannot oversell.
     - Updates stock levels based on the movement type.
     - Returns the `StockMovementModel` of the added stock movement.
     """
@@ -54,63 +150,98 @@ async def add_stock_movement(stock_movement: StockMovementBase, db: Session = De
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
     
-    item = db.query(Item).filter(Item.id == stock_movement.item_id).one_or_none()
-    warehouse = db.query(Warehouse).filter(Warehouse.id == stock_movement.warehouse_id).one_or_none()
+    item = await db.get(Item, stock_movement.item_id)
+    warehouse = await db.get(Warehouse, stock_movement.warehouse_id)
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found.")
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found.")
 
-    if stock_movement.movement_type == "inflow":
-        new_stock_movement = StockMovement(
-            **stock_movement.model_dump(),
-            remaining_quantity=stock_movement.quantity
-        )
-        db.add(new_stock_movement)
-    elif stock_movement.movement_type == "outflow":
-        remaining_quantity = stock_movement.quantity
-        inflow_movements = db.query(StockMovement).filter(
-            StockMovement.item_id == stock_movement.item_id,
-            StockMovement.warehouse_id == stock_movement.warehouse_id,
-            StockMovement.remaining_quantity > 0,
-            StockMovement.movement_type == "inflow",
-            StockMovement.movement_date < stock_movement.movement_date  # Only consider inflows before the outflow
-        ).order_by(StockMovement.movement_date).all()
-
-        for inflow in inflow_movements:
-            if remaining_quantity <= 0:
-                break
-            if inflow.remaining_quantity >= remaining_quantity:
-                inflow.remaining_quantity -= remaining_quantity
-                remaining_quantity = 0
-            else:
-                remaining_quantity -= inflow.remaining_quantity
-                inflow.remaining_quantity = 0
-
-        if remaining_quantity > 0:
-            raise HTTPException(status_code=400, detail="Not enough stock available for outflow.")
-
-        new_stock_movement = StockMovement(
-            **stock_movement.model_dump(),
-            remaining_quantity=0
-        )
-        db.add(new_stock_movement)
-
-    stock = db.query(Stock).filter(Stock.item_id == stock_movement.item_id, Stock.warehouse_id == stock_movement.warehouse_id).one_or_none()
-    if stock:
-        if stock_movement.movement_type == "inflow":
-            stock.stock_level += stock_movement.quantity
-        elif stock_movement.movement_type == "outflow":
-            stock.stock_level -= stock_movement.quantity
-    else:
-        if stock_movement.movement_type == "inflow":
-            new_stock = Stock(item_id=stock_movement.item_id, warehouse_id=stock_movement.warehouse_id, stock_level=stock_movement.quantity)
-            db.add(new_stock)
-        elif stock_movement.movement_type == "outflow":
-            raise HTTPException(status_code=400, detail="Stock not found for the specified item and warehouse.")
-
-    db.commit()
-    db.refresh(new_stock_movement)
-    return new_stock_movement
+    new_stock_movement = await db.run_sync(record_movement, stock_movement)
+
+    await db.commit()
+    return await db.get(StockMovement, new_stock_movement.id, options=stock_movement_loader_options, populate_existing=True)
+
+
+@router.post("/{stock_movement_id}/reverse",
+             response_model=StockMovementReversalModel,
+             response_description="The stock movement that was reversed",
+             summary="Reverse a stock movement",
+             description="Deletes a stock movement and restores the FIFO lots and stock level it changed.")
+async def reverse_stock_movement(stock_movement_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Reverse a stock movement.
+    - Only accessible by admin users.
+    - An outflow gives its units back to exactly the lots it took them from.
+    - An inflow can only be reversed while no outflow has taken from its lot.
+    - The lots, the stock level and the stock snapshots change in a single transaction.
+    - Returns a `StockMovementReversalModel` with the new stock level and the restored lots.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+
+    reversal = await db.run_sync(reverse_movement, stock_movement_id)
+
+    await db.commit()
+    return reversal
+
+
+@router.post("/bulk",
+             response_model=List[StockMovementBulkResult],
+             response_description="The result of every stock movement in the request",
+             summary="Add stock movements in bulk",
+             description="Adds many stock movement records in a single transaction.")
+async def add_stock_movements_bulk(bulk: StockMovementBulkCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Add many stock movements at once.
+    - Validates all items and warehouses up front.
+    - Applies the movements of each item/warehouse pair in date order using FIFO.
+    - Either every movement is added or none is; errors name the offending line.
+    - Returns a `StockMovementBulkResult` for every line, in request order.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+
+    results = await db.run_sync(record_movements_bulk, bulk.movements)
+
+    await db.commit()
+    return results
+
+
+@router.post("/import",
+             response_model=StockMovementImportSummary,
+             response_description="The number of imported stock movements",
+             summary="Import stock movements from a file",
+             description="Imports a CSV or NDJSON ledger of stock movements in a single transaction.")
+async def import_stock_movements_file(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON with one movement per line"),
+    file_format: Optional[str] = Query(None, description=f"One of {', '.join(IMPORT_FORMATS)}; guessed from the file name if omitted"),
+    chunk_size: int = Query(10000, ge=100, le=100000, description="Number of records validated and copied at a time"),
+    db: Session = Depends(get_sync_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import a ledger of stock movements.
+    - Only accessible by admin users.
+    - Streams the file in chunks, so memory use does not depend on its size.
+    - Rebuilds the stock levels and FIFO lots of every affected item/warehouse pair.
+    - Either every movement is imported or none is; errors name the offending line.
+    - Returns a `StockMovementImportSummary`.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to perform this action")
+
+    file_format = file_format or import_format_for(file.filename)
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format. Use one of: {', '.join(IMPORT_FORMATS)}.")
+
+    def on_progress(staged: int):
+        logger.info(f"Import of {file.filename}: {staged} stock movements staged")
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    summary = await run_in_threadpool(import_stock_movements, db, stream, file_format, chunk_size, on_progress)
 
+    await run_in_threadpool(db.commit)
+    logger.info(f"Import of {file.filename}: {summary['imported']} stock movements committed")
+    return summary
@@ -1,18 +1,24 @@
-from typing import List
+from typing import List, Optional
 
-from core import (get_admin_emails, get_current_user, get_db, hash_password,
-                  send_email, verify_password)
-from fastapi import APIRouter, Depends, HTTPException
+from core import (PageParams, Paginator, evict_principal, get_admin_emails,
+                  get_current_user, get_db, get_read_db, hash_password_async,
+                  send_email, validated_json_response, verify_password_async)
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from models import User
 from pydantic import ValidationError
 from schemas import UserModel, UserCreate, PasswordChangeRequest, UserUpdate
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+users_paginator = Paginator(
+    User.id, {"id": User.id, "username": User.username, "date_joined": User.date_joined}
+)
+
 
 @router.post("/register", response_model=UserModel, summary="Register a new user")
-async def create_user(user_data: UserCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Register a new user.
     - Only accessible by admin users.
@@ -26,12 +32,12 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db), curr
         validated_data = UserCreate(**user_data.dict())
 
         # Check if user already exists
-        existing_user = db.query(User).filter(User.username == validated_data.username).first()
+        existing_user = await db.scalar(select(User).where(User.username == validated_data.username).limit(1))
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists")
 
         # Hash the password
-        hashed_password = hash_password(validated_data.password)
+        hashed_password = await hash_password_async(validated_data.password)
 
         # Create new user
         new_user = User(
@@ -45,31 +51,44 @@ async def create_user(user_data: UserCreate, db: Session = Depends(get_db), curr
             is_active=True  # Assuming new users are active by default
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
 
-        admin_emails = get_admin_emails(db)
+        admin_emails = await get_admin_emails(db)
         for email in admin_emails:
             send_email(email, "New User Registration", f"User {new_user.username} has registered.")
 
-        return UserModel.model_validate(new_user).model_dump()
+        return new_user
 
     except ValidationError as e:
         raise HTTPException(status_code=422, detail=e.errors())
 
 @router.get("/get", response_model=List[UserModel], summary="Get all users")
-async def get_users(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_users(
+    response: Response,
+    role: Optional[str] = Query(None, description="Only users with this role"),
+    is_active: Optional[bool] = Query(None, description="Only active or only inactive users"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
     """
     Retrieve all users.
     - Only accessible by admin users.
+    - Can be filtered by role and status, and sorted by `id`, `username` or `date_joined`.
+    - Pass `limit` to paginate; the next page's cursor is in the `X-Next-Cursor` header.
     - Returns a list of all users in the system.
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
-    return db.query(User).all()
+    query = select(User)
+    if role:
+        query = query.where(User.role == role)
+    if is_active is not None:
+        query = query.where(User.is_active == is_active)
+    return await users_paginator.paginate(db, query, page, response)
 
 @router.get("/get/{user_id}", response_model=UserModel, summary="Get a specific user")
-async def get_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     """
     Retrieve a specific user by their ID.
     - Only accessible by admin users.
@@ -77,7 +96,7 @@ async def get_user(user_id: int, db: Session = Depends(get_db), current_user: Us
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -86,14 +105,14 @@ async def get_user(user_id: int, db: Session = Depends(get_db), current_user: Us
 async def get_me(current_user: UserModel = Depends(get_current_user)):
     """
     Retrieve details of the currently authenticated user.
-    - Returns the `UserModel` for the current user.
+    - Returns the `UserModel` for the current user, which is already validated.
     """
-    return current_user
+    return validated_json_response(UserModel, current_user)
 
 @router.patch("/update/me", response_model=UserModel, summary="Update current user details")
 async def update_user(
     user_data: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -101,23 +120,23 @@ async def update_user(
     - Accepts partial updates in the form of `UserUpdate`.
     - Returns the updated `UserModel`.
     """
-    user_to_update = db.query(User).filter(User.id == current_user.id).first()
+    user_to_update = await db.get(User, current_user.id)
     if not user_to_update:
         raise HTTPException(status_code=404, detail="User not found")
     try:
         validated_data = user_data.dict(exclude_unset=True)  # Pydantic handles validation
         for key, value in validated_data.items():
             setattr(user_to_update, key, value)
-        db.commit()
-        db.refresh(user_to_update)
-        return UserModel.model_validate(user_to_update).model_dump()
+        await db.commit()
+        evict_principal(current_user.username)
+        return user_to_update
     except ValidationError as e:
         raise HTTPException(status_code=422, detail=e.errors())
 
 @router.patch("/change-password", summary="Change current user's password")
 async def change_password(
     password_data: PasswordChangeRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -125,20 +144,21 @@ async def change_password(
     - Verifies the current password before updating.
     - Returns a success message upon successful password change.
     """
-    user_to_update = db.query(User).filter(User.id == current_user.id).first()
+    user_to_update = await db.get(User, current_user.id)
     if not user_to_update:
         raise HTTPException(status_code=404, detail="User not found")
-    if verify_password(password_data.current_password, user_to_update.hashed_password):
-        new_hashed_password = hash_password(password_data.new_password)
+    valid, _ = await verify_password_async(password_data.current_password, user_to_update.hashed_password)
+    if valid:
+        new_hashed_password = await hash_password_async(password_data.new_password)
         user_to_update.hashed_password = new_hashed_password
-        db.commit()
-        db.refresh(user_to_update)
+        await db.commit()
+        evict_principal(current_user.username)
         return {"status": "ok", "message": "Password updated successfully"}
     else:
         raise HTTPException(status_code=400, detail="Incorrect old password")
 
 @router.delete("/delete/{user_id}", summary="Delete a user")
-async def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Delete a user by their ID.
     - Only accessible by admin users.
@@ -146,9 +166,10 @@ async def delete_user(user_id: int, db: Session = Depends(get_db), current_user:
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to perform this action")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    evict_principal(user.username)
     return {"status": "ok", "message": f"User {user_id} deleted"}
\ No newline at end of file
@@ -1,20 +1,29 @@
-from typing import List
+from typing import List, Optional
 
-from models import Warehouse, Item, User
-from core import get_db, get_current_user
-from fastapi import APIRouter, Depends, HTTPException
+from models import Stock, User, Warehouse
+from core import (PageParams, Paginator, cached, conditional_get,
+                  get_current_user, get_db, get_read_db, reference_cache,
+                  validate_rows)
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from schemas import WarehouseBase, WarehouseModel, WarehouseUpdate
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/warehouses", tags=["Warehouses"])
 
+warehouses_versions = conditional_get("warehouses")
+
+warehouses_paginator = Paginator(
+    Warehouse.id, {"id": Warehouse.id, "name": Warehouse.name, "location": Warehouse.location}
+)
+
 
 @router.post("/add",
              response_model=WarehouseModel,
              response_description="The created warehouse",
              summary="Create a new warehouse",
              description="Creates a new warehouse and returns the created warehouse model.")
-async def create_warehouse(warehouse: WarehouseBase, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_warehouse(warehouse: WarehouseBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
     Create a new warehouse.
     - Accepts warehouse data in the form of `WarehouseBase`.
@@ -26,8 +35,8 @@ async def create_warehouse(warehouse: WarehouseBase, db: Session = Depends(get_d
     
     new_warehouse = Warehouse(**warehouse.model_dump())
     db.add(new_warehouse)
-    db.commit()
-    db.refresh(new_warehouse)
+    await db.commit()
+    reference_cache.invalidate("warehouses")
     return new_warehouse
 
 
@@ -35,13 +44,34 @@ async def create_warehouse(warehouse: WarehouseBase, db: Session = Depends(get_d
             response_model=List[WarehouseModel],
             response_description="A list of all warehouses",
             summary="Get all warehouses",
-            description="Fetches a list of all warehouses in the system.")
-async def get_warehouses(db: Session = Depends(get_db)):
+            description="Fetches a list of all warehouses in the system, optionally filtered, sorted and paginated.")
+async def get_warehouses(
+    response: Response,
+    name: Optional[str] = Query(None, description="Only warehouses whose name contains this text"),
+    location: Optional[str] = Query(None, description="Only warehouses whose location contains this text"),
+    page: PageParams = Depends(),
+    versions: tuple = warehouses_versions,
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Retrieve all warehouses.
+    - Can be filtered by name and location, and sorted by `id`, `name` or `location`.
+    - Pass `limit` to paginate; the next page's cursor is in the `X-Next-Cursor` header.
+    - Served from the reference data cache when possible.
     - Returns a list of `WarehouseModel` representing all warehouses.
     """
-    return db.query(Warehouse).all()
+    async def load():
+        query = select(Warehouse)
+        if name:
+            query = query.where(Warehouse.name.icontains(name, autoescape=True))
+        if location:
+            query = query.where(Warehouse.location.icontains(location, autoescape=True))
+        warehouses = await warehouses_paginator.paginate(db, query, page, response)
+        return validate_rows(WarehouseModel, warehouses)
+
+    return await cached(
+        "warehouses", ("list", name, location, page.cache_key(), versions), List[WarehouseModel], load, response
+    )
 
 
 @router.get("/get/{warehouse_id}",
@@ -49,16 +79,20 @@ async def get_warehouses(db: Session = Depends(get_db)):
             response_description="The requested warehouse",
             summary="Get a specific warehouse",
             description="Fetches a single warehouse by its ID.")
-async def get_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
+async def get_warehouse(warehouse_id: int, response: Response, versions: tuple = warehouses_versions, db: AsyncSession = Depends(get_read_db)):
     """
     Retrieve a specific warehouse by its ID.
     - If the warehouse doesn't exist, raises a 404 error.
+    - Served from the reference data cache when possible.
     - Returns the `WarehouseModel` for the requested warehouse.
     """
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).one_or_none()
-    if not warehouse:
-        raise HTTPException(status_code=404, detail="Warehouse not found.")
-    return warehouse
+    async def load():
+        warehouse = await db.get(Warehouse, warehouse_id)
+        if not warehouse:
+            raise HTTPException(status_code=404, detail="Warehouse not found.")
+        return WarehouseModel.model_validate(warehouse)
+
+    return await cached("warehouses", ("get", warehouse_id, versions), WarehouseModel, load, response)
 
 
 @router.patch("/{warehouse_id}",
@@ -66,13 +100,13 @@ async def get_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
               response_description="The updated warehouse",
               summary="Update a warehouse",
               description="Updates a warehouse's details and returns the updated warehouse model.")
-async def update_warehouse(warehouse_id: int, warehouse: WarehouseUpdate, db: Session = Depends(get_db)):
+async def update_warehouse(warehouse_id: int, warehouse: WarehouseUpdate, db: AsyncSession = Depends(get_db)):
     """
     Update a warehouse by its ID.
     - Accepts partial updates in the form of `WarehouseUpdate`.
     - Returns the updated `WarehouseModel`.
     """
-    warehouse_to_update = db.query(Warehouse).filter(Warehouse.id == warehouse_id).one_or_none()
+    warehouse_to_update = await db.get(Warehouse, warehouse_id)
     if not warehouse_to_update:
         raise HTTPException(status_code=404, detail="Warehouse not found.")
     
@@ -80,8 +114,8 @@ async def update_warehouse(warehouse_id: int, warehouse: WarehouseUpdate, db: Se
     for key, value in update_data.items():
         setattr(warehouse_to_update, key, value)
     
-    db.commit()
-    db.refresh(warehouse_to_update)
+    await db.commit()
+    reference_cache.invalidate("warehouses")
     return warehouse_to_update
 
 
@@ -89,19 +123,20 @@ async def update_warehouse(warehouse_id: int, warehouse: WarehouseUpdate, db: Se
                response_description="Warehouse deletion status",
                summary="Delete a warehouse",
                description="Deletes a warehouse by its ID and returns a deletion message.")
-async def delete_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
+async def delete_warehouse(warehouse_id: int, db: AsyncSession = Depends(get_db)):
     """
     Delete a warehouse by its ID.
-    - If the warehouse is not empty (contains items), raises a 400 error.
+    - If the warehouse is not empty (holds stock records), raises a 400 error.
     - Returns a success message upon successful deletion.
     """
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).one_or_none()
+    warehouse = await db.get(Warehouse, warehouse_id)
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found.")
 
-    if db.query(Item).filter(Item.warehouse_id == warehouse_id).count() > 0:
+    if await db.scalar(select(exists().where(Stock.warehouse_id == warehouse_id))):
         raise HTTPException(status_code=400, detail="Warehouse is not empty and cannot be deleted.")
 
-    db.delete(warehouse)
-    db.commit()
+    await db.delete(warehouse)
+    await db.commit()
+    reference_cache.invalidate("warehouses")
     return {"message": f"Warehouse {warehouse_id} deleted successfully."}
@@ -1,7 +1,25 @@
 from .auth import (create_access_token, create_default_user,
-                   decode_access_token, get_admin_emails, get_current_user,
-                   hash_password, oauth2_scheme, role_required,
-                   verify_password)
+                   decode_access_token, evict_principal, get_admin_emails,
+                   get_current_user, hash_password, hash_password_async,
+                   oauth2_scheme, principal_cache, role_required,
+                   shutdown_password_hash_pool, verify_password,
+                   verify_password_async)
+from .cache import cached, reference_cache
 from .config import settings
-from .database import Base, engine, get_db
+from .database import (AsyncSessionLocal, Base, SessionLocal, async_engine,
+                       engine, get_db, get_read_db, get_sync_db,
+                       read_replicas)
 from .email_config import send_email
+from .fieldsets import FieldSelection, Fieldset
+from .metrics import METRICS_MEDIA_TYPE, MetricsMiddleware, http_metrics
+from .migrations import upgrade_database
+from .pagination import PageParams, Paginator
+from .pool_metrics import pool_status
+from .profiling import (PROFILE_HEADER, PROFILE_ID_HEADER, ProfilingMiddleware,
+                        profile_store)
+from .serialization import (dump_json, json_response, type_adapter,
+                            validate_rows, validated_json_response)
+from .slow_queries import slow_query_log
+from .sql_stats import SqlStatsMiddleware, current_sql_stats
+from .versioning import (conditional_get, connection_slot, read_table_versions,
+                         table_versions)
@@ -1,4 +1,9 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
@@ -6,8 +11,11 @@ from jose import JWTError, jwt
 from models.users_model import User
 from passlib.context import CryptContext
 from schemas import UserModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from .cache import ReferenceCache
 from .config import settings
 from .database import get_db
 
@@ -15,8 +23,16 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/")
+_password_hash_pool = None
+
+# Validated users per token, namespaced by username so that all of a user's tokens can be evicted at once.
+principal_cache = ReferenceCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    enabled=settings.PRINCIPAL_CACHE_ENABLED,
+)
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -24,10 +40,59 @@ def hash_password(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def _verify_and_update_password(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def _lower_priority():
+    os.nice(5)
+
+def get_password_hash_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the processes that hash and verify passwords, starting them on first use.
+    bcrypt is CPU bound and, depending on the backend, holds the GIL, so it runs in
+    separate, lower priority processes; `PASSWORD_HASH_WORKERS` bounds how much of the
+    CPU a burst of logins can take from the event loop. With `PASSWORD_HASH_WORKERS=0`
+    it returns None, so hashing runs on the event loop's default threads instead.
+    """
+    global _password_hash_pool
+    if _password_hash_pool is None and settings.PASSWORD_HASH_WORKERS > 0:
+        _password_hash_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_lower_priority,
+        )
+    return _password_hash_pool
+
+def shutdown_password_hash_pool():
+    """
+    Stops the password hashing processes, if they were started.
+    """
+    global _password_hash_pool
+    if _password_hash_pool is not None:
+        _password_hash_pool.shutdown(cancel_futures=True)
+        _password_hash_pool = None
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hashes a password in the password hashing pool, without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_password_hash_pool(), hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies a password in the password hashing pool, without blocking the event loop.
+    Returns whether it matches and, if the hash was made with another cost than the
+    current `BCRYPT_ROUNDS`, a new hash to store in its place.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_password_hash_pool(), _verify_and_update_password, plain_password, hashed_password
+    )
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    expire = datetime.now() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    issued_at = datetime.now()
+    expire = issued_at + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": issued_at})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_access_token(token: str):
@@ -37,17 +102,31 @@ def decode_access_token(token: str):
     except JWTError as e:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserModel:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> UserModel:
     payload = decode_access_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
-    
-    user = db.query(User).filter(User.username == payload["sub"]).first()
+
+    # The token is verified on every request; only the user lookup is cached
+    principal = principal_cache.get(payload["sub"], payload.get("iat"))
+    if principal is not None:
+        return principal
+
+    user = await db.scalar(select(User).where(User.username == payload["sub"]).limit(1))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
     # Convert SQLAlchemy User object to Pydantic UserModel
-    return UserModel.model_validate(user)
+    principal = UserModel.model_validate(user)
+    principal_cache.set(payload["sub"], payload.get("iat"), principal)
+    return principal
+
+def evict_principal(username: str):
+    """
+    Forgets the cached user behind every token of `username`, after the user is changed or deleted.
+    Other worker processes reload it within `PRINCIPAL_CACHE_TTL` seconds.
+    """
+    principal_cache.invalidate(username)
 
 def role_required(allowed_roles: list):
     def role_checker(user: UserModel = Depends(get_current_user)):
@@ -81,8 +160,8 @@ def create_default_user(db: Session):
         print("Default admin user already exists.")
         return None
 
-def get_admin_emails(db: Session):
+async def get_admin_emails(db: AsyncSession):
     """
     Fetches all admin emails from the database.
     """
-    return [user.email for user in db.query(User).filter(User.role == "admin").all()]
\ No newline at end of file
+    return list(await db.scalars(select(User.email).where(User.role == "admin")))
\ No newline at end of file
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from fastapi import Response
+
+from .config import settings
+from .pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from .serialization import dump_json, json_response
+
+_MISSING = object()
+
+
+class ReferenceCache:
+    """
+    Bounded in-process LRU cache with a time-to-live, for rarely changing reference data.
+
+    Entries belong to a namespace such as "items". Invalidating a namespace bumps its
+    generation, which is part of every key, so all of its entries become unreachable at
+    once and age out of the LRU order. The cache lives in one worker process: other
+    workers only see a change once their own entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: Hashable, default=None):
+        """Return the live value cached under `key`, or `default`."""
+        if not self.enabled:
+            return default
+        with self._lock:
+            full_key = (namespace, self._generations.get(namespace, 0), key)
+            entry = self._entries.get(full_key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[full_key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, namespace: str, key: Hashable, value):
+        """Cache `value` under `key`, evicting the least recently used entries beyond `maxsize`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            full_key = (namespace, self._generations.get(namespace, 0), key)
+            self._entries[full_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *namespaces: str):
+        """Drop every entry of the given namespaces."""
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+reference_cache = ReferenceCache(
+    maxsize=settings.REFERENCE_CACHE_SIZE,
+    ttl=settings.REFERENCE_CACHE_TTL,
+    enabled=settings.REFERENCE_CACHE_ENABLED,
+)
+
+
+async def cached(namespace: str, key: Hashable, response_type, load: Callable[[], Awaitable], response: Response) -> Response:
+    """
+    Return the response cached under `key`, or await `load()` and cache its response.
+
+    `load` must return data detached from the session, already validated as `response_type`,
+    such as the result of `validate_rows`. It is serialized to JSON once and the bytes are
+    cached, so hits are neither validated nor serialized again. Pagination headers `load`
+    sets on `response` are cached along with the body and set again on hits. Errors raised
+    by `load` are not cached.
+    """
+    entry = reference_cache.get(namespace, key, _MISSING)
+    if entry is _MISSING:
+        body = dump_json(response_type, await load())
+        headers = {name: response.headers[name] for name in (NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER) if name in response.headers}
+        reference_cache.set(namespace, key, (body, headers))
+        return json_response(body, response)
+
+    body, headers = entry
+    response.headers.update(headers)
+    return json_response(body, response)
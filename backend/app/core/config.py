@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,10 +9,64 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: Optional[str] = None  # Defaults to DATABASE_URL with the asyncpg driver
     FRONTEND_URL: str
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     SENDGRID_API_KEY: str
 
+    # Connection pool of each engine, per worker process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced; -1 to never recycle
+    DB_POOL_PRE_PING: bool = True
+    DB_PGBOUNCER: bool = False  # PgBouncer in transaction mode: no prepared statement caching
+
+    # Upgrade the schema to the latest migration at startup; disable to run `alembic upgrade head` on deploy instead
+    DB_AUTO_MIGRATE: bool = True
+
+    # Read replicas for read-only routes, as comma-separated URLs in the DATABASE_URL format
+    DATABASE_REPLICA_URLS: str = ""
+    DB_REPLICA_MAX_LAG: float = 5.0  # Seconds behind the primary before a replica is skipped
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 1.0  # Seconds between lag checks of each replica
+
+    # Daily stock snapshots behind GET /stock/as-of, taken by the API for the previous day
+    STOCK_SNAPSHOTS_ENABLED: bool = True
+    STOCK_SNAPSHOT_CHECK_INTERVAL: float = 3600.0  # Seconds between checks for a missing snapshot
+
+    # Per-key cache of FIFO valuation and COGS figures, valid until a movement touches the key
+    VALUATION_CACHE_ENABLED: bool = True
+
+    # Count the SQL statements of every request into response headers (for tests and benchmarks)
+    SQL_QUERY_COUNTING: bool = False
+
+    # Request, latency and SQL metrics at /metrics, in the Prometheus text format, per worker process
+    METRICS_ENABLED: bool = True
+
+    # Log statements slower than SLOW_QUERY_THRESHOLD_MS with their plan; see GET /admin/slow-queries
+    SLOW_QUERY_LOG_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: float = 250.0
+    SLOW_QUERY_ANALYZE_SAMPLE_RATE: float = 0.1  # Share of slow statements run again with EXPLAIN ANALYZE
+    SLOW_QUERY_LOG_SIZE: int = 100  # Number of slow statements kept per worker process
+
+    # Let admins profile a request with ?profile=1 or an X-Profile: 1 header; see GET /admin/profiles
+    PROFILING_ENABLED: bool = False
+    PROFILE_LOG_SIZE: int = 20  # Number of profiles kept per worker process
+
+    # In-process cache of categories, warehouses and items, per worker process
+    REFERENCE_CACHE_ENABLED: bool = True
+    REFERENCE_CACHE_SIZE: int = 1024  # Number of cached responses
+    REFERENCE_CACHE_TTL: float = 60.0  # Seconds before an entry is reloaded; bounds staleness across workers
+
+    # Password hashing; existing hashes are rehashed with BCRYPT_ROUNDS on the next login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2  # Processes per worker process hashing passwords off the event loop; 0 uses threads
+
+    # In-process cache of authenticated users, keyed by token subject and issue time
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_SIZE: int = 1024  # Number of cached tokens
+    PRINCIPAL_CACHE_TTL: float = 30.0  # Seconds before a user is reloaded; bounds staleness across workers
+
 settings = Settings()
\ No newline at end of file
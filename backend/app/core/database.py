@@ -1,24 +1,177 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import time
+from uuid import uuid4
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from .config import settings
+from .pool_metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
+
+def _async_database_url(url: str) -> str:
+    """Swap the driver of a PostgreSQL URL for asyncpg, keeping everything else."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_database_url(DATABASE_URL)
+
+
+def _pool_options() -> dict:
+    """Pool sizing shared by both engines, taken from the `DB_POOL_*` settings."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _connect_args(url: str) -> dict:
+    """
+    Driver arguments for running behind PgBouncer in transaction mode.
+
+    Consecutive transactions may land on different server connections there, so
+    prepared statements must neither be cached nor reused by name.
+    """
+    if not settings.DB_PGBOUNCER:
+        return {}
+    driver = make_url(url).get_driver_name()
+    if driver == "asyncpg":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    if driver == "psycopg":
+        return {"prepare_threshold": None}
+    return {}  # psycopg2 never prepares statements
+
+
+# The synchronous engine serves startup, scripts and the import/export paths that run in threads.
+engine = create_engine(
+    DATABASE_URL, poolclass=TimedQueuePool, connect_args=_connect_args(DATABASE_URL), **_pool_options()
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The asynchronous engine serves the route handlers without blocking the event loop.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    connect_args=_connect_args(ASYNC_DATABASE_URL),
+    **_pool_options(),
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Seconds behind the primary; zero when the replica has replayed everything it received.
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+_REPLICA_LAG_CHECK_TIMEOUT = 2.0
+
+
+class ReadReplica:
+    """
+    An async engine for one read replica, with its last measured replication lag.
+
+    The lag is measured at most once every `DB_REPLICA_LAG_CHECK_INTERVAL` seconds.
+    A replica that cannot be reached counts as too far behind until the next check.
+    """
+
+    def __init__(self, url: str):
+        async_url = _async_database_url(url)
+        self.engine = create_async_engine(
+            async_url,
+            poolclass=TimedAsyncAdaptedQueuePool,
+            connect_args=_connect_args(async_url),
+            **_pool_options(),
+        )
+        self.sessionmaker = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        self.lag = None
+        self._checked_at = float("-inf")
+
+    async def _measure_lag(self) -> float:
+        async with self.engine.connect() as connection:
+            return float(await connection.scalar(_REPLICA_LAG_SQL))
+
+    async def is_fresh(self) -> bool:
+        """Whether the replica is reachable and no more than `DB_REPLICA_MAX_LAG` seconds behind."""
+        now = time.monotonic()
+        if now - self._checked_at >= settings.DB_REPLICA_LAG_CHECK_INTERVAL:
+            self._checked_at = now  # Concurrent requests keep using the previous figure meanwhile
+            try:
+                self.lag = await asyncio.wait_for(self._measure_lag(), _REPLICA_LAG_CHECK_TIMEOUT)
+            except (SQLAlchemyError, OSError, asyncio.TimeoutError):
+                self.lag = None
+        return self.lag is not None and self.lag <= settings.DB_REPLICA_MAX_LAG
+
+
+read_replicas = [ReadReplica(url.strip()) for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+_replica_turn = itertools.count()
+
 Base = declarative_base()
 
 
-def get_db():
+async def get_db():
+    """
+    Dependency to get the async DB session.
+
+    This function provides a SQLAlchemy `AsyncSession` to interact with the database.
+    It should be used as a dependency in FastAPI routes so that queries are awaited
+    instead of blocking the event loop, and the session is closed after the request.
+    Objects are not expired on commit, so relationships must be loaded eagerly.
+
+    Yields:
+        db (AsyncSession): A SQLAlchemy async session object.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    """
+    Dependency to get an async DB session for read-only routes.
+
+    Sessions go to the read replicas in round-robin order, skipping replicas that are
+    unreachable or lag behind by more than `DB_REPLICA_MAX_LAG` seconds. Without
+    replicas, or when none is fresh enough, the primary is used. Routes that write,
+    or read back what they just wrote, must use `get_db` instead.
+
+    Yields:
+        db (AsyncSession): A SQLAlchemy async session object.
+    """
+    session_factory = AsyncSessionLocal
+    for _ in range(len(read_replicas)):
+        replica = read_replicas[next(_replica_turn) % len(read_replicas)]
+        if await replica.is_fresh():
+            session_factory = replica.sessionmaker
+            break
+    async with session_factory() as db:
+        yield db
+
+
+def get_sync_db():
     """
-    Dependency to get the DB session.
+    Dependency to get a synchronous DB session.
 
-    This function provides a SQLAlchemy session to interact with the database.
-    It should be used as a dependency in FastAPI routes to ensure that the session
-    is properly managed and closed after the request is completed.
+    Only for work that is handed to a thread pool, such as file imports, because
+    the session blocks while it talks to the database.
 
     Yields:
         db (Session): A SQLAlchemy session object.
@@ -0,0 +1,96 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, Response
+from pydantic import ConfigDict, create_model
+from sqlalchemy.orm import load_only, raiseload
+
+from .serialization import dump_json, json_response, validate_rows
+
+
+@lru_cache(maxsize=None)
+def _subset_schema(schema, names: Tuple[str, ...]):
+    """A copy of `schema` with only the fields in `names`, built once per combination."""
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schema.model_fields[name].annotation, schema.model_fields[name]) for name in names},
+    )
+
+
+def _split(value: Optional[str]) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(part.strip() for part in value.split(",") if part.strip())) if value else ()
+
+
+class FieldSelection:
+    """
+    The fields and embedded relationships one request asked for.
+
+    Attributes:
+        schema (type): A response schema with only the selected fields.
+        options (list): Loader options that load the selected columns and relationships only.
+    """
+
+    def __init__(self, schema, options: list):
+        self.schema = schema
+        self.options = options
+
+    def render(self, rows: Sequence, response: Response) -> Response:
+        """Validate a list of rows against the selection and serialize it in one go."""
+        return json_response(dump_json(List[self.schema], validate_rows(self.schema, rows)), response)
+
+    def render_one(self, row, response: Response) -> Response:
+        """Validate a single row against the selection and serialize it."""
+        return json_response(dump_json(self.schema, self.schema.model_validate(row)), response)
+
+
+class Fieldset:
+    """
+    Sparse fieldsets and `expand=` for the routes of one resource.
+
+    Responses carry the resource's own columns, related objects by id only. `fields=`
+    narrows the columns to the ones listed, plus the id; `expand=` embeds the related
+    objects listed.
+    The query loads only what the response needs: unselected columns are deferred,
+    unexpanded relationships are not joined, and expanded ones are loaded with the
+    strategies in `expansions`. Use an instance as a route dependency; it resolves to
+    the request's `FieldSelection`.
+    """
+
+    def __init__(self, entity, schema, expansions: Dict[str, object], always_load: Sequence = ()):
+        self.entity = entity
+        self.schema = schema
+        self.expansions = expansions
+        self.columns = [name for name in schema.model_fields if name not in expansions]
+        # Columns loaded whatever is selected: the primary key, the foreign keys expansions
+        # follow, and the sort keys the paginator reads.
+        self.always_load = list(always_load)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return; all by default"),
+        expand: Optional[str] = Query(None, description="Comma-separated related objects to embed, e.g. item,warehouse"),
+    ) -> FieldSelection:
+        selected = _split(fields) or tuple(self.columns)
+        expanded = _split(expand)
+        unknown = [name for name in selected if name not in self.columns]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown field '{unknown[0]}'. Use any of: {', '.join(self.columns)}.",
+            )
+        unknown = [name for name in expanded if name not in self.expansions]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot expand '{unknown[0]}'. Use any of: {', '.join(self.expansions)}.",
+            )
+
+        # Keep the schema's field order, so responses look the same whatever order was asked for.
+        # The id is always returned.
+        names = tuple(
+            name for name in self.schema.model_fields if name == "id" or name in selected or name in expanded
+        )
+        load = dict.fromkeys([*self.always_load, *(getattr(self.entity, name) for name in selected)])
+        options = [load_only(*load), *(self.expansions[name] for name in expanded), raiseload("*")]
+        return FieldSelection(_subset_schema(self.schema, names), options)
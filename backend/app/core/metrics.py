@@ -0,0 +1,203 @@
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from .sql_stats import SqlStats, start_sql_stats, stop_sql_stats
+
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the histogram buckets; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+UNMATCHED_ROUTE = "unmatched"  # Label of requests no route handled, so unknown paths add no series
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Counter:
+    """
+    A monotonically increasing count per combination of label values.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description shown in the exposition.
+        labelnames (tuple): Names of the labels, in the order values are passed.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.series: Dict[tuple, int] = {}
+
+    def inc(self, labels: tuple, amount: int = 1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} counter")
+        for labels, value in self.series.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+
+
+class Histogram:
+    """
+    Observations counted into buckets per combination of label values.
+
+    Each observation increments a single bucket; the cumulative counts Prometheus
+    expects are only added up when the metrics are rendered.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description shown in the exposition.
+        labelnames (tuple): Names of the labels, in the order values are passed.
+        buckets (tuple): Upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = "le=\"{}\"".format(bound if bound == "+Inf" else _number(float(bound)))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+
+
+class HttpMetrics:
+    """
+    Request, latency and SQL metrics of the HTTP requests this worker process handled.
+
+    Series are labelled by method and route template, e.g. `/item/get/{item_id}`, so
+    their number is bounded by the routes of the API. Only `MetricsMiddleware` records
+    into them, from the event loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        route_labels = ("method", "route")
+        self.requests = Counter(
+            "http_requests_total", "HTTP requests handled, by route template and status code.",
+            route_labels + ("status",),
+        )
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Time from receiving a request until its response body was sent.",
+            route_labels, LATENCY_BUCKETS,
+        )
+        self.sql_statements = Histogram(
+            "http_request_sql_statements", "SQL statements executed per request.",
+            route_labels, SQL_STATEMENT_BUCKETS,
+        )
+        self.sql_duration = Histogram(
+            "http_request_sql_duration_seconds", "Time spent executing SQL statements per request.",
+            route_labels, LATENCY_BUCKETS,
+        )
+        # Scopes of the requests being handled. The route of a request is only known once
+        # the router matched it, so in-flight requests are counted per route when rendering.
+        self.active: Dict[int, dict] = {}
+
+    def observe(self, scope: dict, status: int, duration: float, sql: SqlStats):
+        labels = (scope["method"], route_template(scope))
+        self.requests.inc(labels + (status,))
+        self.duration.observe(labels, duration)
+        self.sql_statements.observe(labels, sql.count)
+        self.sql_duration.observe(labels, sql.duration)
+
+    def in_flight(self) -> Dict[Tuple[str, str], int]:
+        counts: Dict[Tuple[str, str], int] = {}
+        for scope in list(self.active.values()):
+            labels = (scope["method"], route_template(scope))
+            counts[labels] = counts.get(labels, 0) + 1
+        return counts
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        self.requests.render(lines)
+        self.duration.render(lines)
+        lines.append("# HELP http_requests_in_flight HTTP requests being handled, by route template.")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        for labels, count in self.in_flight().items():
+            lines.append(f"http_requests_in_flight{_labels(('method', 'route'), labels)} {count}")
+        self.sql_statements.render(lines)
+        self.sql_duration.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+def route_template(scope: dict) -> str:
+    """The path template of the route that matched the request, or `unmatched`."""
+    route = scope.get("route")
+    return route.path if route is not None else UNMATCHED_ROUTE
+
+
+http_metrics = HttpMetrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records every HTTP request into `http_metrics`.
+
+    The latency covers the whole request, up to the last byte of a streamed body, and
+    so do the SQL statement count and time. Add it last, so it is the outermost
+    middleware and also times the others.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics = http_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # Reported when the app fails before starting a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        active = self.metrics.active
+        key = id(scope)
+        active[key] = scope
+        stats, token = start_sql_stats(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            stop_sql_stats(token)
+            del active[key]
+            self.metrics.observe(scope, status, duration, stats)
@@ -0,0 +1,47 @@
+import logging
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, inspect, select
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("uvicorn")
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+BASELINE_REVISION = "0001"  # The schema `Base.metadata.create_all` used to create
+MIGRATION_LOCK_KEY = 0x696E76656E746F72  # Arbitrary advisory lock key shared by all workers
+
+
+def alembic_config(connection=None) -> Config:
+    """The Alembic configuration of the app, optionally bound to an open connection."""
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_database(engine: Engine):
+    """
+    Upgrade the database schema to the latest migration.
+
+    - Workers starting together wait on a PostgreSQL advisory lock, so only the first one
+      migrates and the others find the schema up to date.
+    - A database created by `create_all` before migrations existed has the tables but no
+      `alembic_version`; it is stamped with the baseline revision and upgraded from there.
+    """
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(select(func.pg_advisory_lock(MIGRATION_LOCK_KEY)))
+            connection.commit()
+        try:
+            config = alembic_config(connection)
+            tables = inspect(connection).get_table_names()
+            if "alembic_version" not in tables and "stock_movements" in tables:
+                logger.info(f"Stamping the existing schema with the baseline revision {BASELINE_REVISION}.")
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
+            connection.commit()
+        finally:
+            if connection.dialect.name == "postgresql":
+                connection.execute(select(func.pg_advisory_unlock(MIGRATION_LOCK_KEY)))
+                connection.commit()
@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import (BigInteger, ColumnElement, Select, and_, func, or_,
+                        select, tuple_)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+class PageParams:
+    """
+    Common query parameters of list endpoints.
+
+    Attributes:
+        limit (Optional[int]): Maximum number of rows to return. All rows are returned if omitted.
+        cursor (Optional[str]): Opaque cursor from the `X-Next-Cursor` header of the previous page.
+        sort (Optional[str]): Field to sort by, prefixed with `-` for descending order.
+        include_total (bool): Whether to count all matching rows into the `X-Total-Count` header.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of rows to return"),
+        cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+        sort: Optional[str] = Query(None, description="Field to sort by, prefixed with '-' for descending order"),
+        include_total: bool = Query(False, description="Count all matching rows into the X-Total-Count header"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.sort = sort
+        self.include_total = include_total
+
+    def cache_key(self) -> tuple:
+        """The parameters as a hashable key, for caching a page."""
+        return (self.limit, self.cursor, self.sort, self.include_total)
+
+
+def _encode_cursor(sort: str, value, row_id: int) -> str:
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _coerce(value, column: ColumnElement):
+    """Convert a decoded cursor value to a valid value of `column`, raising ValueError or TypeError if it isn't one."""
+    python_type = column.type.python_type
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    if python_type is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise TypeError(f"Expected an integer, got {value!r}")
+        bits = 64 if isinstance(column.type, BigInteger) else 32
+        if not -2 ** (bits - 1) <= value < 2 ** (bits - 1):
+            raise ValueError(f"{value} is out of range")
+    elif python_type is str and not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {value!r}")
+    return value
+
+
+def _decode_cursor(cursor: str, sort: str, column: ColumnElement, id_column: ColumnElement):
+    """
+    Return the sort value and id a cursor points after.
+
+    Cursors come back from clients, so anything that doesn't decode to a value of the
+    column's type and an integer id is rejected with a 400 rather than reaching SQL.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = json.loads(payload)
+        if cursor_sort != sort:
+            raise HTTPException(status_code=400, detail="The cursor was issued for a different sort order.")
+        row_id = _coerce(row_id, id_column)
+        if value is not None:
+            value = _coerce(value, column)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return value, row_id
+
+
+class Paginator:
+    """
+    Keyset pagination over `(sort_key, id)` for a single resource.
+
+    Only the fields listed in `sort_fields` can be sorted on. Pages are fetched with a row
+    comparison against the last row of the previous page instead of an OFFSET, so every
+    page costs the same however deep into the table it is. Rows with a NULL sort value
+    come last in ascending and first in descending order.
+    """
+
+    def __init__(self, id_column: ColumnElement, sort_fields: Dict[str, ColumnElement], default_sort: str = "id"):
+        self.id_column = id_column
+        self.sort_fields = sort_fields
+        self.default_sort = default_sort
+
+    def _after(self, column: ColumnElement, value, row_id: int, descending: bool) -> ColumnElement:
+        """
+        The condition for rows following `(value, row_id)` in the sort order.
+
+        A row comparison is NULL when either side holds a NULL, so rows with a NULL sort
+        value, which come last ascending and first descending, are compared on their own.
+        """
+        if column is self.id_column:
+            return column < row_id if descending else column > row_id
+        if value is None:
+            same_value = and_(column.is_(None), self.id_column < row_id if descending else self.id_column > row_id)
+            return or_(same_value, column.is_not(None)) if descending else same_value
+        key, bound = tuple_(column, self.id_column), tuple_(value, row_id)
+        return key < bound if descending else or_(key > bound, column.is_(None))
+
+    async def paginate(self, db: AsyncSession, query: Select, params: PageParams, response: Response) -> list:
+        """
+        Apply sorting, the cursor and the limit to `query` and return one page of entities.
+
+        Sets the `X-Next-Cursor` header when more rows follow, and `X-Total-Count` when requested.
+        """
+        sort = params.sort or self.default_sort
+        descending = sort.startswith("-")
+        field = sort.lstrip("-")
+        if field not in self.sort_fields:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot sort by '{field}'. Use one of: {', '.join(self.sort_fields)}.",
+            )
+        column = self.sort_fields[field]
+
+        if params.include_total:
+            total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+            response.headers[TOTAL_COUNT_HEADER] = str(total)
+
+        if params.cursor:
+            value, row_id = _decode_cursor(params.cursor, sort, column, self.id_column)
+            query = query.where(self._after(column, value, row_id, descending))
+
+        if column is self.id_column:
+            order = [column.desc() if descending else column.asc()]
+        else:
+            # NULLs sort after every value, in the direction of the sort, as the cursor expects.
+            order = [column.desc().nulls_first() if descending else column.asc().nulls_last()]
+            order.append(self.id_column.desc() if descending else self.id_column.asc())
+        query = query.order_by(*order)
+        if params.limit is None:
+            return (await db.scalars(query)).unique().all()
+
+        rows = (await db.scalars(query.limit(params.limit + 1))).unique().all()
+        if len(rows) > params.limit:
+            rows = rows[:params.limit]
+            last = rows[-1]
+            response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(sort, getattr(last, column.key), getattr(last, self.id_column.key))
+        return rows
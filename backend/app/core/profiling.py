@@ -0,0 +1,298 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import greenlet
+from fastapi import HTTPException
+
+from .auth import get_current_user
+from .config import settings
+from .database import AsyncSessionLocal
+from .metrics import route_template
+from .sql_stats import start_sql_stats, stop_sql_stats
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+SAMPLE_INTERVAL = 0.001  # Seconds between stack samples of a profiled request
+CALL_TREE_MIN_SHARE = 0.01  # Calls taking less of the request are left out of the call tree
+TOP_FUNCTIONS = 30
+MAX_STATEMENTS = 100  # Distinct statements reported per profile
+SUSPENDED = "(suspended: waiting for I/O or running other tasks)"
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfileStore:
+    """
+    Thread-safe ring buffer of the latest request profiles of this worker process.
+
+    Attributes:
+        maxsize (int): The number of profiles kept; the oldest ones are dropped first.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=maxsize)
+        self._ids = count(1)
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, profile: dict):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: int) -> Optional[dict]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+    def profiles(self) -> List[dict]:
+        """Return the kept profiles, newest first."""
+        with self._lock:
+            return list(reversed(self._profiles))
+
+
+profile_store = ProfileStore(settings.PROFILE_LOG_SIZE)
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_APP_ROOT):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the call stack of one coroutine from a background thread.
+
+    Every `SAMPLE_INTERVAL` the sampler reads the stack of the event loop thread and, if
+    the coroutine of `root` is running, adds the time since the previous sample to the
+    stack below it; otherwise to `SUSPENDED`. Samples are weighted by the time between
+    them, so they add up to the wall time even when the sampler is delayed.
+
+    SQLAlchemy's async engine runs ORM code in greenlets, whose bottom frame doesn't link
+    back to the coroutine that spawned them. A greenlet trace function keeps track of the
+    running greenlet, so their stacks are joined up with their parent's.
+    """
+
+    # The greenlet trace function and the switch interval are process-wide, so the first
+    # sampler to start installs them for every running one, and the last to stop restores them.
+    _running: List["StackSampler"] = []
+    _previous_trace = None
+    _switch_interval = None
+
+    def __init__(self, root):
+        self.root = root
+        self.thread_id = threading.get_ident()
+        self.samples: Dict[tuple, float] = {}
+        self._current = greenlet.getcurrent()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    @classmethod
+    def _trace(cls, event, args):
+        if event in ("switch", "throw"):
+            for sampler in cls._running:
+                sampler._current = args[1]
+
+    def start(self):
+        cls = type(self)
+        if not cls._running:
+            cls._previous_trace = greenlet.settrace(cls._trace)
+            cls._switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(SAMPLE_INTERVAL)  # Let the sampler take the GIL on time
+        cls._running.append(self)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        cls = type(self)
+        cls._running.remove(self)
+        if not cls._running:
+            sys.setswitchinterval(cls._switch_interval)
+            greenlet.settrace(cls._previous_trace)
+
+    def _stack(self) -> Optional[tuple]:
+        frame = sys._current_frames().get(self.thread_id)
+        current = self._current
+        stack = []
+        while frame is not None:
+            if frame is self.root:
+                return tuple(reversed(stack))
+            stack.append(frame.f_code)
+            frame = frame.f_back
+            if frame is None and current is not None and current.parent is not None:
+                current = current.parent
+                frame = current.gr_frame
+        return None
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            stack = self._stack()
+            if stack is None:
+                stack = (SUSPENDED,)
+            now = time.perf_counter()
+            self.samples[stack] = self.samples.get(stack, 0.0) + now - last
+            last = now
+
+
+def call_tree(samples: Dict[tuple, float], total: float) -> str:
+    """
+    Render sampled stacks as an indented tree, with the time and share of `total` of each call.
+
+    Calls below `CALL_TREE_MIN_SHARE` of `total` are left out.
+    """
+    tree = {}
+    for stack, weight in samples.items():
+        children = tree
+        for code in stack:
+            node = children.setdefault(code, [0.0, {}])
+            node[0] += weight
+            children = node[1]
+
+    total = total or 1e-9
+    lines = [f"{'ms':>9} {'share':>6}  function", f"{total * 1000:>9.1f} {1:>6.1%}  request"]
+
+    def walk(children, depth):
+        for code, (weight, grandchildren) in sorted(children.items(), key=lambda item: item[1][0], reverse=True):
+            if weight < total * CALL_TREE_MIN_SHARE:
+                break
+            label = code if isinstance(code, str) else _label(code)
+            lines.append(f"{weight * 1000:>9.1f} {weight / total:>6.1%}  {'  ' * depth}{label}")
+            walk(grandchildren, depth + 1)
+
+    walk(tree, 1)
+    return "\n".join(lines)
+
+
+def top_functions(samples: Dict[tuple, float], total: float) -> str:
+    """The functions sampled most often at the top of the stack, with their time and share of `total`."""
+    own: Dict[object, float] = {}
+    for stack, weight in samples.items():
+        if stack:
+            own[stack[-1]] = own.get(stack[-1], 0.0) + weight
+    total = total or 1e-9
+    lines = [f"{'ms':>9} {'share':>6}  function"]
+    for code, weight in sorted(own.items(), key=lambda item: item[1], reverse=True)[:TOP_FUNCTIONS]:
+        label = code if isinstance(code, str) else _label(code)
+        lines.append(f"{weight * 1000:>9.1f} {weight / total:>6.1%}  {label}")
+    return "\n".join(lines)
+
+
+def sql_breakdown(statements: List[Tuple[str, float]]) -> List[dict]:
+    """Group the executed statements by their SQL, the most time-consuming first."""
+    grouped = {}
+    for statement, duration in statements:
+        entry = grouped.setdefault(statement, {"statement": statement, "calls": 0, "duration_ms": 0.0})
+        entry["calls"] += 1
+        entry["duration_ms"] += duration * 1000
+    return sorted(grouped.values(), key=lambda entry: entry["duration_ms"], reverse=True)[:MAX_STATEMENTS]
+
+
+def profile_requested(scope: dict) -> bool:
+    """Whether the request asks to be profiled, with `?profile=1` or an `X-Profile: 1` header."""
+    query = scope.get("query_string", b"")
+    if b"profile=" in query and dict(parse_qsl(query.decode("latin-1"))).get("profile") in ("1", "true"):
+        return True
+    return any(name == b"x-profile" and value in (b"1", b"true") for name, value in scope["headers"])
+
+
+async def _is_admin(scope: dict) -> bool:
+    authorization = next((value for name, value in scope["headers"] if name == b"authorization"), b"")
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await get_current_user(token, db)
+        except HTTPException:
+            return False
+    return user.role == "admin"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles the requests of admins that ask for it.
+
+    A request with `?profile=1` or an `X-Profile: 1` header from an admin runs under a
+    `StackSampler`, and its call tree, busiest functions and SQL statements are stored
+    in `profile_store`. The response carries the profile's id in `X-Profile-Id`; fetch
+    it from `GET /admin/profiles/{profile_id}`. Other requests only pay for checking the
+    query string and headers, and the middleware isn't installed unless
+    `PROFILING_ENABLED` is set.
+
+    One request is profiled at a time per worker. Code run in worker threads, like
+    exports, isn't sampled, but its SQL statements are reported.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+        self.busy = False
+
+    async def __call__(self, scope, receive, send):
+        # Checked again after the await, and claimed before the next one, so requests
+        # authenticated meanwhile don't start a second sampler.
+        if (scope["type"] != "http" or self.busy or not profile_requested(scope)
+                or not await _is_admin(scope) or self.busy):
+            await self.app(scope, receive, send)
+            return
+
+        self.busy = True
+        profile_id = self.store.next_id()
+        status = 500  # Reported when the app fails before starting a response
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode(), str(profile_id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        stats, token = start_sql_stats(scope)
+        stats.statements = []
+        sampler = StackSampler(sys._getframe())
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - start
+            statements, stats.statements = stats.statements, None
+            stop_sql_stats(token)
+            self.busy = False
+            self.store.add(self._report(profile_id, scope, status, duration, sampler.samples, statements))
+
+    @staticmethod
+    def _report(profile_id, scope, status, duration, samples, statements) -> dict:
+        return {
+            "id": profile_id,
+            "timestamp": datetime.now(timezone.utc),
+            "method": scope["method"],
+            "route": route_template(scope),
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": duration * 1000,
+            "sql_count": len(statements),
+            "sql_duration_ms": sum(duration for _, duration in statements) * 1000,
+            "sql_statements": sql_breakdown(statements),
+            "call_tree": call_tree(samples, duration),
+            "top_functions": top_functions(samples, duration),
+        }
@@ -0,0 +1,41 @@
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+@lru_cache(maxsize=None)
+def type_adapter(type_) -> TypeAdapter:
+    """Return the `TypeAdapter` for `type_`, building its validator and serializer only once."""
+    return TypeAdapter(type_)
+
+
+def validate_rows(model, rows) -> list:
+    """Validate ORM rows into a list of `model` in a single call instead of one `model_validate` per row."""
+    return type_adapter(List[model]).validate_python(rows, from_attributes=True)
+
+
+def dump_json(type_, value) -> bytes:
+    """Serialize `value`, already an instance of `type_`, straight to JSON bytes."""
+    return type_adapter(type_).dump_json(value)
+
+
+def json_response(body: bytes, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """
+    Wrap JSON bytes in a response that FastAPI sends as is.
+
+    FastAPI validates whatever a route returns against its `response_model` again, unless the
+    route returns a `Response`. Routes whose data is already validated, such as cache hits,
+    return this instead. Headers set on the route's `response` parameter, like pagination
+    headers and the ETag, would be dropped with a returned response, so they are copied over.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=body, status_code=status_code, headers=headers, media_type=JSON_MEDIA_TYPE)
+
+
+def validated_json_response(type_, value: Any, response: Optional[Response] = None) -> Response:
+    """Serialize `value`, already an instance of `type_`, into a response FastAPI does not validate again."""
+    return json_response(dump_json(type_, value), response)
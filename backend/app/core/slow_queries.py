@@ -0,0 +1,143 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import count
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .metrics import route_template
+from .sql_stats import current_sql_stats
+
+logger = logging.getLogger("uvicorn")
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+LOCKING_CLAUSE = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE)
+
+
+class SlowQueryLog:
+    """
+    Thread-safe ring buffer of the slowest recent statements of this worker process.
+
+    Attributes:
+        maxsize (int): The number of entries kept; the oldest ones are dropped first.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=maxsize)
+        self._ids = count(1)
+
+    def add(self, entry: dict):
+        with self._lock:
+            entry["id"] = next(self._ids)
+            self._entries.append(entry)
+
+    def entries(self, route: Optional[str] = None, min_duration_ms: float = 0.0, limit: Optional[int] = None) -> List[dict]:
+        """Return the logged statements, newest first, optionally only those of one route or above a duration."""
+        with self._lock:
+            entries = list(self._entries)
+        matching = [
+            entry for entry in reversed(entries)
+            if entry["duration_ms"] >= min_duration_ms and (route is None or entry["route"] == route)
+        ]
+        return matching[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
+
+
+def _parameter_count(parameters) -> int:
+    """The number of bound values, or of parameter sets for executemany; the values themselves are not logged."""
+    if parameters is None:
+        return 0
+    return len(parameters) if isinstance(parameters, (dict, list, tuple)) else 1
+
+
+def _analyzable(keyword: str, statement: str) -> bool:
+    """
+    Whether running the statement again with `EXPLAIN ANALYZE` only reads.
+
+    A plain SELECT without a locking clause; writes, including data-modifying CTEs,
+    would run a second time and take their row locks again.
+    """
+    return keyword == "SELECT" and not LOCKING_CLAUSE.search(statement)
+
+
+def _explain(conn, statement: str, parameters, analyze: bool) -> str:
+    """
+    Return the plan of a statement that just ran, on the connection it ran on.
+
+    EXPLAIN goes through a separate DBAPI cursor, so it triggers no engine events, and
+    runs inside a savepoint that is always rolled back. A failing EXPLAIN therefore
+    doesn't abort the caller's transaction. `ANALYZE` executes the statement again, so
+    it is only asked for reads.
+    """
+    options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+
+
+# Timing every statement costs two clock reads; EXPLAIN only runs for the slow ones. The
+# start is kept on the statement's execution context, which is dropped with it, so a
+# statement that fails leaves nothing behind on the pooled connection.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if settings.SLOW_QUERY_LOG_ENABLED and context is not None:
+        context.slow_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "slow_query_started", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    if duration * 1000 < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    stats = current_sql_stats()
+    scope = stats.scope if stats is not None else None
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    analyze = _analyzable(keyword, statement) and random.random() < settings.SLOW_QUERY_ANALYZE_SAMPLE_RATE
+    plan, explain_error = None, None
+    if keyword in EXPLAINABLE and not executemany:
+        try:
+            plan = _explain(conn, statement, parameters, analyze)
+        except Exception as e:
+            explain_error = str(e)
+            analyze = False
+
+    route = f"{scope['method']} {route_template(scope)}" if scope is not None else None
+    logger.warning(f"Slow query ({duration * 1000:.1f} ms) in {route or 'no request'}: {statement}")
+    slow_query_log.add({
+        "timestamp": datetime.now(timezone.utc),
+        "duration_ms": duration * 1000,
+        "route": route,
+        "statement": statement,
+        "parameter_count": _parameter_count(parameters),
+        "executemany": executemany,
+        "plan": plan,
+        "analyzed": plan is not None and analyze,
+        "explain_error": explain_error,
+    })
@@ -0,0 +1,113 @@
+import time
+from contextvars import ContextVar, Token
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SQL_QUERY_COUNT_HEADER = "X-SQL-Query-Count"
+SQL_QUERY_TIME_HEADER = "X-SQL-Query-Time-Ms"
+
+
+class SqlStats:
+    """
+    SQL statements executed on behalf of one request.
+
+    Attributes:
+        count (int): The number of statements sent to the database.
+        duration (float): Seconds spent executing them.
+        scope (Optional[dict]): The ASGI scope of the request.
+        statements (Optional[list]): `(statement, seconds)` of every statement, if set to a list.
+    """
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.scope = scope
+        self.statements = None
+
+
+_current_stats: ContextVar[Optional[SqlStats]] = ContextVar("sql_stats", default=None)
+
+
+def current_sql_stats() -> Optional[SqlStats]:
+    """Return the statistics of the request being handled, or None outside a tracked request."""
+    return _current_stats.get()
+
+
+def start_sql_stats(scope: Optional[dict] = None) -> Tuple[SqlStats, Optional[Token]]:
+    """
+    Return the statistics of the current request, starting them if nothing tracks it yet.
+
+    Both the statement counting and the metrics middleware call this, so whichever runs
+    outermost starts the statistics and the other shares them. Pass the returned token
+    to `stop_sql_stats` when the request is done.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        return stats, None
+    stats = SqlStats(scope)
+    return stats, _current_stats.set(stats)
+
+
+def stop_sql_stats(token: Optional[Token]):
+    """Stop tracking statistics started by `start_sql_stats`."""
+    if token is not None:
+        _current_stats.reset(token)
+
+
+# Listening on the Engine class covers every engine: sync, async and replicas. The
+# stats object is shared by reference, so statements run in worker threads or in
+# `run_sync` greenlets are counted towards the request that started them. The start time
+# is kept on the statement's execution context, so a statement that raises can't leave
+# a stale one on the connection.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None and context is not None:
+        context.sql_stats_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = getattr(context, "sql_stats_started", None)
+    if stats is None or started is None:
+        return
+    duration = time.perf_counter() - started
+    stats.count += 1
+    stats.duration += duration
+    if stats.statements is not None:
+        stats.statements.append((statement, duration))
+
+
+class SqlStatsMiddleware:
+    """
+    ASGI middleware that counts the SQL statements of each HTTP request.
+
+    The totals are returned in the `X-SQL-Query-Count` and `X-SQL-Query-Time-Ms`
+    response headers. Statements run while a streamed body is being sent happen
+    after the headers and are not included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = start_sql_stats(scope)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((SQL_QUERY_COUNT_HEADER.lower().encode(), str(stats.count).encode()))
+                headers.append((SQL_QUERY_TIME_HEADER.lower().encode(), f"{stats.duration * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            stop_sql_stats(token)
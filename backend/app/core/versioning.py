@@ -0,0 +1,138 @@
+import hashlib
+from typing import Dict
+
+from fastapi import Depends, HTTPException, Request, Response
+from schemas import UserModel
+from sqlalchemy import (BigInteger, Column, Integer, String, Table, cast, event,
+                        func, select)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .auth import get_current_user
+from .database import Base, get_read_db
+
+# Counters of the transactions that changed each table, spread over `VERSION_SLOTS` rows
+# per table; a table's version is the sum of its slots. The counter is updated inside
+# the writing transaction, so a reader never sees a version without its data.
+table_versions = Table(
+    "table_versions",
+    Base.metadata,
+    Column("table_name", String, primary_key=True),
+    Column("slot", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False, default=0),
+)
+
+VERSION_SLOTS = 64
+
+
+def connection_slot(slots: int):
+    """
+    SQL expression of the slot, out of `slots`, that the current database connection writes to.
+
+    Counters and totals split into slots are added to the slot of the writing connection,
+    so concurrent writers mostly update different rows instead of queueing on one until
+    they commit. The slot is the backend's process id modulo `slots`; process ids aren't
+    consecutive, so two connections may share a slot, which only makes them wait on each
+    other as they would on a single row.
+    """
+    return func.pg_backend_pid() % slots
+
+_CHANGED_TABLES = "changed_tables"
+
+
+def _mark_changed(session: Session, table_name: str):
+    if table_name != table_versions.name:
+        session.info.setdefault(_CHANGED_TABLES, set()).add(table_name)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_tables(session, flush_context):
+    for obj in (*session.new, *session.deleted):
+        _mark_changed(session, obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            _mark_changed(session, obj.__table__.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_changed(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_table_versions(session):
+    session.flush()
+    changed = sorted(session.info.pop(_CHANGED_TABLES, ()))
+    if not changed:
+        return
+    # Bumped last and in name order, so the row locks are held only for the commit and never deadlock.
+    slot = connection_slot(VERSION_SLOTS)
+    statement = pg_insert(table_versions).values([{"table_name": name, "slot": slot, "version": 1} for name in changed])
+    session.connection().execute(
+        statement.on_conflict_do_update(
+            index_elements=[table_versions.c.table_name, table_versions.c.slot],
+            set_={"version": table_versions.c.version + 1},
+        )
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_tables(session):
+    session.info.pop(_CHANGED_TABLES, None)
+
+
+async def read_table_versions(db: AsyncSession, tables) -> Dict[str, int]:
+    """Return the version of every table in `tables`; tables never written to are at version 0."""
+    rows = await db.execute(
+        select(table_versions.c.table_name, cast(func.sum(table_versions.c.version), BigInteger))
+        .where(table_versions.c.table_name.in_(tables))
+        .group_by(table_versions.c.table_name)
+    )
+    versions = dict.fromkeys(tables, 0)
+    versions.update(rows.tuples().all())
+    return versions
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def conditional_get(*tables: str, authenticated: bool = False):
+    """
+    Dependency factory for GET routes whose response depends only on `tables` and the URL.
+
+    The dependency reads the table versions, derives an ETag from them, the path and the
+    query string, and sets it on the response. If the request's `If-None-Match` matches,
+    it answers `304 Not Modified` before the route runs, so nothing is loaded or
+    serialized. It resolves to the versions, which callers can fold into cache keys.
+    The versions are read before the route's own queries on the same session, so the
+    data sent is never older than the ETag that labels it.
+
+    Routes that require a token pass `authenticated=True`, so the current user is resolved
+    before the versions are read, and a client without a token never learns whether its
+    ETag still matches.
+    """
+    async def check_etag(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)) -> tuple:
+        versions = await read_table_versions(db, tables)
+        fingerprint = repr((request.url.path, sorted(request.query_params.multi_items()), sorted(versions.items())))
+        etag = f'"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+        if _matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return tuple(sorted(versions.items()))
+
+    if not authenticated:
+        return Depends(check_etag)
+
+    async def check_etag_for_user(
+        request: Request,
+        response: Response,
+        current_user: UserModel = Depends(get_current_user),
+        db: AsyncSession = Depends(get_read_db),
+    ) -> tuple:
+        return await check_etag(request, response, db)
+
+    return Depends(check_etag_for_user)
@@ -1,10 +1,16 @@
+import asyncio
 import logging
 
 import models as models
 from api import api_router
-from core import create_default_user, engine, get_db, settings
+from core import (PROFILE_HEADER, PROFILE_ID_HEADER, MetricsMiddleware,
+                  ProfilingMiddleware, SessionLocal, SqlStatsMiddleware,
+                  create_default_user, engine, settings,
+                  shutdown_password_hash_pool, upgrade_database)
+from core.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from services import run_snapshot_schedule
 
 # Initialize logger
 logger = logging.getLogger("uvicorn")
@@ -31,9 +37,22 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],  # Restrict to necessary methods
-    allow_headers=["Authorization", "Content-Type"],  # Restrict to necessary headers
+    allow_headers=["Authorization", "Content-Type", PROFILE_HEADER],  # Restrict to necessary headers
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, "ETag", PROFILE_ID_HEADER],  # Pagination, revalidation and profiling headers
 )
 
+# Count SQL statements per request when enabled, e.g. for scripts/check_n_plus_one.py
+if settings.SQL_QUERY_COUNTING:
+    app.add_middleware(SqlStatsMiddleware)
+
+# Profile admin requests that ask for it; costs nothing while disabled
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Record request metrics for /metrics; added last so it is the outermost middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Register API routers
 app.include_router(api_router)
 
@@ -42,19 +61,32 @@ async def on_startup():
     """Startup event to initialize the database and create default user."""
     logger.info("Starting up the application...")
 
-    # Create database tables
-    try:
-        models.Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully.")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {e}")
-        raise
+    # Upgrade the database schema
+    if settings.DB_AUTO_MIGRATE:
+        try:
+            upgrade_database(engine)
+            logger.info("Database schema is up to date.")
+        except Exception as e:
+            logger.error(f"Error migrating the database: {e}")
+            raise
 
     # Create the default user
     try:
-        with next(get_db()) as db:  # Use context manager for session lifecycle
+        with SessionLocal() as db:  # Use context manager for session lifecycle
             create_default_user(db)
             logger.info("Default user created successfully.")
     except Exception as e:
         logger.error(f"Error creating default user: {e}")
-        raise
\ No newline at end of file
+        raise
+
+    # Take the daily stock snapshots in the background
+    if settings.STOCK_SNAPSHOTS_ENABLED:
+        app.state.snapshot_schedule = asyncio.create_task(run_snapshot_schedule())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Shutdown event to stop the snapshot schedule and the password hashing processes."""
+    snapshot_schedule = getattr(app.state, "snapshot_schedule", None)
+    if snapshot_schedule is not None:
+        snapshot_schedule.cancel()
+    shutdown_password_hash_pool()
@@ -0,0 +1,47 @@
+from logging.config import fileConfig
+
+import models as models  # Registers every table on Base.metadata
+from alembic import context
+from core import Base, settings
+from sqlalchemy import create_engine, pool
+
+config = context.config
+target_metadata = Base.metadata
+
+# The API passes its own connection (see core.migrations) and keeps its logging setup.
+connection = config.attributes.get("connection")
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL to stdout, for `alembic upgrade head --sql`."""
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    if connection is not None:
+        run_migrations(connection)
+        return
+    engine = create_engine(settings.DATABASE_URL, poolclass=pool.NullPool)
+    with engine.connect() as own_connection:
+        run_migrations(own_connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,67 @@
+"""stock key and ledger indexes
+
+Makes `(item_id, warehouse_id)` unique on `stock` and indexes the ledger for FIFO
+allocation and reporting by item, warehouse and date.
+
+Duplicate stock rows could be created by concurrent first inflows. Every later
+movement updated all of them, so their levels can't be added up; each duplicated key
+is collapsed into its oldest row, with the level recomputed from the ledger.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 21:23:24.162763
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        UPDATE stock
+        SET stock_level = COALESCE((
+            SELECT SUM(CASE WHEN m.movement_type = 'inflow' THEN m.quantity ELSE -m.quantity END)
+            FROM stock_movements m
+            WHERE m.item_id = stock.item_id AND m.warehouse_id = stock.warehouse_id
+        ), 0)
+        WHERE (item_id, warehouse_id) IN (
+            SELECT item_id, warehouse_id FROM stock GROUP BY item_id, warehouse_id HAVING COUNT(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM stock
+        USING stock AS kept
+        WHERE stock.item_id = kept.item_id
+          AND stock.warehouse_id = kept.warehouse_id
+          AND stock.id > kept.id
+    """)
+
+    op.create_unique_constraint('uq_stock_item_id_warehouse_id', 'stock', ['item_id', 'warehouse_id'])
+    op.create_index(op.f('ix_stock_warehouse_id'), 'stock', ['warehouse_id'], unique=False)
+    op.create_index(
+        'ix_stock_movements_open_lots', 'stock_movements', ['item_id', 'warehouse_id', 'movement_date', 'id'],
+        unique=False,
+        postgresql_include=['remaining_quantity'],
+        postgresql_where=sa.text("movement_type = 'inflow' AND remaining_quantity > 0"),
+    )
+    op.create_index('ix_stock_movements_item_id_movement_date', 'stock_movements', ['item_id', 'movement_date', 'id'], unique=False)
+    op.create_index('ix_stock_movements_warehouse_id_movement_date', 'stock_movements', ['warehouse_id', 'movement_date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_movements_warehouse_id_movement_date', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_item_id_movement_date', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_open_lots', table_name='stock_movements')
+    op.drop_index(op.f('ix_stock_warehouse_id'), table_name='stock')
+    op.drop_constraint('uq_stock_item_id_warehouse_id', 'stock', type_='unique')
@@ -0,0 +1,46 @@
+"""stock snapshots
+
+Daily stock levels per item and warehouse, from which GET /stock/as-of starts.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 21:28:15.746902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_snapshot_runs',
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('keys', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('snapshot_date')
+    )
+    op.create_table('stock_snapshots',
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('stock_level', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ),
+    sa.ForeignKeyConstraint(['snapshot_date'], ['stock_snapshot_runs.snapshot_date'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('snapshot_date', 'item_id', 'warehouse_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stock_snapshots')
+    op.drop_table('stock_snapshot_runs')
@@ -0,0 +1,46 @@
+"""stock versions
+
+Adds `stock.version`, bumped by every movement of the key, which the valuation and
+COGS caches compare against, and adds `price` to the open lot index so valuing the
+open lots doesn't visit the table.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 21:40:12.351877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('stock', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+    op.drop_index('ix_stock_movements_open_lots', table_name='stock_movements')
+    op.create_index(
+        'ix_stock_movements_open_lots', 'stock_movements', ['item_id', 'warehouse_id', 'movement_date', 'id'],
+        unique=False,
+        postgresql_include=['remaining_quantity', 'price'],
+        postgresql_where=sa.text("movement_type = 'inflow' AND remaining_quantity > 0"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_movements_open_lots', table_name='stock_movements')
+    op.create_index(
+        'ix_stock_movements_open_lots', 'stock_movements', ['item_id', 'warehouse_id', 'movement_date', 'id'],
+        unique=False,
+        postgresql_include=['remaining_quantity'],
+        postgresql_where=sa.text("movement_type = 'inflow' AND remaining_quantity > 0"),
+    )
+    op.drop_column('stock', 'version')
@@ -0,0 +1,91 @@
+"""stock movement allocations
+
+Adds `stock_movement_allocations`, the units each outflow took from each inflow lot, and
+backfills it for the existing ledger by replaying FIFO per item and warehouse in movement
+date, then id, order. The `remaining_quantity` of every lot is set to what the backfilled
+allocations left of it, so reversing an outflow restores lots that agree with the table.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 21:44:43.671112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Each outflow covers a range of the running total shipped and each lot a range of the running
+# total received; the units between two consecutive range boundaries belong to one of each.
+BACKFILL_ALLOCATIONS = """
+    WITH inflows AS (
+        SELECT id, item_id, warehouse_id, price,
+               SUM(quantity) OVER w AS through, ROW_NUMBER() OVER w AS ordinal
+        FROM stock_movements
+        WHERE movement_type = 'inflow'
+        WINDOW w AS (PARTITION BY item_id, warehouse_id ORDER BY movement_date, id)
+    ), outflows AS (
+        SELECT id, item_id, warehouse_id,
+               SUM(quantity) OVER w AS through, ROW_NUMBER() OVER w AS ordinal
+        FROM stock_movements
+        WHERE movement_type = 'outflow'
+        WINDOW w AS (PARTITION BY item_id, warehouse_id ORDER BY movement_date, id)
+    ), boundaries AS (
+        SELECT item_id, warehouse_id, through AS position, 1 AS inflows, 0 AS outflows FROM inflows
+        UNION ALL
+        SELECT item_id, warehouse_id, through, 0, 1 FROM outflows
+    ), segments AS (
+        SELECT item_id, warehouse_id,
+               position - LAG(position, 1, 0) OVER w AS quantity,
+               SUM(SUM(inflows)) OVER w - SUM(inflows) + 1 AS inflow_ordinal,
+               SUM(SUM(outflows)) OVER w - SUM(outflows) + 1 AS outflow_ordinal
+        FROM boundaries
+        GROUP BY item_id, warehouse_id, position
+        WINDOW w AS (PARTITION BY item_id, warehouse_id ORDER BY position)
+    )
+    INSERT INTO stock_movement_allocations (outflow_id, inflow_id, quantity, unit_price)
+    SELECT o.id, i.id, SUM(s.quantity), i.price
+    FROM segments s
+    JOIN inflows i ON i.item_id = s.item_id AND i.warehouse_id = s.warehouse_id AND i.ordinal = s.inflow_ordinal
+    JOIN outflows o ON o.item_id = s.item_id AND o.warehouse_id = s.warehouse_id AND o.ordinal = s.outflow_ordinal
+    GROUP BY o.id, i.id, i.price
+"""
+
+ALIGN_REMAINING_QUANTITIES = """
+    UPDATE stock_movements m
+    SET remaining_quantity = m.quantity - COALESCE(
+        (SELECT SUM(a.quantity) FROM stock_movement_allocations a WHERE a.inflow_id = m.id), 0
+    )
+    WHERE m.movement_type = 'inflow'
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_movement_allocations',
+    sa.Column('outflow_id', sa.Integer(), nullable=False),
+    sa.Column('inflow_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['inflow_id'], ['stock_movements.id'], ),
+    sa.ForeignKeyConstraint(['outflow_id'], ['stock_movements.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('outflow_id', 'inflow_id')
+    )
+    op.create_index(op.f('ix_stock_movement_allocations_inflow_id'), 'stock_movement_allocations', ['inflow_id'], unique=False)
+    op.execute(BACKFILL_ALLOCATIONS)
+    op.execute(ALIGN_REMAINING_QUANTITIES)
+    # Lots may have changed, so cached valuations must not be reused.
+    op.execute("UPDATE stock SET version = version + 1")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_stock_movement_allocations_inflow_id'), table_name='stock_movement_allocations')
+    op.drop_table('stock_movement_allocations')
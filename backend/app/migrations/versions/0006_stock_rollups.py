@@ -0,0 +1,74 @@
+"""stock rollups
+
+Adds the item, warehouse and category rollups of the units on hand and their value at
+FIFO cost, which every movement keeps up to date, and fills them from the stock levels
+and the open inflow lots.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 22:29:00.461075
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The units and lot value of every stock key, added up by {group} into the {key} of the rollup.
+BACKFILL_ROLLUP = """
+    INSERT INTO stock_{table}_rollups ({key}, quantity, value)
+    SELECT {group}, SUM(s.stock_level), SUM(COALESCE(lots.value, 0))
+    FROM stock s
+    JOIN items i ON i.id = s.item_id
+    LEFT JOIN (
+        SELECT item_id, warehouse_id, SUM(remaining_quantity * price) AS value
+        FROM stock_movements
+        WHERE movement_type = 'inflow' AND remaining_quantity > 0
+        GROUP BY item_id, warehouse_id
+    ) lots ON lots.item_id = s.item_id AND lots.warehouse_id = s.warehouse_id
+    WHERE {group} IS NOT NULL
+    GROUP BY {group}
+    HAVING SUM(s.stock_level) <> 0 OR SUM(COALESCE(lots.value, 0)) <> 0
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_category_rollups',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.BigInteger(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    op.create_table('stock_warehouse_rollups',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.BigInteger(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('warehouse_id')
+    )
+    op.create_table('stock_item_rollups',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.BigInteger(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id')
+    )
+    op.execute(BACKFILL_ROLLUP.format(table="item", key="item_id", group="s.item_id"))
+    op.execute(BACKFILL_ROLLUP.format(table="warehouse", key="warehouse_id", group="s.warehouse_id"))
+    op.execute(BACKFILL_ROLLUP.format(table="category", key="category_id", group="i.category_id"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stock_item_rollups')
+    op.drop_table('stock_warehouse_rollups')
+    op.drop_table('stock_category_rollups')
@@ -0,0 +1,46 @@
+"""table versions and movement date index
+
+Creates `table_versions`, which the ETags of GET routes are derived from, and the
+`(movement_date, id)` index that stock movements are paged by.
+
+Both were wrongly part of the baseline revision, so databases stamped with it from a
+`create_all` schema never got them, while databases migrated from scratch already have
+them. They are created only where missing.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 09:12:41.385027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name'),
+    if_not_exists=True,
+    )
+    op.create_index(
+        'ix_stock_movements_movement_date_id', 'stock_movements', ['movement_date', 'id'],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_movements_movement_date_id', table_name='stock_movements', if_exists=True)
+    op.drop_table('table_versions', if_exists=True)
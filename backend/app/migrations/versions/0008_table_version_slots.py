@@ -0,0 +1,51 @@
+"""table version slots
+
+Spreads the counter of each table in `table_versions` over slots picked by the writing
+connection, so concurrent writers to a table no longer wait on a single row. The
+existing counters become slot 0, which keeps every table's version, the sum of its
+slots, unchanged.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 09:31:18.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('table_versions', sa.Column('slot', sa.Integer(), nullable=False, server_default='0'))
+    op.alter_column('table_versions', 'slot', server_default=None)
+    op.drop_constraint('table_versions_pkey', 'table_versions', type_='primary')
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['table_name', 'slot'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Fold the slots back into one counter per table.
+    op.execute("""
+        UPDATE table_versions
+        SET version = totals.version
+        FROM (SELECT table_name, SUM(version) AS version FROM table_versions GROUP BY table_name) totals
+        WHERE table_versions.table_name = totals.table_name AND table_versions.slot = 0
+    """)
+    op.execute("""
+        INSERT INTO table_versions (table_name, slot, version)
+        SELECT table_name, 0, SUM(version) FROM table_versions GROUP BY table_name
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("DELETE FROM table_versions WHERE slot <> 0")
+    op.drop_constraint('table_versions_pkey', 'table_versions', type_='primary')
+    op.drop_column('table_versions', 'slot')
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['table_name'])
@@ -0,0 +1,50 @@
+"""stock rollup slots
+
+Spreads the warehouse and category rollups over slots picked by the writing connection,
+so movements of different items in a warehouse or category no longer wait on a single
+row. The existing totals become slot 0.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 10:05:52.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The rollup table and its key column, per grouping spread over slots.
+SLOTTED_ROLLUPS = (("stock_warehouse_rollups", "warehouse_id"), ("stock_category_rollups", "category_id"))
+
+# Replaces the slots of every group with one row holding their sum.
+FOLD_SLOTS = """
+    WITH folded AS (DELETE FROM {table} RETURNING {key}, quantity, value)
+    INSERT INTO {table} ({key}, slot, quantity, value)
+    SELECT {key}, 0, SUM(quantity), SUM(value) FROM folded GROUP BY {key}
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, key in SLOTTED_ROLLUPS:
+        op.add_column(table, sa.Column('slot', sa.Integer(), nullable=False, server_default='0'))
+        op.alter_column(table, 'slot', server_default=None)
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.create_primary_key(f'{table}_pkey', table, [key, 'slot'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, key in SLOTTED_ROLLUPS:
+        op.execute(FOLD_SLOTS.format(table=table, key=key))
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.drop_column(table, 'slot')
+        op.create_primary_key(f'{table}_pkey', table, [key])
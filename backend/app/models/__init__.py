@@ -1,6 +1,10 @@
 from .category_model import *
 from .item_model import *
 from .stock_model import *
+from .stock_movement_allocation_model import *
 from .stock_movement_model import *
+from .stock_rollup_model import *
+from .stock_snapshot_model import *
 from .users_model import *
 from .warehouse_model import *
+from .loaders import *
@@ -1,4 +1,4 @@
-from core import Base
+from core.database import Base
 from sqlalchemy import Column, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
@@ -0,0 +1,35 @@
+from sqlalchemy.orm import joinedload
+
+from .item_model import Item
+from .stock_model import Stock
+from .stock_movement_model import StockMovement
+
+__all__ = [
+    "item_loader_options", "stock_movement_loader_options",
+    "stock_expansions", "stock_movement_expansions",
+]
+
+# Loader strategies matching the nesting of the response schemas. Every relationship
+# a schema reads must be loaded here: async sessions cannot lazy load, and sync ones
+# would issue one query per row. All of them are many-to-one, so a joined load adds
+# columns to the same query rather than rows.
+
+# `ItemModel` nests the category.
+item_loader_options = (joinedload(Item.category),)
+
+# A created `StockMovementModel` is returned with the item, its category and the warehouse.
+stock_movement_loader_options = (
+    joinedload(StockMovement.item).joinedload(Item.category),
+    joinedload(StockMovement.warehouse),
+)
+
+# Relationships that list and detail routes embed only when asked to with `?expand=`.
+stock_expansions = {
+    "item": joinedload(Stock.item).joinedload(Item.category),
+    "warehouse": joinedload(Stock.warehouse),
+}
+
+stock_movement_expansions = {
+    "item": joinedload(StockMovement.item).joinedload(Item.category),
+    "warehouse": joinedload(StockMovement.warehouse),
+}
@@ -1,5 +1,5 @@
-from core import Base
-from sqlalchemy import Column, ForeignKey, Integer
+from core.database import Base
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 
@@ -8,11 +8,16 @@ class Stock(Base):
     Represents the stock level of an item in a specific warehouse.
     """
     __tablename__ = 'stock'
+    __table_args__ = (
+        # One row per item and warehouse; its index serves every stock update and lookup by item.
+        UniqueConstraint('item_id', 'warehouse_id', name='uq_stock_item_id_warehouse_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     item_id = Column(Integer, ForeignKey('items.id'))
-    warehouse_id = Column(Integer, ForeignKey('warehouses.id'))
+    warehouse_id = Column(Integer, ForeignKey('warehouses.id'), index=True)
     stock_level = Column(Integer, default=0)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Bumped by every change to the key's stock or lots
 
     item = relationship("Item", back_populates="stock")
     warehouse = relationship("Warehouse", back_populates="stock")
\ No newline at end of file
@@ -0,0 +1,18 @@
+from core.database import Base
+from sqlalchemy import Column, ForeignKey, Integer
+
+
+class StockMovementAllocation(Base):
+    """
+    Represents the units an outflow took from one inflow lot, at the price of that lot.
+
+    Written whenever outflows consume lots, so reversing an outflow restores exactly the
+    lots it took from, and its cost of goods sold needs no FIFO replay.
+    """
+    __tablename__ = 'stock_movement_allocations'
+
+    outflow_id = Column(Integer, ForeignKey('stock_movements.id', ondelete='CASCADE'), primary_key=True)
+    # Not cascaded: a lot that outflows took from cannot be deleted before they are reversed.
+    inflow_id = Column(Integer, ForeignKey('stock_movements.id'), primary_key=True, index=True)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Integer, nullable=False)
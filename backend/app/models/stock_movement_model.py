@@ -1,8 +1,8 @@
 from datetime import date
 
-from core import Base
-from sqlalchemy import (CheckConstraint, Column, Date, ForeignKey, Integer,
-                        String)
+from core.database import Base
+from sqlalchemy import (CheckConstraint, Column, Date, ForeignKey, Index,
+                        Integer, String, text)
 from sqlalchemy.orm import relationship
 
 
@@ -11,6 +11,22 @@ class StockMovement(Base):
     Represents the movement of stock into or out of a warehouse.
     """
     __tablename__ = 'stock_movements'
+    __table_args__ = (
+        # Keyset pagination by date walks this index instead of sorting the table.
+        Index('ix_stock_movements_movement_date_id', 'movement_date', 'id'),
+        # Open FIFO lots of an item in a warehouse, in consumption order. Exhausted lots and
+        # outflows are left out, and INCLUDE lets the allocation and the valuation read the
+        # remaining quantity and price without visiting the table.
+        Index(
+            'ix_stock_movements_open_lots',
+            'item_id', 'warehouse_id', 'movement_date', 'id',
+            postgresql_include=['remaining_quantity', 'price'],
+            postgresql_where=text("movement_type = 'inflow' AND remaining_quantity > 0"),
+        ),
+        # Ledger and reporting queries by item or warehouse over a date range.
+        Index('ix_stock_movements_item_id_movement_date', 'item_id', 'movement_date', 'id'),
+        Index('ix_stock_movements_warehouse_id_movement_date', 'warehouse_id', 'movement_date', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     item_id = Column(Integer, ForeignKey('items.id'))
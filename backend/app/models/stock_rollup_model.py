@@ -0,0 +1,46 @@
+from core.database import Base
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer
+
+
+class StockItemRollup(Base):
+    """
+    Represents the units on hand of an item across all warehouses and their value at FIFO cost.
+
+    Kept up to date in the transaction of every movement, so a total is read from a single
+    row. An item without a row has nothing on hand.
+    """
+    __tablename__ = 'stock_item_rollups'
+
+    item_id = Column(Integer, ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    value = Column(BigInteger, nullable=False, default=0)  # Units times the price of the open lots they remain in
+
+
+class StockWarehouseRollup(Base):
+    """
+    Represents the units on hand in a warehouse across all items and their value at FIFO cost.
+
+    The totals are spread over slots picked by the writing connection, so movements of
+    different items in the warehouse don't queue on one row; they are the sum of its rows.
+    """
+    __tablename__ = 'stock_warehouse_rollups'
+
+    warehouse_id = Column(Integer, ForeignKey('warehouses.id', ondelete='CASCADE'), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+class StockCategoryRollup(Base):
+    """
+    Represents the units on hand of the items of a category and their value at FIFO cost.
+
+    Spread over slots like the warehouse rollups. Moving an item to another category moves
+    its totals along with it.
+    """
+    __tablename__ = 'stock_category_rollups'
+
+    category_id = Column(Integer, ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    value = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,28 @@
+from core.database import Base
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer
+
+
+class StockSnapshotRun(Base):
+    """
+    Represents a completed stock snapshot of all items and warehouses at the end of a day.
+    """
+    __tablename__ = 'stock_snapshot_runs'
+
+    snapshot_date = Column(Date, primary_key=True)
+    taken_at = Column(DateTime(timezone=True), nullable=False)
+    keys = Column(Integer, nullable=False)  # Number of stock levels stored for the date
+
+
+class StockSnapshot(Base):
+    """
+    Represents the stock level of an item in a warehouse at the end of a snapshot date.
+
+    Levels of zero are not stored: an item and warehouse without a row on a date that
+    has a `StockSnapshotRun` had nothing on hand.
+    """
+    __tablename__ = 'stock_snapshots'
+
+    snapshot_date = Column(Date, ForeignKey('stock_snapshot_runs.snapshot_date'), primary_key=True)
+    item_id = Column(Integer, ForeignKey('items.id'), primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey('warehouses.id'), primary_key=True)
+    stock_level = Column(Integer, nullable=False)
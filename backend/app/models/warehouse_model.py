@@ -1,6 +1,6 @@
 from datetime import date
 
-from core import Base
+from core.database import Base
 from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
 
@@ -1,3 +1,4 @@
+from .admin_schema import *
 from .category_schema import *
 from .item_schema import *
 from .stock_schema import *
@@ -0,0 +1,178 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class PoolStatusModel(BaseModel):
+    """
+    Schema used for reporting the state of one database connection pool.
+
+    Attributes:
+        size (int): The configured number of persistent connections.
+        max_overflow (int): The configured number of extra connections allowed under load.
+        checked_in (int): Connections idle in the pool.
+        checked_out (int): Connections currently in use.
+        overflow (int): Extra connections currently open beyond `size`.
+        checkouts (int): Successful checkouts since startup or the last reset.
+        timeouts (int): Checkouts that gave up after the pool timeout.
+        avg_wait_ms (float): Average time a checkout waited for a connection, in milliseconds.
+        max_wait_ms (float): Longest time a checkout waited for a connection, in milliseconds.
+    """
+    size: int = Field(..., description="The configured number of persistent connections", ge=0)
+    max_overflow: int = Field(..., description="The configured number of extra connections allowed under load")
+    checked_in: int = Field(..., description="Connections idle in the pool", ge=0)
+    checked_out: int = Field(..., description="Connections currently in use", ge=0)
+    overflow: int = Field(..., description="Extra connections currently open beyond the pool size", ge=0)
+    checkouts: int = Field(..., description="Successful checkouts since startup or the last reset", ge=0)
+    timeouts: int = Field(..., description="Checkouts that gave up after the pool timeout", ge=0)
+    avg_wait_ms: float = Field(..., description="Average checkout wait in milliseconds", ge=0)
+    max_wait_ms: float = Field(..., description="Longest checkout wait in milliseconds", ge=0)
+
+
+class ReplicaStatusModel(PoolStatusModel):
+    """
+    Schema used for reporting the connection pool and replication lag of a read replica.
+
+    Attributes:
+        lag_seconds (Optional[float]): The last measured replication lag, or None if the replica was unreachable or not checked yet.
+    """
+    lag_seconds: Optional[float] = Field(None, description="The last measured replication lag in seconds")
+
+
+class DatabasePoolsModel(BaseModel):
+    """
+    Schema used for reporting the connection pools of the current worker process.
+
+    Attributes:
+        async_pool (PoolStatusModel): The pool behind the async engine used by route handlers.
+        sync_pool (PoolStatusModel): The pool behind the sync engine used by imports, exports and startup.
+        replicas (List[ReplicaStatusModel]): The pools of the read replicas, in configuration order.
+        pgbouncer (bool): Whether prepared statement caching is disabled for PgBouncer.
+    """
+    async_pool: PoolStatusModel = Field(..., description="The pool behind the async engine used by route handlers")
+    sync_pool: PoolStatusModel = Field(..., description="The pool behind the sync engine used by imports and exports")
+    replicas: List[ReplicaStatusModel] = Field(..., description="The pools of the read replicas, in configuration order")
+    pgbouncer: bool = Field(..., description="Whether prepared statement caching is disabled for PgBouncer")
+
+
+class CacheStatsModel(BaseModel):
+    """
+    Schema used for reporting the reference data cache of the current worker process.
+
+    Attributes:
+        enabled (bool): Whether the cache is in use.
+        size (int): The number of cached responses, including ones not yet evicted after invalidation.
+        maxsize (int): The maximum number of cached responses.
+        ttl (float): Seconds before a cached response is reloaded.
+        hits (int): Lookups answered from the cache since startup or the last clear.
+        misses (int): Lookups that went to the database since startup or the last clear.
+        hit_rate (float): The share of lookups answered from the cache.
+    """
+    enabled: bool = Field(..., description="Whether the cache is in use")
+    size: int = Field(..., description="The number of cached responses", ge=0)
+    maxsize: int = Field(..., description="The maximum number of cached responses", ge=0)
+    ttl: float = Field(..., description="Seconds before a cached response is reloaded", ge=0)
+    hits: int = Field(..., description="Lookups answered from the cache", ge=0)
+    misses: int = Field(..., description="Lookups that went to the database", ge=0)
+    hit_rate: float = Field(..., description="The share of lookups answered from the cache", ge=0, le=1)
+
+
+class SlowQueryModel(BaseModel):
+    """
+    Schema used for reporting one statement of the slow query log.
+
+    Attributes:
+        id (int): The position of the statement in the log of its worker process.
+        timestamp (datetime): When the statement finished.
+        duration_ms (float): How long the statement took, in milliseconds.
+        route (Optional[str]): The method and route template of the request that ran it, or None outside a tracked request.
+        statement (str): The SQL as sent to the database, with placeholders.
+        parameter_count (int): The number of bound values, or of parameter sets for executemany; the values are not logged.
+        executemany (bool): Whether the statement ran once per parameter set; those are not explained.
+        plan (Optional[str]): The `EXPLAIN` output, or None if the statement can't be explained.
+        analyzed (bool): Whether the plan comes from `EXPLAIN ANALYZE` and shows actual times and row counts.
+        explain_error (Optional[str]): Why capturing the plan failed, if it did.
+    """
+    id: int = Field(..., description="The position of the statement in the log of its worker process")
+    timestamp: datetime = Field(..., description="When the statement finished")
+    duration_ms: float = Field(..., description="How long the statement took, in milliseconds", ge=0)
+    route: Optional[str] = Field(None, description="The method and route template of the request that ran it")
+    statement: str = Field(..., description="The SQL as sent to the database, with placeholders")
+    parameter_count: int = Field(..., description="The number of bound values, or of parameter sets for executemany", ge=0)
+    executemany: bool = Field(..., description="Whether the statement ran once per parameter set")
+    plan: Optional[str] = Field(None, description="The EXPLAIN output of the statement")
+    analyzed: bool = Field(..., description="Whether the plan comes from EXPLAIN ANALYZE")
+    explain_error: Optional[str] = Field(None, description="Why capturing the plan failed, if it did")
+
+
+class SlowQueryLogModel(BaseModel):
+    """
+    Schema used for reporting the slow query log of the current worker process.
+
+    Attributes:
+        enabled (bool): Whether statements are timed and logged.
+        threshold_ms (float): Statements taking at least this many milliseconds are logged.
+        analyze_sample_rate (float): The share of logged statements explained with `ANALYZE`.
+        maxsize (int): The number of statements kept; older ones are dropped.
+        entries (List[SlowQueryModel]): The matching statements, newest first.
+    """
+    enabled: bool = Field(..., description="Whether statements are timed and logged")
+    threshold_ms: float = Field(..., description="Statements taking at least this many milliseconds are logged")
+    analyze_sample_rate: float = Field(..., description="The share of logged statements explained with ANALYZE")
+    maxsize: int = Field(..., description="The number of statements kept", ge=0)
+    entries: List[SlowQueryModel] = Field(..., description="The matching statements, newest first")
+
+
+class ProfiledStatementModel(BaseModel):
+    """
+    Schema used for reporting the SQL statements of a profiled request, grouped by their SQL.
+
+    Attributes:
+        statement (str): The SQL as sent to the database, with placeholders.
+        calls (int): How many times the request executed it.
+        duration_ms (float): The total time of those executions, in milliseconds.
+    """
+    statement: str = Field(..., description="The SQL as sent to the database, with placeholders")
+    calls: int = Field(..., description="How many times the request executed it", ge=1)
+    duration_ms: float = Field(..., description="The total time of those executions, in milliseconds", ge=0)
+
+
+class ProfileSummaryModel(BaseModel):
+    """
+    Schema used for listing the profiled requests of the current worker process.
+
+    Attributes:
+        id (int): The id returned in the `X-Profile-Id` header of the profiled response.
+        timestamp (datetime): When the request finished.
+        method (str): The HTTP method of the request.
+        route (str): The route template that handled the request, or `unmatched`.
+        path (str): The requested path.
+        status (int): The status code of the response.
+        duration_ms (float): How long the request took while profiled, in milliseconds.
+        sql_count (int): The number of SQL statements the request executed.
+        sql_duration_ms (float): The time spent executing them, in milliseconds.
+    """
+    id: int = Field(..., description="The id returned in the X-Profile-Id header of the profiled response")
+    timestamp: datetime = Field(..., description="When the request finished")
+    method: str = Field(..., description="The HTTP method of the request")
+    route: str = Field(..., description="The route template that handled the request")
+    path: str = Field(..., description="The requested path")
+    status: int = Field(..., description="The status code of the response")
+    duration_ms: float = Field(..., description="How long the request took while profiled, in milliseconds", ge=0)
+    sql_count: int = Field(..., description="The number of SQL statements the request executed", ge=0)
+    sql_duration_ms: float = Field(..., description="The time spent executing them, in milliseconds", ge=0)
+
+
+class ProfileModel(ProfileSummaryModel):
+    """
+    Schema used for reporting the profile of one request.
+
+    Attributes:
+        sql_statements (List[ProfiledStatementModel]): The statements, grouped by SQL, the most time-consuming first.
+        call_tree (str): The sampled calls that took at least 1% of the request, as an indented tree with their times.
+        top_functions (str): The functions the request spent the most time in themselves, from the same samples.
+    """
+    sql_statements: List[ProfiledStatementModel] = Field(..., description="The statements, grouped by SQL, the most time-consuming first")
+    call_tree: str = Field(..., description="The sampled calls that took at least 1% of the request, as an indented tree")
+    top_functions: str = Field(..., description="The functions the request spent the most time in themselves")
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -38,21 +39,21 @@ class StockModel(StockBase):
 
     Attributes:
         id (int): The unique identifier for the stock entry. Must be a positive integer.
-        item (ItemModel): The item associated with the stock.
-        warehouse (WarehouseModel): The warehouse where the stock is stored.
+        item (Optional[ItemModel]): The item associated with the stock, if expanded.
+        warehouse (Optional[WarehouseModel]): The warehouse where the stock is stored, if expanded.
     """
     id: int = Field(
         ...,
         description="The unique identifier for the stock entry",
         ge=1,  # Ensure the ID is a positive integer
     )
-    item: ItemModel = Field(
-        ...,
-        description="The item associated with the stock",
+    item: Optional[ItemModel] = Field(
+        None,
+        description="The item associated with the stock, included with `expand=item`",
     )
-    warehouse: WarehouseModel = Field(
-        ...,
-        description="The warehouse where the stock is stored",
+    warehouse: Optional[WarehouseModel] = Field(
+        None,
+        description="The warehouse where the stock is stored, included with `expand=warehouse`",
     )
 
     class Config:
@@ -62,4 +63,84 @@ class StockModel(StockBase):
         Attributes:
             from_attributes (bool): Enables ORM mode to map ORM objects to Pydantic models.
         """
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class StockLevelModel(BaseModel):
+    """
+    Schema used for representing the stock level of an item in a warehouse at a past date.
+
+    Attributes:
+        item_id (int): The unique identifier of the item.
+        warehouse_id (int): The unique identifier of the warehouse.
+        stock_level (int): The quantity on hand at the end of the date.
+    """
+    item_id: int = Field(..., description="The unique identifier of the item")
+    warehouse_id: int = Field(..., description="The unique identifier of the warehouse")
+    stock_level: int = Field(..., description="The quantity on hand at the end of the date")
+
+
+class StockAsOfModel(BaseModel):
+    """
+    Schema used for representing the stock levels at the end of a past date.
+
+    Attributes:
+        as_of (date): The date the levels are for.
+        snapshot_date (Optional[date]): The snapshot the levels were computed from, or None if the whole ledger was replayed.
+        stock (List[StockLevelModel]): The non-zero stock levels, ordered by item and warehouse.
+    """
+    as_of: date = Field(..., description="The date the levels are for")
+    snapshot_date: Optional[date] = Field(None, description="The snapshot the levels were computed from, if any")
+    stock: List[StockLevelModel] = Field(..., description="The non-zero stock levels, ordered by item and warehouse")
+
+
+class StockValueGroupModel(BaseModel):
+    """
+    Schema used for representing the units and value of one item, warehouse or category.
+
+    Attributes:
+        id (Optional[int]): The id of the item, warehouse or category; None for items without a category.
+        quantity (int): The number of units.
+        value (float): Their value at FIFO cost.
+    """
+    id: Optional[int] = Field(None, description="The id of the item, warehouse or category")
+    quantity: int = Field(..., description="The number of units")
+    value: float = Field(..., description="Their value at FIFO cost")
+
+
+class StockSummaryModel(StockValueGroupModel):
+    """
+    Schema used for representing the units on hand of one item, warehouse or category, read from its rollup.
+
+    Attributes:
+        group_by (str): What the id refers to: item, warehouse or category.
+    """
+    group_by: str = Field(..., description="What the id refers to: item, warehouse or category")
+
+
+class StockValuationModel(BaseModel):
+    """
+    Schema used for representing the value of the stock on hand at FIFO cost.
+
+    Attributes:
+        group_by (str): How the groups are formed: item, warehouse or category.
+        quantity (int): The units on hand in all groups.
+        value (float): Their value at FIFO cost, i.e. at the prices of the open lots they remain in.
+        groups (List[StockValueGroupModel]): The units on hand and their value per group, ordered by id.
+    """
+    group_by: str = Field(..., description="How the groups are formed: item, warehouse or category")
+    quantity: int = Field(..., description="The units on hand in all groups")
+    value: float = Field(..., description="Their value at FIFO cost")
+    groups: List[StockValueGroupModel] = Field(..., description="The units on hand and their value per group, ordered by id")
+
+
+class CostOfGoodsSoldModel(StockValuationModel):
+    """
+    Schema used for representing the cost of the units shipped over a period at FIFO cost.
+
+    Attributes:
+        date_from (date): The first day of the period.
+        date_to (date): The last day of the period.
+    """
+    date_from: date = Field(..., description="The first day of the period")
+    date_to: date = Field(..., description="The last day of the period")
@@ -1,6 +1,8 @@
 from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 from .item_schema import ItemModel
 from .warehouse_schema import WarehouseModel
@@ -16,7 +18,8 @@ class StockMovementBase(BaseModel):
         movement_type (str): The type of movement (e.g., 'in' or 'out'). Must be either 'in' or 'out'.
         quantity (int): The quantity of the item moved. Must be a positive integer.
         movement_date (date): The date when the movement occurred.
-        price (float): The price of the item. Must be a non-negative value.
+        price (float): The price of the item. Must be a non-negative value; lots are kept at
+            whole prices, so a fractional one is rounded half up, as imports round it.
     """
     item_id: int = Field(
         ...,
@@ -43,10 +46,17 @@ class StockMovementBase(BaseModel):
     )
     price: float = Field(
         ...,
-        description="The price of the item",
+        description="The price of the item, rounded to a whole number",
         ge=0.0,  # Ensure the price is non-negative
     )
 
+    @field_validator("price")
+    @classmethod
+    def round_price(cls, price: float) -> float:
+        # Rounded here rather than by the driver: asyncpg truncates a float bound to an
+        # integer column, while PostgreSQL rounds the numeric prices of imports half up.
+        return float(Decimal(str(price)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
 
 class StockMovementModel(StockMovementBase):
     """
@@ -54,21 +64,21 @@ class StockMovementModel(StockMovementBase):
 
     Attributes:
         id (int): The unique identifier for the stock movement entry. Must be a positive integer.
-        item (ItemModel): The item associated with the stock movement.
-        warehouse (WarehouseModel): The warehouse where the stock movement occurred.
+        item (Optional[ItemModel]): The item associated with the stock movement, if expanded.
+        warehouse (Optional[WarehouseModel]): The warehouse where the stock movement occurred, if expanded.
     """
     id: int = Field(
         ...,
         description="The unique identifier for the stock movement entry",
         ge=1,  # Ensure the ID is a positive integer
     )
-    item: ItemModel = Field(
-        ...,
-        description="The item associated with the stock movement",
+    item: Optional[ItemModel] = Field(
+        None,
+        description="The item associated with the stock movement, included with `expand=item`",
     )
-    warehouse: WarehouseModel = Field(
-        ...,
-        description="The warehouse where the stock movement occurred",
+    warehouse: Optional[WarehouseModel] = Field(
+        None,
+        description="The warehouse where the stock movement occurred, included with `expand=warehouse`",
     )
     remaining_quantity: int = Field(
         ...,
@@ -83,4 +93,86 @@ class StockMovementModel(StockMovementBase):
         Attributes:
             from_attributes (bool): Enables ORM mode to map ORM objects to Pydantic models.
         """
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class StockMovementBulkCreate(BaseModel):
+    """
+    Schema used for posting many stock movements in a single transaction.
+
+    Attributes:
+        movements (List[StockMovementBase]): The stock movements to add. Lines for the same item and warehouse are applied in date order.
+    """
+    movements: List[StockMovementBase] = Field(
+        ...,
+        description="The stock movements to add",
+        min_length=1,
+        max_length=10000,
+    )
+
+
+class StockMovementBulkResult(BaseModel):
+    """
+    Schema used for reporting the outcome of a single line of a bulk stock movement request.
+
+    Attributes:
+        line (int): The position of the movement in the request, starting at 0.
+        id (int): The unique identifier of the created stock movement.
+        movement_type (str): The type of movement (inflow or outflow).
+        quantity (int): The quantity of the item moved.
+        remaining_quantity (int): The quantity of the lot still available after the whole request was applied.
+    """
+    line: int = Field(..., description="The position of the movement in the request", ge=0)
+    id: int = Field(..., description="The unique identifier of the created stock movement", ge=1)
+    movement_type: str = Field(..., description="The type of movement (inflow or outflow)")
+    quantity: int = Field(..., description="The quantity of the item moved", ge=1)
+    remaining_quantity: int = Field(..., description="The remaining quantity of the lot after the request", ge=0)
+
+
+class StockMovementImportSummary(BaseModel):
+    """
+    Schema used for reporting the outcome of a stock movement import.
+
+    Attributes:
+        imported (int): The number of stock movements imported.
+        keys (int): The number of item/warehouse pairs whose stock levels and FIFO lots were rebuilt.
+    """
+    imported: int = Field(..., description="The number of stock movements imported", ge=0)
+    keys: int = Field(..., description="The number of item/warehouse pairs that were rebuilt", ge=0)
+
+
+class StockLotRestoreModel(BaseModel):
+    """
+    Schema used for reporting the units a reversed outflow gave back to one inflow lot.
+
+    Attributes:
+        inflow_id (int): The unique identifier of the inflow movement that holds the lot.
+        quantity (int): The number of units given back to the lot.
+        unit_price (int): The price of the lot, at which the units had been costed.
+    """
+    inflow_id: int = Field(..., description="The unique identifier of the inflow movement that holds the lot", ge=1)
+    quantity: int = Field(..., description="The number of units given back to the lot", ge=1)
+    unit_price: int = Field(..., description="The price of the lot", ge=0)
+
+
+class StockMovementReversalModel(BaseModel):
+    """
+    Schema used for reporting a reversed stock movement.
+
+    Attributes:
+        id (int): The unique identifier the reversed stock movement had.
+        item_id (int): The unique identifier of the item.
+        warehouse_id (int): The unique identifier of the warehouse.
+        movement_type (str): The type of the reversed movement (inflow or outflow).
+        quantity (int): The quantity of the reversed movement.
+        movement_date (date): The date of the reversed movement.
+        stock_level (int): The stock level of the item in the warehouse after the reversal.
+        lots (List[StockLotRestoreModel]): The lots a reversed outflow gave its units back to; empty for inflows.
+    """
+    id: int = Field(..., description="The unique identifier the reversed stock movement had", ge=1)
+    item_id: int = Field(..., description="The unique identifier of the item", ge=1)
+    warehouse_id: int = Field(..., description="The unique identifier of the warehouse", ge=1)
+    movement_type: str = Field(..., description="The type of the reversed movement (inflow or outflow)")
+    quantity: int = Field(..., description="The quantity of the reversed movement", ge=1)
+    movement_date: date = Field(..., description="The date of the reversed movement")
+    stock_level: int = Field(..., description="The stock level after the reversal", ge=0)
+    lots: List[StockLotRestoreModel] = Field(..., description="The lots the units were given back to")
@@ -0,0 +1,104 @@
+"""
+Compare the single-row and bulk stock movement endpoints over HTTP.
+
+Start the API, then run from the `app` directory:
+
+    python -m scripts.benchmark_bulk_movements --lines 2000 --batch-size 500
+
+The script creates a category, items and warehouses, then posts the same
+generated shipment of movements twice: once line by line to `/stock/movement/add`
+and once in batches to `/stock/movement/bulk`, each against its own warehouses.
+It prints lines per second for both and the speedup. The data is left in place,
+like `populate_db_via_api.py`.
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import date, timedelta
+
+import requests
+
+BASE_URL = "http://localhost:8000"  # Update this if your API runs on a different host/port
+
+
+def login():
+    """Authenticate and retrieve a token."""
+    credentials = {"username": "admin", "password": "admin"}  # Replace with actual credentials
+    response = requests.post(f"{BASE_URL}/login/", data=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def post(session, path, payload):
+    response = session.post(f"{BASE_URL}{path}", json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+def generate_movements(item_ids, warehouse_id, lines, rng):
+    """Inflows spread over the past months followed by smaller outflows, so no outflow is short."""
+    movements = []
+    for k in range(lines):
+        item_id = item_ids[k % len(item_ids)]
+        if k < lines * 2 // 3:
+            movements.append({
+                "item_id": item_id,
+                "warehouse_id": warehouse_id,
+                "movement_type": "inflow",
+                "quantity": rng.randint(10, 20),
+                "movement_date": (date.today() - timedelta(days=rng.randint(30, 120))).isoformat(),
+                "price": float(rng.randint(5, 50)),
+            })
+        else:
+            movements.append({
+                "item_id": item_id,
+                "warehouse_id": warehouse_id,
+                "movement_type": "outflow",
+                "quantity": rng.randint(1, 5),
+                "movement_date": (date.today() - timedelta(days=rng.randint(0, 29))).isoformat(),
+                "price": float(rng.randint(5, 50)),
+            })
+    return movements
+
+
+def run(lines, batch_size, items):
+    rng = random.Random(7)
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {login()}"
+    suffix = uuid.uuid4().hex[:8]
+
+    category_id = post(session, "/categories/add", {"name": f"Bulk benchmark {suffix}"})["id"]
+    item_ids = [
+        post(session, "/items/add", {"name": f"Bulk item {k}", "description": "Bulk benchmark item", "category_id": category_id})["id"]
+        for k in range(items)
+    ]
+    single_warehouse = post(session, "/warehouses/add", {"name": f"Single {suffix}", "location": "Benchmark"})["id"]
+    bulk_warehouse = post(session, "/warehouses/add", {"name": f"Bulk {suffix}", "location": "Benchmark"})["id"]
+
+    movements = generate_movements(item_ids, single_warehouse, lines, rng)
+    movements.sort(key=lambda movement: movement["movement_date"])
+
+    start = time.perf_counter()
+    for movement in movements:
+        post(session, "/stock/movement/add", movement)
+    single_time = time.perf_counter() - start
+
+    bulk_movements = [{**movement, "warehouse_id": bulk_warehouse} for movement in movements]
+    start = time.perf_counter()
+    for offset in range(0, len(bulk_movements), batch_size):
+        post(session, "/stock/movement/bulk", {"movements": bulk_movements[offset:offset + batch_size]})
+    bulk_time = time.perf_counter() - start
+
+    print(f"single-row: {lines / single_time:>10.0f} lines/s ({single_time:.2f}s)")
+    print(f"bulk:       {lines / bulk_time:>10.0f} lines/s ({bulk_time:.2f}s, batches of {batch_size})")
+    print(f"speedup:    {single_time / bulk_time:>10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2000, help="Number of movements to post")
+    parser.add_argument("--batch-size", type=int, default=500, help="Lines per bulk request")
+    parser.add_argument("--items", type=int, default=50, help="Number of items to spread the lines over")
+    args = parser.parse_args()
+    run(args.lines, args.batch_size, args.items)
@@ -0,0 +1,106 @@
+"""
+Measure API throughput and tail latency under concurrent clients.
+
+Start the API with a single worker, then run from the `app` directory:
+
+    uvicorn main:app --workers 1
+    python -m scripts.benchmark_concurrent_requests --duration 10
+
+For each concurrency level (1, 16 and 128 clients by default) every client sends
+database-backed GET requests back to back for `--duration` seconds: a page of stock
+movements, a page of stock and a single item, in turn. The script prints requests per
+second and p50/p99 latency per level; requests that fail or take longer than
+`--timeout` seconds are counted as errors. To compare before and after a change, run it
+once against each version of the API on the same data, e.g. one populated with
+`populate_db_via_api.py`.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://localhost:8000"  # Update this if your API runs on a different host/port
+
+
+def login():
+    """Authenticate and retrieve a token."""
+    credentials = {"username": "admin", "password": "admin"}  # Replace with actual credentials
+    response = requests.post(f"{BASE_URL}/login/", data=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def request_paths(session):
+    """The rotation of read requests every client sends."""
+    items = session.get(f"{BASE_URL}/items/get", params={"limit": 100})
+    items.raise_for_status()
+    item_ids = [item["id"] for item in items.json()] or [1]
+    paths = []
+    for item_id in item_ids:
+        paths.append(("/stock/movement/get", {"limit": 50, "item_id": item_id}))
+        paths.append(("/stock/get", {"limit": 50, "item_id": item_id}))
+        paths.append((f"/items/get/{item_id}", None))
+    return paths
+
+
+def client_loop(token, paths, offset, deadline, timeout, latencies, errors, lock):
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    own_latencies, own_errors = [], 0
+    k = offset
+    while time.perf_counter() < deadline:
+        path, params = paths[k % len(paths)]
+        k += 1
+        start = time.perf_counter()
+        try:
+            response = session.get(f"{BASE_URL}{path}", params=params, timeout=timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        own_latencies.append(time.perf_counter() - start)
+        own_errors += not ok
+    with lock:
+        latencies.extend(own_latencies)
+        errors.append(own_errors)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run(levels, duration, timeout):
+    token = login()
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    paths = request_paths(session)
+
+    print(f"{'clients':>8} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for clients in levels:
+        latencies, errors, lock = [], [], threading.Lock()
+        start = time.perf_counter()
+        deadline = start + duration
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            futures = [
+                pool.submit(client_loop, token, paths, k * 7, deadline, timeout, latencies, errors, lock)
+                for k in range(clients)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        print(f"{clients:>8} {len(latencies):>9} {len(latencies) / elapsed:>9.0f} "
+              f"{percentile(latencies, 0.50) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} {sum(errors):>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 128], help="Concurrency levels to measure")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run each concurrency level")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as failed")
+    parser.add_argument("--base-url", default=BASE_URL, help="Base URL of the API")
+    args = parser.parse_args()
+    BASE_URL = args.base_url.rstrip("/")
+    run(args.clients, args.duration, args.timeout)
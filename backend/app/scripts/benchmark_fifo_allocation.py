@@ -0,0 +1,137 @@
+"""
+Benchmark the set-based FIFO allocation against the original Python loop.
+
+Run from the `app` directory against a development database:
+
+    python -m scripts.benchmark_fifo_allocation --lots 10 1000 100000
+
+Every run happens inside a transaction that is rolled back at the end, so no
+data is left behind. For each lot count and outflow size both implementations
+are executed from the same starting state and the resulting lot quantities are
+compared; the script exits with an error if they ever differ.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from models import Category, Item, StockMovement, Warehouse
+from core.database import SessionLocal
+from services import allocate_outflow
+from sqlalchemy import insert, select
+
+OUTFLOW_DATE = date(2200, 1, 1)
+
+
+def allocate_outflow_loop(db, item_id, warehouse_id, quantity, movement_date):
+    """The allocation loop that `add_stock_movement` used before the set-based engine."""
+    remaining_quantity = quantity
+    inflow_movements = db.query(StockMovement).filter(
+        StockMovement.item_id == item_id,
+        StockMovement.warehouse_id == warehouse_id,
+        StockMovement.remaining_quantity > 0,
+        StockMovement.movement_type == "inflow",
+        StockMovement.movement_date < movement_date
+    ).order_by(StockMovement.movement_date).all()
+
+    for inflow in inflow_movements:
+        if remaining_quantity <= 0:
+            break
+        if inflow.remaining_quantity >= remaining_quantity:
+            inflow.remaining_quantity -= remaining_quantity
+            remaining_quantity = 0
+        else:
+            remaining_quantity -= inflow.remaining_quantity
+            inflow.remaining_quantity = 0
+    db.flush()
+    return remaining_quantity
+
+
+def lot_state(db, item_id, warehouse_id):
+    return db.execute(
+        select(StockMovement.id, StockMovement.remaining_quantity)
+        .where(StockMovement.item_id == item_id, StockMovement.warehouse_id == warehouse_id)
+        .order_by(StockMovement.id)
+    ).all()
+
+
+def seed_lots(db, item_id, warehouse_id, count, rng):
+    """Insert `count` inflow lots with distinct dates, some of them already partly consumed."""
+    start = OUTFLOW_DATE - timedelta(days=count + 1)
+    rows = []
+    for k in range(count):
+        quantity = rng.randint(1, 20)
+        rows.append({
+            "item_id": item_id,
+            "warehouse_id": warehouse_id,
+            "movement_type": "inflow",
+            "quantity": quantity,
+            "remaining_quantity": rng.choice([0, rng.randint(1, quantity), quantity]),
+            "movement_date": start + timedelta(days=k),
+            "price": 10,
+        })
+    db.execute(insert(StockMovement), rows)
+    return sum(row["remaining_quantity"] for row in rows)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(lot_counts, seed):
+    rng = random.Random(seed)
+    db = SessionLocal()
+    try:
+        category = Category(name="benchmark")
+        db.add(category)
+        db.flush()
+        item = Item(name="benchmark", description="FIFO benchmark item", category_id=category.id)
+        warehouse = Warehouse(name=f"benchmark-{seed}", location="benchmark")
+        db.add_all([item, warehouse])
+        db.flush()
+
+        print(f"{'open lots':>10} {'outflow qty':>12} {'lots used':>10} {'loop ms':>10} {'set ms':>10} {'speedup':>8}")
+        for count in lot_counts:
+            db.query(StockMovement).filter(StockMovement.item_id == item.id).delete()
+            available = seed_lots(db, item.id, warehouse.id, count, rng)
+            # The outflow the set-based allocations are recorded for.
+            outflow = StockMovement(item_id=item.id, warehouse_id=warehouse.id, movement_type="outflow",
+                                    quantity=1, remaining_quantity=0, movement_date=OUTFLOW_DATE, price=0)
+            db.add(outflow)
+            db.flush()
+            outflow_id = outflow.id
+            db.expire_all()
+
+            for quantity in sorted({1, max(1, available // 2), available, available + 1}):
+                savepoint = db.begin_nested()
+                short_loop, loop_time = timed(allocate_outflow_loop, db, item.id, warehouse.id, quantity, OUTFLOW_DATE)
+                expected = lot_state(db, item.id, warehouse.id)
+                savepoint.rollback()
+                db.expire_all()
+
+                savepoint = db.begin_nested()
+                allocations, set_time = timed(allocate_outflow, db, item.id, warehouse.id, quantity, OUTFLOW_DATE, outflow_id)
+                actual = lot_state(db, item.id, warehouse.id)
+                savepoint.rollback()
+
+                short_set = quantity - sum(allocation.quantity for allocation in allocations)
+                if actual != expected or short_set != short_loop:
+                    raise SystemExit(f"Mismatch for {count} lots and outflow of {quantity}")
+
+                print(f"{count:>10} {quantity:>12} {len(allocations):>10} "
+                      f"{loop_time * 1000:>10.2f} {set_time * 1000:>10.2f} {loop_time / set_time:>7.1f}x")
+    finally:
+        db.rollback()
+        db.close()
+
+    print("Set-based allocation matches the loop for every case.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lots", type=int, nargs="+", default=[10, 1_000, 100_000], help="Open lot counts to benchmark")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for lot quantities")
+    args = parser.parse_args()
+    run(args.lots, args.seed)
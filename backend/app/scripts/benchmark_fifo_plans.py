@@ -0,0 +1,204 @@
+"""
+Show the query plans of the FIFO allocation, the stock update and a ledger report without
+and with the indexes of migration 0002.
+
+Run from the `app` directory against a development database at the latest migration:
+
+    python -m scripts.benchmark_fifo_plans --items 50 --warehouses 20 --movements 200
+
+The script seeds `items * warehouses` keys with `movements` ledger rows each, most of
+their inflow lots already consumed, and runs `ANALYZE`. It then captures the statements
+that `allocate_outflow` and `apply_stock_delta` send for an outflow of one key, plus a
+date-range report of one warehouse, and prints their `EXPLAIN (ANALYZE, BUFFERS)` plans:
+first with the new indexes and the unique stock key dropped inside a savepoint ("before"),
+then with them in place ("after"). It exits with an error if the allocation differs.
+
+Everything happens inside a transaction that is rolled back at the end, so no data is left
+behind. Dropping the indexes locks the tables until then; don't run it against a busy
+database.
+"""
+import argparse
+import re
+from datetime import date, timedelta
+
+from core.database import SessionLocal
+from models import Category, Item, StockMovement, Warehouse
+from services import allocate_outflow
+from services.stock_ledger import apply_stock_delta
+from sqlalchemy import event, insert, select, text
+
+FIRST_DATE = date(2000, 1, 1)
+OPEN_SHARE = 0.05  # Share of each key's inflow lots still open, the newest ones
+LOT_QUANTITY = 10
+
+NEW_INDEXES = [
+    "DROP INDEX ix_stock_movements_open_lots",
+    "DROP INDEX ix_stock_movements_item_id_movement_date",
+    "DROP INDEX ix_stock_movements_warehouse_id_movement_date",
+    "DROP INDEX ix_stock_warehouse_id",
+    "ALTER TABLE stock DROP CONSTRAINT uq_stock_item_id_warehouse_id",
+]
+
+SEED_MOVEMENTS = text("""
+    INSERT INTO stock_movements (item_id, warehouse_id, movement_type, quantity, remaining_quantity, movement_date, price)
+    SELECT i.id, w.id,
+           CASE WHEN g % 4 = 0 THEN 'outflow' ELSE 'inflow' END,
+           :quantity,
+           CASE WHEN g % 4 <> 0 AND g > :movements * (1 - :open_share) THEN :quantity ELSE 0 END,
+           CAST(:first_date AS date) + g,
+           10
+    FROM items i, warehouses w, generate_series(1, :movements) g
+    WHERE i.category_id = :category_id AND w.location = 'benchmark'
+""")
+
+SEED_STOCK = text("""
+    INSERT INTO stock (item_id, warehouse_id, stock_level)
+    SELECT item_id, warehouse_id, SUM(remaining_quantity)
+    FROM stock_movements
+    WHERE item_id IN (SELECT id FROM items WHERE category_id = :category_id)
+    GROUP BY item_id, warehouse_id
+""")
+
+
+def seed(db, items, warehouses, movements):
+    """Add the benchmark items, warehouses, ledger and stock rows; return one key in the middle."""
+    category = Category(name="benchmark")
+    db.add(category)
+    db.flush()
+    db.execute(insert(Item), [
+        {"name": f"benchmark-{k}", "description": "FIFO plan benchmark item", "category_id": category.id}
+        for k in range(items)
+    ])
+    db.execute(insert(Warehouse), [{"name": f"benchmark-{k}", "location": "benchmark"} for k in range(warehouses)])
+    db.execute(SEED_MOVEMENTS, {
+        "quantity": LOT_QUANTITY, "movements": movements, "open_share": OPEN_SHARE,
+        "first_date": FIRST_DATE, "category_id": category.id,
+    })
+    db.execute(SEED_STOCK, {"category_id": category.id})
+    db.execute(text("ANALYZE stock_movements"))
+    db.execute(text("ANALYZE stock"))
+
+    item_ids = db.scalars(select(Item.id).where(Item.category_id == category.id).order_by(Item.id)).all()
+    warehouse_ids = db.scalars(select(Warehouse.id).where(Warehouse.location == "benchmark").order_by(Warehouse.id)).all()
+    return item_ids[len(item_ids) // 2], warehouse_ids[len(warehouse_ids) // 2]
+
+
+def captured(db, fn, *args):
+    """Run `fn` inside a savepoint that is rolled back; return its result and the first statement it sent."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", capture)
+    savepoint = db.begin_nested()
+    try:
+        result = fn(db, *args)
+        if hasattr(result, "__iter__"):
+            result = sorted(tuple(row) for row in result)
+    finally:
+        savepoint.rollback()
+        event.remove(connection, "before_cursor_execute", capture)
+    # The savepoint itself is issued through the same events; skip it.
+    statement = next(entry for entry in statements if not entry[0].startswith(("SAVEPOINT", "ROLLBACK")))
+    return result, statement
+
+
+def explain(db, statement, parameters, repeat):
+    """The plan of the last of `repeat` EXPLAIN ANALYZE runs and the fastest execution time, in ms."""
+    cursor = db.connection().connection.cursor()
+    best, plan = float("inf"), ""
+    try:
+        for _ in range(repeat):
+            cursor.execute("SAVEPOINT fifo_plan")
+            try:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT fifo_plan")
+                cursor.execute("RELEASE SAVEPOINT fifo_plan")
+            best = min(best, float(re.search(r"Execution Time: ([\d.]+) ms", plan).group(1)))
+    finally:
+        cursor.close()
+    return plan, best
+
+
+def warehouse_report(db, warehouse_id, date_from, date_to):
+    """One page of a warehouse's ledger over a date range, as `GET /stock/movement/get` reads it."""
+    return db.execute(
+        select(StockMovement.id, StockMovement.item_id, StockMovement.quantity)
+        .where(
+            StockMovement.warehouse_id == warehouse_id,
+            StockMovement.movement_date >= date_from,
+            StockMovement.movement_date <= date_to,
+        )
+        .order_by(StockMovement.movement_date, StockMovement.id)
+        .limit(100)
+    ).all()
+
+
+def measure(db, item_id, warehouse_id, movements, repeat):
+    outflow_date = FIRST_DATE + timedelta(days=movements + 1)
+    quantity = LOT_QUANTITY * 3 + 1  # Spans four lots
+    date_from = FIRST_DATE + timedelta(days=movements // 2)
+    outflow_id = db.scalar(
+        select(StockMovement.id)
+        .where(StockMovement.item_id == item_id, StockMovement.warehouse_id == warehouse_id,
+               StockMovement.movement_type == "outflow")
+        .order_by(StockMovement.id.desc())
+        .limit(1)
+    )
+    cases = [
+        ("FIFO allocation", allocate_outflow, (item_id, warehouse_id, quantity, outflow_date, outflow_id)),
+        ("Stock update", apply_stock_delta, (item_id, warehouse_id, -quantity)),
+        ("Warehouse report", warehouse_report, (warehouse_id, date_from, date_from + timedelta(days=30))),
+    ]
+    results = {}
+    for name, fn, args in cases:
+        result, (statement, parameters) = captured(db, fn, *args)
+        plan, best = explain(db, statement, parameters, repeat)
+        results[name] = (result, plan, best)
+    return results
+
+
+def run(items, warehouses, movements, repeat):
+    db = SessionLocal()
+    try:
+        item_id, warehouse_id = seed(db, items, warehouses, movements)
+        print(f"Seeded {items * warehouses * movements} movements over {items * warehouses} keys; "
+              f"measuring item {item_id} in warehouse {warehouse_id}.\n")
+
+        savepoint = db.begin_nested()
+        for statement in NEW_INDEXES:
+            db.execute(text(statement))
+        before = measure(db, item_id, warehouse_id, movements, repeat)
+        savepoint.rollback()
+        after = measure(db, item_id, warehouse_id, movements, repeat)
+    finally:
+        db.rollback()
+        db.close()
+
+    for name in before:
+        for label, (_, plan, best) in (("before", before[name]), ("after", after[name])):
+            print(f"=== {name}, {label}: {best:.3f} ms")
+            print(plan)
+            print()
+
+    print(f"{'statement':<18} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in before:
+        old, new = before[name][2], after[name][2]
+        print(f"{name:<18} {old:>10.3f} {new:>10.3f} {old / new:>7.1f}x")
+    if before["FIFO allocation"][0] != after["FIFO allocation"][0]:
+        raise SystemExit("The FIFO allocation differs with the new indexes")
+    print("The FIFO allocation consumes the same lots with and without the new indexes.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50, help="Number of benchmark items")
+    parser.add_argument("--warehouses", type=int, default=20, help="Number of benchmark warehouses")
+    parser.add_argument("--movements", type=int, default=200, help="Ledger rows per item and warehouse")
+    parser.add_argument("--repeat", type=int, default=5, help="EXPLAIN ANALYZE runs per statement; the fastest is reported")
+    args = parser.parse_args()
+    run(args.items, args.warehouses, args.movements, args.repeat)
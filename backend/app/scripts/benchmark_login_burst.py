@@ -0,0 +1,101 @@
+"""
+Measure how a burst of logins affects the latency of unrelated requests.
+
+Start the API with a single worker, then run from the `app` directory:
+
+    uvicorn main:app --workers 1
+    python -m scripts.benchmark_login_burst --logins 32
+
+A few probe clients send cheap requests (the health check and a page of categories)
+back to back, first alone for `--duration` seconds and then for another `--duration`
+seconds while `--logins` clients log in as fast as they can, like scanners at a shift
+change. The script prints the probes' p50/p99 latency in both phases and the logins per
+second reached. When password hashing blocks the event loop, the probes' p99 during the
+burst grows to several bcrypt rounds; when it runs off the loop it stays close to the
+quiet phase. Run it once against each version of the API to compare.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://localhost:8000"  # Update this if your API runs on a different host/port
+CREDENTIALS = {"username": "admin", "password": "admin"}  # Replace with actual credentials
+PROBE_PATHS = [("/health/", None), ("/categories/get", {"limit": 20})]
+
+
+def login():
+    """Authenticate and retrieve a token."""
+    response = requests.post(f"{BASE_URL}/login/", data=CREDENTIALS)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def probe_loop(token, deadline, latencies, errors, lock):
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    own_latencies, own_errors = [], 0
+    k = 0
+    while time.perf_counter() < deadline:
+        path, params = PROBE_PATHS[k % len(PROBE_PATHS)]
+        k += 1
+        start = time.perf_counter()
+        try:
+            ok = session.get(f"{BASE_URL}{path}", params=params, timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        own_latencies.append(time.perf_counter() - start)
+        own_errors += not ok
+    with lock:
+        latencies.extend(own_latencies)
+        errors.append(own_errors)
+
+
+def login_loop(deadline, counts, lock):
+    session = requests.Session()
+    logins = 0
+    while time.perf_counter() < deadline:
+        try:
+            logins += session.post(f"{BASE_URL}/login/", data=CREDENTIALS, timeout=30).status_code == 200
+        except requests.RequestException:
+            pass
+    with lock:
+        counts.append(logins)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_phase(token, probes, logins, duration):
+    latencies, errors, login_counts, lock = [], [], [], threading.Lock()
+    deadline = time.perf_counter() + duration
+    with ThreadPoolExecutor(max_workers=probes + logins) as pool:
+        futures = [pool.submit(probe_loop, token, deadline, latencies, errors, lock) for _ in range(probes)]
+        futures += [pool.submit(login_loop, deadline, login_counts, lock) for _ in range(logins)]
+        for future in futures:
+            future.result()
+    latencies.sort()
+    return latencies, sum(errors), sum(login_counts) / duration
+
+
+def run(probes, logins, duration):
+    token = login()
+    print(f"{'phase':>8} {'probes':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'logins/s':>9}")
+    for phase, burst in (("quiet", 0), ("burst", logins)):
+        latencies, errors, login_rate = run_phase(token, probes, burst, duration)
+        print(f"{phase:>8} {len(latencies):>7} {percentile(latencies, 0.50) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} {errors:>7} {login_rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probes", type=int, default=4, help="Clients sending unrelated requests")
+    parser.add_argument("--logins", type=int, default=32, help="Clients logging in during the burst")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run each phase")
+    parser.add_argument("--base-url", default=BASE_URL, help="Base URL of the API")
+    args = parser.parse_args()
+    BASE_URL = args.base_url.rstrip("/")
+    run(args.probes, args.logins, args.duration)
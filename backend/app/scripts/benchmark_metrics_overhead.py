@@ -0,0 +1,146 @@
+"""
+Measure the time `MetricsMiddleware` adds to each request.
+
+Needs no database or running API; run from the `app` directory:
+
+    python -m scripts.benchmark_metrics_overhead --requests 20000
+
+The script calls two ASGI apps directly, without a server or network in between, with
+and without the middleware around them, alternating between the two:
+
+- `bare app`: an app that only sends a small response, so the difference is the
+  middleware alone.
+- `FastAPI /health/`: the API's routers in a FastAPI app, called on the health check,
+  which runs no SQL.
+
+It then times the SQL statement hooks, which run twice per statement while a request is
+tracked, and rendering `/metrics` with every route of the API recorded. Each figure is
+the best of `--repeat` runs. The script exits with status 1 if the middleware adds more
+than `--budget` microseconds per request to the bare app; the FastAPI figures vary by a
+few microseconds from run to run, more than the middleware itself costs.
+"""
+import argparse
+import asyncio
+import time
+
+from api import api_router
+from core.metrics import HttpMetrics, MetricsMiddleware
+from core.sql_stats import (SqlStats, _after_cursor_execute,
+                            _before_cursor_execute, start_sql_stats,
+                            stop_sql_stats)
+from fastapi import FastAPI
+
+
+class _Route:
+    path = "/benchmark/{id}"
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"status":"ok"}'})
+
+
+def fastapi_app():
+    app = FastAPI()
+    app.include_router(api_router)
+    return app
+
+
+def recorded_metrics():
+    """A metrics registry holding a series for every route of the API, as after some uptime."""
+    metrics = HttpMetrics()
+    for path, operations in fastapi_app().openapi()["paths"].items():
+        route = type("Route", (), {"path": path})
+        for method in operations:
+            scope = {"method": method.upper(), "route": route}
+            for status in (200, 404):
+                metrics.observe(scope, status, 0.01, SqlStats())
+    return metrics
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+def _scope(path):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+    }
+
+
+async def _time_requests(app, path, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        await app(_scope(path), _receive, _send)
+    return (time.perf_counter() - start) / count
+
+
+def time_apps(app, wrapped, path, count, repeat):
+    """Best time per request of `app` and of `wrapped` on `path`, in seconds, measured alternately."""
+    without, with_metrics = [], []
+    for _ in range(repeat):
+        without.append(asyncio.run(_time_requests(app, path, count)))
+        with_metrics.append(asyncio.run(_time_requests(wrapped, path, count)))
+    return min(without), min(with_metrics)
+
+
+def time_sql_hooks(count, repeat):
+    """Best time of the before/after cursor hooks of one statement in a tracked request, in seconds."""
+
+    class Connection:
+        info = {}
+
+    def run():
+        stats, token = start_sql_stats()
+        connection = Connection()
+        start = time.perf_counter()
+        for _ in range(count):
+            _before_cursor_execute(connection, None, "SELECT 1", None, None, False)
+            _after_cursor_execute(connection, None, "SELECT 1", None, None, False)
+        elapsed = time.perf_counter() - start
+        stop_sql_stats(token)
+        return elapsed / count
+
+    return min(run() for _ in range(repeat))
+
+
+def time_render(metrics, repeat):
+    def run():
+        start = time.perf_counter()
+        body = metrics.render()
+        return time.perf_counter() - start, len(body)
+
+    return min(run() for _ in range(repeat))
+
+
+def run(count, repeat, budget):
+    print(f"{'app':<18} {'without us':>11} {'with us':>9} {'overhead us':>12}")
+    overhead = None
+    for name, app, path in [("bare app", bare_app, "/benchmark/1"), ("FastAPI /health/", fastapi_app(), "/health/")]:
+        without, with_metrics = time_apps(app, MetricsMiddleware(app, recorded_metrics()), path, count, repeat)
+        overhead = overhead if overhead is not None else with_metrics - without
+        print(f"{name:<18} {without * 1e6:>11.1f} {with_metrics * 1e6:>9.1f} {(with_metrics - without) * 1e6:>12.1f}")
+
+    print(f"SQL hooks per statement: {time_sql_hooks(count, repeat) * 1e6:.1f} us")
+    metrics = recorded_metrics()
+    render_time, size = time_render(metrics, repeat)
+    print(f"Rendering /metrics for {len(metrics.requests.series)} series: {render_time * 1000:.1f} ms, {size} bytes")
+
+    if overhead * 1e6 > budget:
+        raise SystemExit(f"The middleware adds more than {budget:.0f} us per request.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000, help="Requests per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best one is reported")
+    parser.add_argument("--budget", type=float, default=50.0, help="Largest acceptable overhead per request, in us")
+    args = parser.parse_args()
+    run(args.requests, args.repeat, args.budget)
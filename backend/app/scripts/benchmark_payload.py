@@ -0,0 +1,73 @@
+"""
+Measure response size and latency of the stock list routes per field selection.
+
+Start the API and populate it, e.g. with `populate_db_via_api.py` and
+`benchmark_bulk_movements.py`, then run from the `app` directory:
+
+    python -m scripts.benchmark_payload --repeat 5
+
+Every stock and stock movement list is fetched in full (no `limit`) with each field
+selection below, `--repeat` times. The script prints the rows, the response size and the
+median latency of each. `expand=item,warehouse` returns the same body as these routes did
+before `fields=` and `expand=` existed, so running the script against both versions of
+the API compares the old default with the new one. Responses are fetched with
+`Accept-Encoding: identity`, so sizes are the uncompressed JSON.
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+BASE_URL = "http://localhost:8000"  # Update this if your API runs on a different host/port
+
+SELECTIONS = [
+    ("expand=item,warehouse", {"expand": "item,warehouse"}),
+    ("ids only (default)", {}),
+    ("fields=quantity,movement_date", {"fields": "quantity,movement_date"}),
+    ("fields=stock_level", {"fields": "stock_level"}),
+]
+ROUTES = {
+    "/stock/movement/get": ["expand=item,warehouse", "ids only (default)", "fields=quantity,movement_date"],
+    "/stock/get": ["expand=item,warehouse", "ids only (default)", "fields=stock_level"],
+}
+
+
+def login():
+    """Authenticate and retrieve a token."""
+    credentials = {"username": "admin", "password": "admin"}  # Replace with actual credentials
+    response = requests.post(f"{BASE_URL}/login/", data=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def measure(session, path, params, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = session.get(f"{BASE_URL}{path}", params=params)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return len(response.json()), len(response.content), statistics.median(latencies)
+
+
+def run(repeat):
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {login()}"
+    session.headers["Accept-Encoding"] = "identity"
+    selections = dict(SELECTIONS)
+
+    print(f"{'route':<20} {'selection':<30} {'rows':>7} {'bytes':>11} {'bytes/row':>9} {'median ms':>10}")
+    for path, names in ROUTES.items():
+        for name in names:
+            rows, size, latency = measure(session, path, selections[name], repeat)
+            print(f"{path:<20} {name:<30} {rows:>7} {size:>11} {size / max(rows, 1):>9.0f} {latency * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Requests per route and selection; the median is reported")
+    parser.add_argument("--base-url", default=BASE_URL, help="Base URL of the API")
+    args = parser.parse_args()
+    BASE_URL = args.base_url.rstrip("/")
+    run(args.repeat)
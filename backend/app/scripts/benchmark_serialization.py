@@ -0,0 +1,126 @@
+"""
+Compare ways of turning stock movement rows into a JSON response body.
+
+Needs no database or running API; run from the `app` directory:
+
+    python -m scripts.benchmark_serialization --rows 100000
+
+The script builds `--rows` unsaved `StockMovement` objects with their item, category and
+warehouse attached, as a list route gets them from the session, and times each way of
+producing the response body:
+
+- `response_model`: what FastAPI does with ORM rows returned from a route, validating
+  them with the route's compiled `TypeAdapter` and dumping straight to JSON bytes.
+- `model_validate + response_model`: validating every row with `model_validate` in the
+  route first, so FastAPI validates the resulting models a second time.
+- `model_dump + response_model`: returning dicts from `model_dump()`, as `create_user`
+  used to, so FastAPI validates plain dicts again.
+- `validate_rows + orjson`: validating once, dumping to Python data and encoding with
+  orjson, which is what an `ORJSONResponse` default response class does. Skipped when
+  orjson is not installed.
+- `validate_rows + dump_json`: validating once with `core.validate_rows` and serializing
+  with `core.dump_json`, as cached routes do.
+- `cached bytes`: a reference cache hit, which sends the bytes of an earlier response.
+
+Every variant must produce the same JSON; the script checks that before timing.
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from typing import List
+
+import models as models
+from core import dump_json, type_adapter, validate_rows
+from fastapi.encoders import jsonable_encoder
+from models import Category, Item, StockMovement, Warehouse
+from schemas import StockMovementModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def build_rows(count):
+    categories = [Category(id=k + 1, name=f"Category {k}") for k in range(10)]
+    items = [
+        Item(id=k + 1, name=f"Item {k}", description="Benchmark item", category_id=categories[k % 10].id,
+             category=categories[k % 10])
+        for k in range(1000)
+    ]
+    warehouses = [Warehouse(id=k + 1, name=f"Warehouse {k}", location="Benchmark") for k in range(20)]
+    start = date(2024, 1, 1)
+    return [
+        StockMovement(
+            id=k + 1,
+            item_id=items[k % 1000].id, item=items[k % 1000],
+            warehouse_id=warehouses[k % 20].id, warehouse=warehouses[k % 20],
+            movement_type="inflow" if k % 3 else "outflow",
+            quantity=k % 50 + 1, remaining_quantity=k % 7,
+            movement_date=start + timedelta(days=k % 365),
+            price=k % 100,
+        )
+        for k in range(count)
+    ]
+
+
+def variants(rows):
+    """`(name, function)` pairs; each function turns `rows` into a JSON body."""
+    response_field = type_adapter(List[StockMovementModel])
+    cached_body = dump_json(List[StockMovementModel], validate_rows(StockMovementModel, rows))
+
+    def response_model(data):
+        # FastAPI validates the route's return value, then dumps the validated value.
+        return response_field.dump_json(response_field.validate_python(data, from_attributes=True))
+
+    result = [
+        ("response_model", lambda: response_model(rows)),
+        ("model_validate + response_model",
+         lambda: response_model([StockMovementModel.model_validate(row) for row in rows])),
+        ("model_dump + response_model",
+         lambda: response_model([StockMovementModel.model_validate(row).model_dump() for row in rows])),
+    ]
+    if orjson is not None:
+        result.append(("validate_rows + orjson",
+                       lambda: orjson.dumps(response_field.dump_python(validate_rows(StockMovementModel, rows), mode="json"))))
+    result += [
+        ("validate_rows + dump_json",
+         lambda: dump_json(List[StockMovementModel], validate_rows(StockMovementModel, rows))),
+        ("cached bytes", lambda: cached_body),
+    ]
+    return result
+
+
+def check_equivalent(rows, named_variants):
+    expected = jsonable_encoder([StockMovementModel.model_validate(row) for row in rows])
+    for name, produce in named_variants:
+        if json.loads(produce()) != expected:
+            raise SystemExit(f"{name} produced a different body.")
+
+
+def run(count, repeat):
+    rows = build_rows(count)
+    named_variants = variants(rows)
+    check_equivalent(rows[:1000], variants(rows[:1000]))
+
+    print(f"{'variant':<34} {'best ms':>9} {'us/row':>7} {'vs response_model':>18}")
+    baseline = None
+    for name, produce in named_variants:
+        best = min(_time(produce) for _ in range(repeat))
+        baseline = baseline or best
+        print(f"{name:<34} {best * 1000:>9.1f} {best / count * 1e6:>7.2f} {best / baseline:>17.0%}")
+
+
+def _time(produce):
+    start = time.perf_counter()
+    produce()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of stock movement rows")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best one is reported")
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
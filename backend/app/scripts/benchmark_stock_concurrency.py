@@ -0,0 +1,179 @@
+"""
+Multi-threaded stress benchmark for stock movement writes.
+
+Run from the `app` directory against a development database:
+
+    python -m scripts.benchmark_stock_concurrency --writers 1 2 4 8 16 32
+
+For every writer count two scenarios are run:
+
+- `shared`: all writers post 1-unit outflows against the same item/warehouse,
+  which holds fewer units than the writers try to take in total.
+- `spread`: every writer posts outflows against its own item, so writers never
+  contend for the same key.
+
+After each run the script checks that nothing was oversold: the accepted outflows
+never exceed the stock that was received, `stock.stock_level` matches the ledger,
+and the open lot quantities add up to the stock level. It exits with an error on
+any violation. Benchmark data is committed while running and deleted afterwards.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from models import (Category, Item, Stock, StockMovement,
+                    StockMovementAllocation, StockSnapshot, Warehouse)
+from core import settings
+from fastapi import HTTPException
+from schemas import StockMovementBase
+from services import record_movement
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+INFLOW_DATE = date.today() - timedelta(days=1)
+
+
+def movement(item_id, warehouse_id, movement_type, quantity):
+    return StockMovementBase(
+        item_id=item_id,
+        warehouse_id=warehouse_id,
+        movement_type=movement_type,
+        quantity=quantity,
+        movement_date=date.today() if movement_type == "outflow" else INFLOW_DATE,
+        price=10.0,
+    )
+
+
+def writer(Session, item_id, warehouse_id, attempts, results, lock):
+    accepted = rejected = 0
+    for _ in range(attempts):
+        db = Session()
+        try:
+            record_movement(db, movement(item_id, warehouse_id, "outflow", 1))
+            db.commit()
+            accepted += 1
+        except HTTPException:
+            db.rollback()
+            rejected += 1
+        finally:
+            db.close()
+    with lock:
+        results[item_id] = results.get(item_id, 0) + accepted
+        results["rejected"] = results.get("rejected", 0) + rejected
+
+
+def check_key(db, item_id, warehouse_id, received, accepted):
+    stock_level = db.execute(
+        select(Stock.stock_level).where(Stock.item_id == item_id, Stock.warehouse_id == warehouse_id)
+    ).scalar_one()
+    open_quantity = db.execute(
+        select(func.coalesce(func.sum(StockMovement.remaining_quantity), 0)).where(
+            StockMovement.item_id == item_id,
+            StockMovement.warehouse_id == warehouse_id,
+            StockMovement.movement_type == "inflow",
+        )
+    ).scalar_one()
+    if accepted > received or stock_level != received - accepted or open_quantity != stock_level:
+        raise SystemExit(
+            f"Oversold item {item_id}: received {received}, accepted {accepted}, "
+            f"stock level {stock_level}, open lots {open_quantity}"
+        )
+
+
+def delete_ledger(db, item_ids):
+    """Delete the movements, stock and snapshot levels of the items; allocations go first, as they pin the lots they took from."""
+    outflow_ids = select(StockMovement.id).where(StockMovement.item_id.in_(item_ids))
+    db.query(StockMovementAllocation).filter(StockMovementAllocation.outflow_id.in_(outflow_ids)).delete()
+    db.query(StockMovement).filter(StockMovement.item_id.in_(item_ids)).delete()
+    db.query(Stock).filter(Stock.item_id.in_(item_ids)).delete()
+    db.query(StockSnapshot).filter(StockSnapshot.item_id.in_(item_ids)).delete()
+
+
+def run_scenario(Session, item_ids, warehouse_id, writers, attempts, shared):
+    received = writers * attempts // 2 if shared else attempts
+    db = Session()
+    try:
+        delete_ledger(db, item_ids)
+        db.commit()
+        keys = item_ids[:1] if shared else item_ids[:writers]
+        for item_id in keys:
+            record_movement(db, movement(item_id, warehouse_id, "inflow", received))
+        db.commit()
+    finally:
+        db.close()
+
+    results, lock = {}, threading.Lock()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        futures = [
+            pool.submit(writer, Session, keys[0] if shared else keys[k], warehouse_id, attempts, results, lock)
+            for k in range(writers)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    db = Session()
+    try:
+        for item_id in keys:
+            check_key(db, item_id, warehouse_id, received, results.get(item_id, 0))
+    finally:
+        db.close()
+
+    accepted = sum(results.get(item_id, 0) for item_id in keys)
+    return accepted, results.get("rejected", 0), elapsed
+
+
+def cleanup(Session, category_id, warehouse_id):
+    db = Session()
+    try:
+        delete_ledger(db, select(Item.id).where(Item.category_id == category_id))
+        db.query(Item).filter(Item.category_id == category_id).delete()
+        db.query(Warehouse).filter(Warehouse.id == warehouse_id).delete()
+        db.query(Category).filter(Category.id == category_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def run(writer_counts, attempts):
+    engine = create_engine(settings.DATABASE_URL, pool_size=max(writer_counts) + 1)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    category = Category(name="concurrency-benchmark")
+    db.add(category)
+    db.flush()
+    items = [
+        Item(name=f"concurrency-benchmark-{k}", description="Stress benchmark item", category_id=category.id)
+        for k in range(max(writer_counts))
+    ]
+    warehouse = Warehouse(name=f"concurrency-benchmark-{time.time_ns()}", location="benchmark")
+    db.add_all(items + [warehouse])
+    db.commit()
+    category_id, warehouse_id = category.id, warehouse.id
+    item_ids = [item.id for item in items]
+    db.close()
+
+    print(f"{'scenario':>8} {'writers':>8} {'accepted':>9} {'rejected':>9} {'seconds':>8} {'writes/s':>9}")
+    try:
+        for writers in writer_counts:
+            for shared in (True, False):
+                accepted, rejected, elapsed = run_scenario(Session, item_ids, warehouse_id, writers, attempts, shared)
+                print(f"{'shared' if shared else 'spread':>8} {writers:>8} {accepted:>9} {rejected:>9} "
+                      f"{elapsed:>8.2f} {(accepted + rejected) / elapsed:>9.0f}")
+    finally:
+        cleanup(Session, category_id, warehouse_id)
+        engine.dispose()
+
+    print("No overselling detected.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Writer thread counts")
+    parser.add_argument("--attempts", type=int, default=50, help="Outflows attempted by each writer")
+    args = parser.parse_args()
+    run(args.writers, args.attempts)
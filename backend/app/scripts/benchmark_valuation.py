@@ -0,0 +1,183 @@
+"""
+Benchmark the FIFO valuation and COGS engine against per-row Python over a large ledger.
+
+Run from the `app` directory against a development database:
+
+    python -m scripts.benchmark_valuation --items 100 --warehouses 10 --lots 1000
+
+The script seeds `items * warehouses` keys with `lots` inflow lots each (1M by default)
+and an outflow after every fourth lot, rebuilds their FIFO remaining quantities and
+stock levels, and runs `ANALYZE`. It then times `stock_valuation` and
+`cost_of_goods_sold` with an empty cache, with a warm cache, and after one movement
+made one key stale, and compares their figures with a per-row Python pass over the
+streamed ledger; it exits with an error if they differ.
+
+Everything happens inside a transaction that is rolled back at the end, so no data is
+left behind. Expect the seeding to take a minute.
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from core.database import SessionLocal
+from models import Category, Item, StockMovement
+from schemas import StockMovementBase
+from services import (clear_valuation_caches, cost_of_goods_sold,
+                      rebuild_remaining_quantities, rebuild_stock_levels,
+                      record_movement, stock_valuation)
+from sqlalchemy import insert, select, text
+
+FIRST_DATE = date(2000, 1, 1)
+
+SEED_MOVEMENTS = text("""
+    INSERT INTO stock_movements (item_id, warehouse_id, movement_type, quantity, remaining_quantity, movement_date, price)
+    SELECT i.id, w.id, kind.movement_type,
+           CASE WHEN kind.movement_type = 'inflow' THEN 5 + (g * 7 + i.id) % 20 ELSE 10 + (g + w.id) % 30 END,
+           0,
+           CAST(:first_date AS date) + g,
+           CASE WHEN kind.movement_type = 'inflow' THEN 1 + (g * 13 + i.id * 7 + w.id) % 100 ELSE 0 END
+    FROM items i, warehouses w, generate_series(1, :lots) g,
+         LATERAL (VALUES ('inflow'), ('outflow')) AS kind (movement_type)
+    WHERE i.category_id = :category_id AND w.location = 'benchmark'
+      AND (kind.movement_type = 'inflow' OR g % 4 = 0)
+""")
+
+
+def seed(db, items, warehouses, lots):
+    """Add the benchmark ledger with consistent FIFO lots and stock levels."""
+    categories = [Category(name=f"benchmark-{k}") for k in range(5)]
+    db.add_all(categories)
+    db.flush()
+    db.execute(insert(Item), [
+        {"name": f"benchmark-{k}", "description": "Valuation benchmark item", "category_id": categories[k % 5].id}
+        for k in range(items)
+    ])
+    db.execute(text("INSERT INTO warehouses (name, location) SELECT 'benchmark-' || g, 'benchmark' FROM generate_series(1, :n) g"),
+               {"n": warehouses})
+    for category in categories:
+        db.execute(SEED_MOVEMENTS, {"first_date": FIRST_DATE, "lots": lots, "category_id": category.id})
+    keys = (
+        select(StockMovement.item_id, StockMovement.warehouse_id)
+        .join(Item, Item.id == StockMovement.item_id)
+        .where(Item.category_id.in_([category.id for category in categories]))
+        .distinct()
+        .subquery()
+    )
+    rebuild_remaining_quantities(db, keys)
+    rebuild_stock_levels(db, keys)
+    db.execute(text("ANALYZE stock_movements"))
+    db.execute(text("ANALYZE stock"))
+
+
+def ledger_rows(db, *columns, where=()):
+    """Stream ledger rows in FIFO order without loading them all at once."""
+    return db.execute(
+        select(*columns).where(*where)
+        .order_by(StockMovement.item_id, StockMovement.warehouse_id, StockMovement.movement_date, StockMovement.id)
+        .execution_options(yield_per=50_000)
+    )
+
+
+def python_valuation(db, categories):
+    groups = defaultdict(lambda: [0, 0.0])
+    rows = ledger_rows(
+        db, StockMovement.item_id, StockMovement.remaining_quantity, StockMovement.price,
+        where=(StockMovement.movement_type == "inflow", StockMovement.remaining_quantity > 0),
+    )
+    for item_id, remaining, price in rows:
+        group = groups[categories.get(item_id)]
+        group[0] += remaining
+        group[1] += remaining * price
+    return groups
+
+
+def python_cogs(db, categories, date_from, date_to):
+    """Per key, consume the lots in order and cost the units shipped inside the period."""
+    shipped = defaultdict(lambda: [0, 0])
+    for item_id, warehouse_id, movement_date, quantity in ledger_rows(
+        db, StockMovement.item_id, StockMovement.warehouse_id, StockMovement.movement_date, StockMovement.quantity,
+        where=(StockMovement.movement_type == "outflow", StockMovement.movement_date <= date_to),
+    ):
+        if movement_date < date_from:
+            shipped[(item_id, warehouse_id)][0] += quantity
+        shipped[(item_id, warehouse_id)][1] += quantity
+
+    groups = defaultdict(lambda: [0, 0.0])
+    received = defaultdict(int)
+    for item_id, warehouse_id, quantity, price in ledger_rows(
+        db, StockMovement.item_id, StockMovement.warehouse_id, StockMovement.quantity, StockMovement.price,
+        where=(StockMovement.movement_type == "inflow",),
+    ):
+        key = (item_id, warehouse_id)
+        before, through = shipped.get(key, (0, 0))
+        start, received[key] = received[key], received[key] + quantity
+        taken = max(0, min(received[key], through) - max(start, before))
+        group = groups[categories.get(item_id)]
+        group[1] += taken * price
+    for (item_id, _), (before, through) in shipped.items():
+        groups[categories.get(item_id)][0] += through - before
+    return groups
+
+
+def same(figures, groups):
+    expected = {group_id: (quantity, value) for group_id, (quantity, value) in groups.items() if quantity or value}
+    actual = {group["id"]: (group["quantity"], group["value"]) for group in figures["groups"]}
+    return actual == expected
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(items, warehouses, lots):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        seed(db, items, warehouses, lots)
+        print(f"Seeded {items * warehouses * lots} lots over {items * warehouses} keys in {time.perf_counter() - start:.0f} s\n")
+        categories = dict(db.execute(select(Item.id, Item.category_id)).all())
+        date_from = FIRST_DATE + timedelta(days=lots // 2)
+        date_to = date_from + timedelta(days=90)
+        stale_key = db.execute(select(StockMovement.item_id, StockMovement.warehouse_id).order_by(StockMovement.id.desc()).limit(1)).one()
+
+        print(f"{'':<28} {'valuation ms':>13} {'COGS ms':>10}")
+        clear_valuation_caches()
+        valuation, cold_valuation = timed(stock_valuation, db, "category")
+        cogs, cold_cogs = timed(cost_of_goods_sold, db, date_from, date_to, "category")
+        print(f"{'set-based, empty cache':<28} {cold_valuation:>13.1f} {cold_cogs:>10.1f}")
+        _, warm_valuation = timed(stock_valuation, db, "category")
+        _, warm_cogs = timed(cost_of_goods_sold, db, date_from, date_to, "category")
+        print(f"{'set-based, warm cache':<28} {warm_valuation:>13.1f} {warm_cogs:>10.1f}")
+
+        expected_valuation, python_valuation_ms = timed(python_valuation, db, categories)
+        expected_cogs, python_cogs_ms = timed(python_cogs, db, categories, date_from, date_to)
+        print(f"{'per-row Python':<28} {python_valuation_ms:>13.1f} {python_cogs_ms:>10.1f}")
+        if not same(valuation, expected_valuation) or not same(cogs, expected_cogs):
+            raise SystemExit("The set-based figures differ from the per-row Python figures")
+
+        record_movement(db, StockMovementBase(
+            item_id=stale_key.item_id, warehouse_id=stale_key.warehouse_id, movement_type="outflow",
+            quantity=1, movement_date=FIRST_DATE + timedelta(days=lots + 1), price=0,
+        ))
+        valuation, stale_valuation = timed(stock_valuation, db, "category")
+        cogs, stale_cogs = timed(cost_of_goods_sold, db, date_from, date_to, "category")
+        print(f"{'set-based, one key stale':<28} {stale_valuation:>13.1f} {stale_cogs:>10.1f}")
+        if not same(valuation, python_valuation(db, categories)) or not same(cogs, python_cogs(db, categories, date_from, date_to)):
+            raise SystemExit("The figures of the stale key were not recomputed correctly")
+    finally:
+        db.rollback()
+        db.close()
+
+    print("\nValuation and COGS match the per-row Python figures.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="Number of benchmark items")
+    parser.add_argument("--warehouses", type=int, default=10, help="Number of benchmark warehouses")
+    parser.add_argument("--lots", type=int, default=1000, help="Inflow lots per item and warehouse")
+    args = parser.parse_args()
+    run(args.items, args.warehouses, args.lots)
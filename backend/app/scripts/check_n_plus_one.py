@@ -0,0 +1,116 @@
+"""
+Check that no list endpoint issues more SQL statements as its result grows.
+
+Start the API with statement counting enabled, then run from the `app` directory:
+
+    SQL_QUERY_COUNTING=true uvicorn main:app
+    python -m scripts.check_n_plus_one
+
+The script creates a small fixture (a category with six items and one with a single
+item, a warehouse stocking all of them and one stocking a single item), then calls every
+list endpoint twice: once returning one row and once returning several. The statement
+counts come from the `X-SQL-Query-Count` response header. If any endpoint needs more
+statements for the larger result, typically because a nested relationship is lazy
+loaded per row, the endpoint is reported and the script exits with status 1. The
+fixture is left in place, like `populate_db_via_api.py`.
+"""
+import sys
+import uuid
+from datetime import date
+
+import requests
+
+BASE_URL = "http://localhost:8000"  # Update this if your API runs on a different host/port
+COUNT_HEADER = "X-SQL-Query-Count"
+EXPAND = {"expand": "item,warehouse"}  # Embed every related object stock routes can nest
+
+
+def login():
+    """Authenticate and retrieve a token."""
+    credentials = {"username": "admin", "password": "admin"}  # Replace with actual credentials
+    response = requests.post(f"{BASE_URL}/login/", data=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def post(session, path, payload):
+    response = session.post(f"{BASE_URL}{path}", json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+def create_fixture(session):
+    suffix = uuid.uuid4().hex[:8]
+    large_category = post(session, "/categories/add", {"name": f"N+1 large {suffix}"})["id"]
+    small_category = post(session, "/categories/add", {"name": f"N+1 small {suffix}"})["id"]
+    items = [
+        post(session, "/items/add", {"name": f"N+1 item {k}", "description": "N+1 check item", "category_id": large_category})["id"]
+        for k in range(6)
+    ]
+    single_item = post(session, "/items/add", {"name": "N+1 single item", "description": "N+1 check item", "category_id": small_category})["id"]
+    large_warehouse = post(session, "/warehouses/add", {"name": f"N+1 large {suffix}", "location": "N+1 check"})["id"]
+    small_warehouse = post(session, "/warehouses/add", {"name": f"N+1 small {suffix}", "location": "N+1 check"})["id"]
+
+    movement = {"movement_type": "inflow", "quantity": 5, "movement_date": date.today().isoformat(), "price": 1.0}
+    movements = [{**movement, "item_id": item_id, "warehouse_id": large_warehouse} for item_id in items]
+    movements.append({**movement, "item_id": single_item, "warehouse_id": small_warehouse})
+    post(session, "/stock/movement/bulk", {"movements": movements})
+
+    return {
+        "large_category": large_category,
+        "small_category": small_category,
+        "large_warehouse": large_warehouse,
+        "small_warehouse": small_warehouse,
+    }
+
+
+def checks(fixture):
+    """`(name, small request, large request)` triples; a request is `(path, params)`."""
+    large_wh, small_wh = fixture["large_warehouse"], fixture["small_warehouse"]
+    return [
+        ("items", ("/items/get", {"category_id": fixture["large_category"], "limit": 1}),
+                  ("/items/get", {"category_id": fixture["large_category"], "limit": 6})),
+        ("category items", (f"/categories/get/{fixture['small_category']}/items", None),
+                           (f"/categories/get/{fixture['large_category']}/items", None)),
+        ("categories", ("/categories/get", {"limit": 1}), ("/categories/get", {"limit": 2})),
+        ("warehouses", ("/warehouses/get", {"limit": 1}), ("/warehouses/get", {"limit": 2})),
+        ("stock", ("/stock/get", {"warehouse_id": large_wh, "limit": 1, **EXPAND}),
+                  ("/stock/get", {"warehouse_id": large_wh, "limit": 6, **EXPAND})),
+        ("warehouse stock", (f"/stock/get/warehouse/{small_wh}", EXPAND), (f"/stock/get/warehouse/{large_wh}", EXPAND)),
+        ("stock movements", ("/stock/movement/get", {"warehouse_id": large_wh, "limit": 1, **EXPAND}),
+                            ("/stock/movement/get", {"warehouse_id": large_wh, "limit": 6, **EXPAND})),
+        ("users", ("/users/get", {"limit": 1}), ("/users/get", None)),
+    ]
+
+
+def measure(session, path, params):
+    response = session.get(f"{BASE_URL}{path}", params=params)
+    response.raise_for_status()
+    if COUNT_HEADER not in response.headers:
+        raise SystemExit(f"No {COUNT_HEADER} header; start the API with SQL_QUERY_COUNTING=true.")
+    return len(response.json()), int(response.headers[COUNT_HEADER])
+
+
+def run():
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {login()}"
+    fixture = create_fixture(session)
+
+    failures = []
+    print(f"{'endpoint':<18} {'rows':>9} {'queries':>9}")
+    for name, small, large in checks(fixture):
+        small_rows, small_queries = measure(session, *small)
+        large_rows, large_queries = measure(session, *large)
+        grows = large_rows > small_rows and large_queries > small_queries
+        print(f"{name:<18} {small_rows:>4} {large_rows:>4} {small_queries:>4} {large_queries:>4}{'  N+1' if grows else ''}")
+        if grows:
+            failures.append(name)
+
+    if failures:
+        print(f"Query count grows with the result size: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+    print("No endpoint's query count grows with the result size.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,55 @@
+"""
+Check that the stock rollups match the stock levels and open lots they are kept from.
+
+Run from the `app` directory against any database:
+
+    python -m scripts.check_stock_rollups
+    python -m scripts.check_stock_rollups --repair
+
+For the item, warehouse and category rollups the script compares every stored total
+with the units summed from `stock` and the value summed from the open inflow lots, and
+prints the groups that differ. It exits with an error if any do, unless `--repair` is
+given, in which case it rebuilds all rollups from the base tables and commits. The
+comparison reads a single snapshot of the database, so it can run while movements are
+being posted.
+"""
+import argparse
+
+from core.database import SessionLocal
+from services import ROLLUPS, rebuild_stock_rollups, stock_rollup_differences
+from sqlalchemy import text
+
+SHOWN_DIFFERENCES = 10  # Per grouping
+
+
+def run(repair):
+    db = SessionLocal()
+    try:
+        # One snapshot for all statements, so movements committed meanwhile don't show up as drift.
+        db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+        differences = {group_by: stock_rollup_differences(db, group_by) for group_by in ROLLUPS}
+        db.rollback()
+
+        for group_by, rows in differences.items():
+            print(f"{group_by} rollups: {len(rows)} differ from the base tables")
+            for row in rows[:SHOWN_DIFFERENCES]:
+                print(f"  {group_by} {row['id']}: quantity {row['quantity']} (expected {row['expected_quantity']}), "
+                      f"value {row['value']} (expected {row['expected_value']})")
+        if not any(differences.values()):
+            print("The stock rollups match the base tables.")
+            return
+        if not repair:
+            raise SystemExit("The stock rollups differ from the base tables; run with --repair to rebuild them.")
+
+        rebuild_stock_rollups(db)
+        db.commit()
+        print("The stock rollups were rebuilt from the base tables.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true", help="Rebuild the rollups if they differ")
+    args = parser.parse_args()
+    run(args.repair)
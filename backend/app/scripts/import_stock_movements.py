@@ -0,0 +1,58 @@
+"""
+Import a CSV or NDJSON ledger of stock movements straight into the database.
+
+Run from the `app` directory:
+
+    python -m scripts.import_stock_movements ledger.csv
+    python -m scripts.import_stock_movements ledger.ndjson --chunk-size 50000
+
+CSV files need a header row with the columns item_id, warehouse_id, movement_type,
+quantity, movement_date (YYYY-MM-DD) and price; NDJSON files hold one object with the
+same keys per line. The whole file is imported in one transaction: if any line is
+invalid nothing is written. Progress is printed after every chunk.
+"""
+import argparse
+import sys
+import time
+
+import models as models
+from core.database import SessionLocal
+from fastapi import HTTPException
+from services import IMPORT_FORMATS, import_format_for, import_stock_movements
+
+
+def run(path, file_format, chunk_size):
+    file_format = file_format or import_format_for(path)
+    if file_format not in IMPORT_FORMATS:
+        raise SystemExit(f"Cannot tell the format of {path}; pass --format ({', '.join(IMPORT_FORMATS)}).")
+
+    start = time.perf_counter()
+
+    def on_progress(staged):
+        elapsed = time.perf_counter() - start
+        print(f"{staged:>12,} movements staged ({staged / elapsed:,.0f}/s)", flush=True)
+
+    db = SessionLocal()
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            summary = import_stock_movements(db, stream, file_format, chunk_size, on_progress)
+        print("Merging and committing...", flush=True)
+        db.commit()
+    except HTTPException as e:
+        db.rollback()
+        print(f"Import failed: {e.detail}", file=sys.stderr)
+        raise SystemExit(1)
+    finally:
+        db.close()
+
+    print(f"Imported {summary['imported']:,} movements for {summary['keys']:,} item/warehouse pairs "
+          f"in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or NDJSON file to import")
+    parser.add_argument("--format", dest="file_format", choices=IMPORT_FORMATS, help="File format, guessed from the extension if omitted")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Number of records validated and copied at a time")
+    args = parser.parse_args()
+    run(args.path, args.file_format, args.chunk_size)
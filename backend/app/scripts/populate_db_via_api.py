@@ -187,11 +187,8 @@ def populate_db():
                 "movement_date": (date.today() - timedelta(days=k + 1)).isoformat(),
                 "price": 50.0 + k * 5
             })
-    for movement in stock_movements:
-        if movement["movement_type"] == "inflow":
-            movement["remaining_quantity"] = movement["quantity"]
-        response = requests.post(f"{BASE_URL}/stock/movement/add", json=movement, headers=headers)
-        response.raise_for_status()
+    response = requests.post(f"{BASE_URL}/stock/movement/bulk", json={"movements": stock_movements}, headers=headers)
+    response.raise_for_status()
 
     print("Database populated successfully via API!")
 
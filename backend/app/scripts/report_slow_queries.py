@@ -0,0 +1,79 @@
+"""
+Print the plans of the queries behind the list endpoints and the FIFO allocation of outflows.
+
+Start the API so that every statement is logged and analyzed, then run from the `app`
+directory:
+
+    SLOW_QUERY_THRESHOLD_MS=0 SLOW_QUERY_ANALYZE_SAMPLE_RATE=1 uvicorn main:app
+    python -m scripts.report_slow_queries
+
+The script clears the slow query log, fetches every stock movement, stock level and item
+without `limit`, adds an inflow and an outflow of the first item in the first warehouse
+so `add_stock_movement` runs the FIFO allocation, and prints the statements of those
+requests from `GET /admin/slow-queries`, slowest first, with their plans. Against a
+server with the default threshold it prints only the statements that were slow. Run it
+with a single worker, as every worker keeps its own log.
+"""
+import argparse
+from datetime import date, timedelta
+
+import requests
+
+BASE_URL = "http://localhost:8000"  # Update this if your API runs on a different host/port
+
+LIST_ROUTES = ["/stock/movement/get", "/stock/get", "/items/get"]
+
+
+def login():
+    """Authenticate and retrieve a token."""
+    credentials = {"username": "admin", "password": "admin"}  # Replace with actual credentials
+    response = requests.post(f"{BASE_URL}/login/", data=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def add_fifo_movements(session):
+    """Add an inflow and, a day later, an outflow of one unit, so the outflow consumes lots in FIFO order."""
+    stock = session.get(f"{BASE_URL}/stock/get", params={"limit": 1}).json()
+    if not stock:
+        raise SystemExit("No stock found; populate the database first, e.g. with populate_db_via_api.py.")
+    key = {"item_id": stock[0]["item_id"], "warehouse_id": stock[0]["warehouse_id"]}
+    today = date.today()
+    for movement_type, movement_date in (("inflow", today - timedelta(days=1)), ("outflow", today)):
+        movement = {**key, "movement_type": movement_type, "quantity": 1, "price": 1.0,
+                    "movement_date": movement_date.isoformat()}
+        session.post(f"{BASE_URL}/stock/movement/add", json=movement).raise_for_status()
+
+
+def run(limit):
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {login()}"
+    session.delete(f"{BASE_URL}/admin/slow-queries").raise_for_status()
+
+    for path in LIST_ROUTES:
+        session.get(f"{BASE_URL}{path}").raise_for_status()
+    add_fifo_movements(session)
+
+    log = session.get(f"{BASE_URL}/admin/slow-queries", params={"limit": 1000}).json()
+    routes = {f"GET {path}" for path in LIST_ROUTES} | {"POST /stock/movement/add"}
+    entries = sorted(
+        (entry for entry in log["entries"] if entry["route"] in routes),
+        key=lambda entry: entry["duration_ms"], reverse=True,
+    )
+    print(f"{len(entries)} statements of {log['threshold_ms']:.0f} ms or more\n")
+    for entry in entries[:limit]:
+        kind = "EXPLAIN ANALYZE" if entry["analyzed"] else "EXPLAIN"
+        print(f"=== {entry['route']}: {entry['duration_ms']:.1f} ms")
+        print(entry["statement"])
+        print(f"--- {kind}")
+        print(entry["plan"] or entry["explain_error"] or "(not explained)")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=10, help="Number of statements to print")
+    parser.add_argument("--base-url", default=BASE_URL, help="Base URL of the API")
+    args = parser.parse_args()
+    BASE_URL = args.base_url.rstrip("/")
+    run(args.limit)
@@ -0,0 +1,20 @@
+from .fifo import (allocate_outflow, backdated_keys, reallocate_outflows,
+                   rebuild_remaining_quantities)
+from .ledger_export import (EXPORT_FORMATS, EXPORT_MEDIA_TYPES,
+                            check_export_format, stock_export_query,
+                            stock_movement_export_query, stream_export)
+from .ledger_import import (IMPORT_FORMATS, import_format_for,
+                            import_stock_movements)
+from .stock_ledger import (apply_stock_delta, lock_stock_key,
+                           rebuild_stock_levels, record_movement,
+                           record_movements_bulk, reverse_movement)
+from .stock_rollups import (ROLLUPS, adjust_stock_rollups,
+                            expected_rollup_query, move_item_rollup,
+                            rebuild_stock_rollups, stock_rollup_differences,
+                            stock_summary_query)
+from .stock_snapshots import (adjust_stock_snapshots, latest_snapshot_query,
+                              run_snapshot_schedule, stock_as_of_query,
+                              take_stock_snapshot)
+from .valuation import (VALUATION_GROUPS, check_valuation_group,
+                        clear_valuation_caches, cost_of_goods_sold,
+                        stock_valuation)
@@ -0,0 +1,378 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Set, Tuple, Union
+
+from fastapi import HTTPException
+from models import Stock, StockMovement, StockMovementAllocation
+from sqlalchemy import (ARRAY, CTE, Date, Integer, Row, Select, Subquery,
+                        and_, delete, func, insert, literal, null, select,
+                        tuple_, union_all, update)
+from sqlalchemy.orm import Session, aliased
+
+from .stock_rollups import adjust_stock_rollups
+
+
+def allocate_outflow(
+    db: Session, item_id: int, warehouse_id: int, quantity: int, movement_date: date, outflow_id: int
+) -> List[Row]:
+    """
+    Consume open inflow lots for an outflow in FIFO order using a single statement.
+
+    A running sum over the open lots of the item/warehouse (ordered by movement date,
+    then id) tells how much stock precedes each lot, so only the lots needed to cover
+    `quantity` are updated. The same statement records what was taken from each lot as
+    allocations of `outflow_id`. Nothing is loaded into the session.
+
+    Returns one row per consumed lot with its `id`, the `quantity` taken from it and its `unit_price`.
+    If the returned quantities sum to less than `quantity` there was not enough stock;
+    the caller is expected to abort the transaction in that case.
+    """
+    open_lots = (
+        select(
+            StockMovement.id,
+            StockMovement.remaining_quantity,
+            (
+                func.sum(StockMovement.remaining_quantity).over(
+                    order_by=(StockMovement.movement_date, StockMovement.id)
+                ) - StockMovement.remaining_quantity
+            ).label("consumed_before"),
+        )
+        .where(
+            StockMovement.item_id == item_id,
+            StockMovement.warehouse_id == warehouse_id,
+            StockMovement.remaining_quantity > 0,
+            StockMovement.movement_type == "inflow",
+            StockMovement.movement_date < movement_date,  # Only consider inflows before the outflow
+        )
+        .cte("open_lots")
+    )
+    taken = func.least(open_lots.c.remaining_quantity, quantity - open_lots.c.consumed_before)
+
+    consumed = (
+        update(StockMovement)
+        .where(StockMovement.id == open_lots.c.id, open_lots.c.consumed_before < quantity)
+        .values(remaining_quantity=StockMovement.remaining_quantity - taken)
+        .returning(StockMovement.id, taken.label("quantity"), StockMovement.price)
+        .cte("consumed")
+    )
+    stmt = (
+        insert(StockMovementAllocation)
+        .from_select(
+            ["outflow_id", "inflow_id", "quantity", "unit_price"],
+            select(literal(outflow_id), consumed.c.id, consumed.c.quantity, consumed.c.price),
+        )
+        .add_cte(consumed)  # A data-modifying CTE must be attached to the top-level statement
+        .returning(
+            StockMovementAllocation.inflow_id.label("id"),
+            StockMovementAllocation.quantity,
+            StockMovementAllocation.unit_price,
+        )
+    )
+    return db.execute(stmt).all()
+
+
+def _fifo_order(movement):
+    return {
+        "partition_by": (movement.item_id, movement.warehouse_id),
+        "order_by": (movement.movement_date, movement.id),
+    }
+
+
+def _allocation_query(lots: CTE, outflows: CTE) -> Select:
+    """
+    Assign the units of outflows to lots in FIFO order, as `(outflow_id, inflow_id, quantity, unit_price)` rows.
+
+    Both CTEs hold `id`, `item_id`, `warehouse_id` and the running total `through` each row
+    in FIFO order (movement date, then id) per key; `lots` also holds `price`. Each outflow
+    covers a range of the running total shipped and each lot a range of the running total
+    received, so the units of an outflow that fall in a lot's range were taken from that
+    lot. The boundaries of both ranges are merged and walked with window functions only:
+    the plan is a few sorts whatever the planner estimates, and the cost grows with the
+    number of rows, not with outflows times lots.
+    """
+    boundaries = union_all(
+        select(lots.c.item_id, lots.c.warehouse_id, lots.c.through.label("position"),
+               lots.c.id.label("lot_id"), lots.c.price, null().label("outflow_id")),
+        select(outflows.c.item_id, outflows.c.warehouse_id, outflows.c.through,
+               null(), null(), outflows.c.id),
+    ).subquery("boundaries")
+    # Running totals strictly increase, so a position ends at most one lot and one outflow.
+    positions = (
+        select(
+            boundaries.c.item_id,
+            boundaries.c.warehouse_id,
+            boundaries.c.position,
+            func.max(boundaries.c.lot_id).label("lot_id"),
+            func.max(boundaries.c.price).label("price"),
+            func.max(boundaries.c.outflow_id).label("outflow_id"),
+        )
+        .group_by(boundaries.c.item_id, boundaries.c.warehouse_id, boundaries.c.position)
+        .subquery("positions")
+    )
+    by_position = {
+        "partition_by": (positions.c.item_id, positions.c.warehouse_id),
+        "order_by": positions.c.position,
+    }
+    # Between two consecutive boundaries the units belong to a single lot and a single outflow:
+    # the first ones whose range ends at or after the segment's end, i.e. the ones ending after
+    # as many lots (outflows) as ended before the segment.
+    segments = select(
+        positions.c.item_id,
+        positions.c.warehouse_id,
+        positions.c.lot_id,
+        positions.c.price,
+        positions.c.outflow_id,
+        (positions.c.position - func.lag(positions.c.position, 1, 0).over(**by_position)).label("quantity"),
+        func.count(positions.c.lot_id).over(**by_position, rows=(None, -1)).label("lots_before"),
+        func.count(positions.c.outflow_id).over(**by_position, rows=(None, -1)).label("outflows_before"),
+    ).subquery("segments")
+
+    def owner(column, ended_before):
+        return func.max(column).over(partition_by=(segments.c.item_id, segments.c.warehouse_id, ended_before))
+
+    owners = select(
+        owner(segments.c.outflow_id, segments.c.outflows_before).label("outflow_id"),
+        owner(segments.c.lot_id, segments.c.lots_before).label("inflow_id"),
+        owner(segments.c.price, segments.c.lots_before).label("price"),
+        segments.c.quantity,
+    ).subquery("owners")
+    # Units past the last outflow are still in stock, units past the last lot were never received.
+    return (
+        select(owners.c.outflow_id, owners.c.inflow_id, func.sum(owners.c.quantity), owners.c.price)
+        .where(owners.c.outflow_id.is_not(None), owners.c.inflow_id.is_not(None))
+        .group_by(owners.c.outflow_id, owners.c.inflow_id, owners.c.price)
+    )
+
+
+def rebuild_remaining_quantities(db: Session, keys: Subquery):
+    """
+    Recompute the FIFO allocations and the `remaining_quantity` of every lot of the given keys from scratch.
+
+    `keys` is a subquery with `item_id` and `warehouse_id` columns. For each key all outflows,
+    in FIFO order, consume the units received by all inflow lots in the same order (see
+    `_allocation_query`). Existing allocations of the keys' outflows are replaced, and a lot
+    keeps whatever no outflow took. The change in the value of the keys' open lots is added
+    to the stock rollups.
+    """
+    key_match = and_(StockMovement.item_id == keys.c.item_id, StockMovement.warehouse_id == keys.c.warehouse_id)
+    lot_values = (
+        select(
+            StockMovement.item_id,
+            StockMovement.warehouse_id,
+            func.sum(StockMovement.remaining_quantity * StockMovement.price),
+        )
+        .join(keys, key_match)
+        .where(StockMovement.movement_type == "inflow")
+        .group_by(StockMovement.item_id, StockMovement.warehouse_id)
+    )
+    values_before = {(item_id, warehouse_id): value for item_id, warehouse_id, value in db.execute(lot_values)}
+
+    def running_totals(movement_type: str, name: str) -> CTE:
+        return (
+            select(
+                StockMovement.id,
+                StockMovement.item_id,
+                StockMovement.warehouse_id,
+                StockMovement.price,
+                func.sum(StockMovement.quantity).over(**_fifo_order(StockMovement)).label("through"),
+            )
+            .join(keys, key_match)
+            .where(StockMovement.movement_type == movement_type)
+            .cte(name)
+        )
+
+    db.execute(
+        delete(StockMovementAllocation).where(StockMovementAllocation.outflow_id.in_(
+            select(StockMovement.id).join(keys, key_match).where(StockMovement.movement_type == "outflow")
+        ))
+    )
+    db.execute(insert(StockMovementAllocation).from_select(
+        ["outflow_id", "inflow_id", "quantity", "unit_price"],
+        _allocation_query(running_totals("inflow", "lots"), running_totals("outflow", "outflows")),
+    ))
+
+    taken = (
+        select(func.coalesce(func.sum(StockMovementAllocation.quantity), 0))
+        .where(StockMovementAllocation.inflow_id == StockMovement.id)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(StockMovement)
+        .where(
+            StockMovement.movement_type == "inflow",
+            tuple_(StockMovement.item_id, StockMovement.warehouse_id).in_(select(keys.c.item_id, keys.c.warehouse_id)),
+        )
+        .values(remaining_quantity=StockMovement.quantity - taken)
+        .execution_options(synchronize_session=False)
+    )
+    adjust_stock_rollups(db, [
+        (item_id, warehouse_id, 0, value - values_before.get((item_id, warehouse_id), 0))
+        for item_id, warehouse_id, value in db.execute(lot_values)
+    ])
+
+
+def _key_dates(rows: List[tuple]) -> Subquery:
+    """
+    `(item_id, warehouse_id, since)` rows as a subquery.
+
+    Sent as three bound arrays rather than a VALUES list, so the statements that use it
+    stay in the compiled statement cache whatever the keys are.
+    """
+    item_ids, warehouse_ids, dates = (list(values) for values in zip(*rows))
+    return select(
+        func.unnest(literal(item_ids, ARRAY(Integer))).label("item_id"),
+        func.unnest(literal(warehouse_ids, ARRAY(Integer))).label("warehouse_id"),
+        func.unnest(literal(dates, ARRAY(Date))).label("since"),
+    ).subquery("changes")
+
+
+def backdated_keys(db: Session, first_dates: Dict[Tuple[int, int], date]) -> Set[Tuple[int, int]]:
+    """
+    The (item, warehouse) keys whose ledger has outflows dated after the given first date of new movements.
+
+    Movements dated before an existing outflow change the lots that outflow should have
+    consumed, so their keys need `reallocate_outflows` rather than plain allocation.
+    """
+    if not first_dates:
+        return set()
+    firsts = _key_dates([(item_id, warehouse_id, since) for (item_id, warehouse_id), since in first_dates.items()])
+    later = (
+        select(StockMovement.id)
+        .where(
+            StockMovement.item_id == firsts.c.item_id,
+            StockMovement.warehouse_id == firsts.c.warehouse_id,
+            StockMovement.movement_type == "outflow",
+            StockMovement.movement_date > firsts.c.since,
+        )
+        .exists()
+    )
+    return {tuple(row) for row in db.execute(select(firsts.c.item_id, firsts.c.warehouse_id).where(later))}
+
+
+def reallocate_outflows(db: Session, changes: Union[Subquery, List[tuple]]) -> Dict[Tuple[int, int], int]:
+    """
+    Replay FIFO allocation for the outflows of each key from the earliest date a backdated movement affects.
+
+    `changes` is a list of `(item_id, warehouse_id, since)` tuples, or a subquery with those
+    columns, and the keys must be locked. In a fixed number of statements for all keys:
+
+    - The outflows dated on or after `since` give the units of their allocations back to
+      their lots; outflows dated before it, and the lots they emptied, are not read.
+    - They are then allocated again, in FIFO order, over the open lots (see `_allocation_query`).
+    - The stock versions of the keys are bumped, so cached valuation and COGS figures of
+      the keys are recomputed.
+
+    Raises a 400 error if an outflow would take more than the lots dated before it hold.
+    Returns the change in the value of the open lots, units times price, per key; the
+    caller adds it to the stock rollups.
+    """
+    if isinstance(changes, list):
+        if not changes:
+            return {}
+        changes = _key_dates(changes)
+
+    outflow = aliased(StockMovement)
+    replayed = (
+        select(outflow.id)
+        .join(changes, and_(
+            outflow.item_id == changes.c.item_id,
+            outflow.warehouse_id == changes.c.warehouse_id,
+            outflow.movement_date >= changes.c.since,
+        ))
+        .where(outflow.movement_type == "outflow")
+    )
+
+    def allocated(name: str) -> Subquery:
+        """The units the replayed outflows are allocated per lot."""
+        return (
+            select(StockMovementAllocation.inflow_id, func.sum(StockMovementAllocation.quantity).label("quantity"))
+            .where(StockMovementAllocation.outflow_id.in_(replayed))
+            .group_by(StockMovementAllocation.inflow_id)
+            .subquery(name)
+        )
+
+    value_changes = defaultdict(int)
+    given_back = allocated("given_back")
+    for item_id, warehouse_id, value in db.execute(
+        update(StockMovement)
+        .where(StockMovement.id == given_back.c.inflow_id)
+        .values(remaining_quantity=StockMovement.remaining_quantity + given_back.c.quantity)
+        .returning(StockMovement.item_id, StockMovement.warehouse_id, given_back.c.quantity * StockMovement.price)
+        .execution_options(synchronize_session=False)
+    ):
+        value_changes[(item_id, warehouse_id)] += value
+    db.execute(delete(StockMovementAllocation).where(StockMovementAllocation.outflow_id.in_(replayed)))
+
+    key_match = and_(StockMovement.item_id == changes.c.item_id, StockMovement.warehouse_id == changes.c.warehouse_id)
+    open_lots = (
+        select(StockMovement.id, StockMovement.item_id, StockMovement.warehouse_id, StockMovement.movement_date,
+               StockMovement.price, StockMovement.remaining_quantity.label("quantity"))
+        .join(changes, key_match)
+        .where(StockMovement.movement_type == "inflow", StockMovement.remaining_quantity > 0)
+        .cte("open_lots")
+    )
+    outflows = (
+        select(StockMovement.id, StockMovement.item_id, StockMovement.warehouse_id, StockMovement.movement_date,
+               StockMovement.quantity)
+        .where(StockMovement.id.in_(replayed))
+        .cte("replayed_outflows")
+    )
+
+    # An outflow may only take from lots dated before it: walking lots and outflows in date
+    # order, with the lots of a day after its outflows, no outflow may pass the lots received.
+    events = union_all(
+        select(open_lots.c.item_id, open_lots.c.warehouse_id, open_lots.c.movement_date, literal(1).label("kind"),
+               open_lots.c.id, open_lots.c.quantity.label("received"), literal(0).label("shipped")),
+        select(outflows.c.item_id, outflows.c.warehouse_id, outflows.c.movement_date, literal(0),
+               outflows.c.id, literal(0), outflows.c.quantity),
+    ).subquery("events")
+    in_date_order = {
+        "partition_by": (events.c.item_id, events.c.warehouse_id),
+        "order_by": (events.c.movement_date, events.c.kind, events.c.id),
+    }
+    running = select(
+        events.c.item_id, events.c.warehouse_id, events.c.movement_date, events.c.kind,
+        func.sum(events.c.received).over(**in_date_order).label("received"),
+        func.sum(events.c.shipped).over(**in_date_order).label("shipped"),
+    ).subquery("running")
+    short = db.execute(
+        select(running.c.item_id, running.c.warehouse_id, running.c.movement_date)
+        .where(running.c.kind == 0, running.c.shipped > running.c.received)
+        .order_by(running.c.movement_date)
+        .limit(1)
+    ).first()
+    if short:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough stock available for the outflow of item {short.item_id} in warehouse "
+                   f"{short.warehouse_id} on {short.movement_date}.",
+        )
+
+    def running_totals(rows: CTE, name: str, price: bool) -> CTE:
+        return select(
+            rows.c.id, rows.c.item_id, rows.c.warehouse_id,
+            *([rows.c.price] if price else []),
+            func.sum(rows.c.quantity).over(**_fifo_order(rows.c)).label("through"),
+        ).cte(name)
+
+    db.execute(insert(StockMovementAllocation).from_select(
+        ["outflow_id", "inflow_id", "quantity", "unit_price"],
+        _allocation_query(running_totals(open_lots, "lots", True), running_totals(outflows, "outflows", False)),
+    ))
+
+    taken = allocated("taken")
+    for item_id, warehouse_id, value in db.execute(
+        update(StockMovement)
+        .where(StockMovement.id == taken.c.inflow_id)
+        .values(remaining_quantity=StockMovement.remaining_quantity - taken.c.quantity)
+        .returning(StockMovement.item_id, StockMovement.warehouse_id, taken.c.quantity * StockMovement.price)
+        .execution_options(synchronize_session=False)
+    ):
+        value_changes[(item_id, warehouse_id)] -= value
+    db.execute(
+        update(Stock)
+        .where(tuple_(Stock.item_id, Stock.warehouse_id).in_(select(changes.c.item_id, changes.c.warehouse_id)))
+        .values(version=Stock.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return dict(value_changes)
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+from datetime import date
+from typing import Iterator, Optional
+
+from core import SessionLocal
+from fastapi import HTTPException
+from models import Item, Stock, StockMovement, Warehouse
+from sqlalchemy import Date, Integer, Select, select
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def stock_movement_export_query(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    item_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+) -> Select:
+    """Build the flat, id-ordered query behind stock movement exports."""
+    query = (
+        select(
+            StockMovement.id,
+            StockMovement.movement_date,
+            StockMovement.movement_type,
+            StockMovement.item_id,
+            Item.name.label("item_name"),
+            StockMovement.warehouse_id,
+            Warehouse.name.label("warehouse_name"),
+            StockMovement.quantity,
+            StockMovement.remaining_quantity,
+            StockMovement.price,
+        )
+        .join(Item, Item.id == StockMovement.item_id)
+        .join(Warehouse, Warehouse.id == StockMovement.warehouse_id)
+        .order_by(StockMovement.id)
+    )
+    if date_from:
+        query = query.where(StockMovement.movement_date >= date_from)
+    if date_to:
+        query = query.where(StockMovement.movement_date <= date_to)
+    if item_id:
+        query = query.where(StockMovement.item_id == item_id)
+    if warehouse_id:
+        query = query.where(StockMovement.warehouse_id == warehouse_id)
+    return query
+
+
+def stock_export_query(item_id: Optional[int] = None, warehouse_id: Optional[int] = None) -> Select:
+    """Build the flat, id-ordered query behind stock level exports."""
+    query = (
+        select(
+            Stock.id,
+            Stock.item_id,
+            Item.name.label("item_name"),
+            Stock.warehouse_id,
+            Warehouse.name.label("warehouse_name"),
+            Stock.stock_level,
+        )
+        .join(Item, Item.id == Stock.item_id)
+        .join(Warehouse, Warehouse.id == Stock.warehouse_id)
+        .order_by(Stock.id)
+    )
+    if item_id:
+        query = query.where(Stock.item_id == item_id)
+    if warehouse_id:
+        query = query.where(Stock.warehouse_id == warehouse_id)
+    return query
+
+
+def check_export_format(file_format: str):
+    """Raise a 400 error if the format is unknown or its optional dependency is missing."""
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}.")
+    if file_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet export requires the pyarrow package.")
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _encode_csv(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _encode_ndjson(columns, partitions):
+    for rows in partitions:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=date.isoformat) + "\n" for row in rows
+        ).encode()
+
+
+def _encode_parquet(query, columns, partitions):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def arrow_type(sql_type):
+        if isinstance(sql_type, Integer):
+            return pa.int64()
+        if isinstance(sql_type, Date):
+            return pa.date32()
+        return pa.string()
+
+    schema = pa.schema([(column.name, arrow_type(column.type)) for column in query.selected_columns])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in partitions:
+            # Every partition becomes one row group, so only one batch is held in memory at a time.
+            writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_export(query: Select, file_format: str, batch_size: int = 5000) -> Iterator[bytes]:
+    """
+    Stream the rows of `query` encoded as CSV, NDJSON or Parquet.
+
+    Rows are fetched through a server-side cursor `batch_size` at a time and encoded batch
+    by batch, so memory use stays flat whatever the size of the result. The generator owns
+    its session because the response is sent after the request's dependencies are closed.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(query.execution_options(yield_per=batch_size))
+        columns = list(result.keys())
+        partitions = result.partitions()
+        if file_format == "csv":
+            chunks = _encode_csv(columns, partitions)
+        elif file_format == "ndjson":
+            chunks = _encode_ndjson(columns, partitions)
+        else:
+            chunks = _encode_parquet(query, columns, partitions)
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+    finally:
+        db.close()
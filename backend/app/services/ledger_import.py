@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+from datetime import date
+from itertools import islice
+from typing import Callable, Iterator, Optional, TextIO
+
+from fastapi import HTTPException
+from models import Item, StockMovement, Warehouse
+from sqlalchemy import (BigInteger, Column, Date, Integer, MetaData, Numeric,
+                        String, Table, case, cast, func, insert, literal,
+                        select)
+from sqlalchemy.orm import Session
+
+from .fifo import reallocate_outflows
+from .stock_ledger import rebuild_stock_levels
+from .stock_rollups import adjust_stock_rollups
+from .stock_snapshots import SNAPSHOT_LOCK_KEY, adjust_stock_snapshots
+
+IMPORT_COLUMNS = ("item_id", "warehouse_id", "movement_type", "quantity", "movement_date", "price")
+IMPORT_FORMATS = ("csv", "ndjson")
+
+staging_table = Table(
+    "stock_movement_import",
+    MetaData(),
+    Column("line", BigInteger, nullable=False),
+    Column("item_id", Integer, nullable=False),
+    Column("warehouse_id", Integer, nullable=False),
+    Column("movement_type", String, nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("movement_date", Date, nullable=False),
+    Column("price", Numeric, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+def import_format_for(filename: Optional[str]) -> Optional[str]:
+    """Guess the import format from a file name, or return None if it is not recognised."""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson"}.get(extension)
+
+
+def _read_records(stream: TextIO, file_format: str) -> Iterator[tuple]:
+    """Yield `(line, record)` pairs one at a time, where `line` is the 1-based line in the file."""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        missing = set(IMPORT_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise HTTPException(status_code=400, detail=f"CSV header is missing columns: {', '.join(sorted(missing))}.")
+        for record in reader:
+            yield reader.line_num, record
+    elif file_format == "ndjson":
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=400, detail=f"Line {line}: Invalid JSON.")
+    else:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format. Use one of: {', '.join(IMPORT_FORMATS)}.")
+
+
+def _validate_record(line: int, record: dict, item_ids: set, warehouse_ids: set) -> tuple:
+    """Check a single record against the cached id sets and return it as a staging row."""
+    try:
+        item_id = int(record["item_id"])
+        warehouse_id = int(record["warehouse_id"])
+        movement_type = str(record["movement_type"]).strip()
+        quantity = int(record["quantity"])
+        movement_date = date.fromisoformat(str(record["movement_date"]).strip())
+        price = float(record["price"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Line {line}: Invalid value ({e}).")
+
+    if item_id not in item_ids:
+        raise HTTPException(status_code=404, detail=f"Line {line}: Item not found.")
+    if warehouse_id not in warehouse_ids:
+        raise HTTPException(status_code=404, detail=f"Line {line}: Warehouse not found.")
+    if movement_type not in ("inflow", "outflow"):
+        raise HTTPException(status_code=400, detail=f"Line {line}: Movement type must be 'inflow' or 'outflow'.")
+    if quantity < 1:
+        raise HTTPException(status_code=400, detail=f"Line {line}: Quantity must be a positive integer.")
+    if price < 0:
+        raise HTTPException(status_code=400, detail=f"Line {line}: Price must be non-negative.")
+    return line, item_id, warehouse_id, movement_type, quantity, movement_date.isoformat(), price
+
+
+def _copy_rows(db: Session, rows: list):
+    """Stream a chunk of staging rows into the staging table with COPY."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    copy_sql = f"COPY {staging_table.name} ({', '.join(column.name for column in staging_table.columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def import_stock_movements(
+    db: Session,
+    stream: TextIO,
+    file_format: str,
+    chunk_size: int = 10000,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    """
+    Import a CSV or NDJSON ledger of stock movements, without committing.
+
+    - The file is read and validated `chunk_size` records at a time against item and
+      warehouse id sets loaded once up front, so memory use does not grow with the file.
+    - Each chunk is sent to a temporary staging table with `COPY`.
+    - The staged rows are then merged into `stock_movements` in file order. FIFO allocation
+      is replayed per key from the key's earliest imported date, the affected `stock` levels
+      are rebuilt with set-based SQL, and movements dated on or before the latest stock
+      snapshot are added to the snapshots. The new lots and the replay change the values
+      in the stock rollups.
+    - `on_progress` is called with the number of records staged after every chunk.
+    - Any invalid record aborts the import with an error naming its line.
+
+    Returns the number of imported movements and affected item/warehouse pairs.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise HTTPException(status_code=400, detail="Imports require a PostgreSQL database.")
+
+    item_ids = set(db.scalars(select(Item.id)))
+    warehouse_ids = set(db.scalars(select(Warehouse.id)))
+    staging_table.create(db.connection())
+
+    records = _read_records(stream, file_format)
+    staged = 0
+    while True:
+        chunk = [_validate_record(line, record, item_ids, warehouse_ids) for line, record in islice(records, chunk_size)]
+        if not chunk:
+            break
+        _copy_rows(db, chunk)
+        staged += len(chunk)
+        if on_progress:
+            on_progress(staged)
+
+    if not staged:
+        raise HTTPException(status_code=400, detail="The file does not contain any stock movements.")
+
+    keys = select(staging_table.c.item_id, staging_table.c.warehouse_id).distinct().subquery()
+    # Take the same locks as single movements: the snapshot lock first, then the keys in a
+    # fixed order to avoid deadlocks. The lock function is volatile, so PostgreSQL calls it
+    # after the sort of the same SELECT, in key order.
+    db.execute(select(func.pg_advisory_xact_lock_shared(SNAPSHOT_LOCK_KEY)))
+    key_count = len(db.execute(
+        select(func.pg_advisory_xact_lock(keys.c.item_id, keys.c.warehouse_id))
+        .order_by(keys.c.item_id, keys.c.warehouse_id)
+    ).all())
+
+    db.execute(
+        insert(StockMovement).from_select(
+            ["item_id", "warehouse_id", "movement_type", "quantity", "remaining_quantity", "movement_date", "price"],
+            select(
+                staging_table.c.item_id,
+                staging_table.c.warehouse_id,
+                staging_table.c.movement_type,
+                staging_table.c.quantity,
+                case((staging_table.c.movement_type == "inflow", staging_table.c.quantity), else_=0),
+                staging_table.c.movement_date,
+                staging_table.c.price,
+            ).order_by(staging_table.c.line),
+        )
+    )
+    value_changes = reallocate_outflows(db, select(
+        staging_table.c.item_id,
+        staging_table.c.warehouse_id,
+        func.min(staging_table.c.movement_date).label("since"),
+    ).group_by(staging_table.c.item_id, staging_table.c.warehouse_id).subquery())
+    rebuild_stock_levels(db, keys)
+    adjust_stock_snapshots(db, select(
+        staging_table.c.item_id,
+        staging_table.c.warehouse_id,
+        staging_table.c.movement_date,
+        case((staging_table.c.movement_type == "inflow", staging_table.c.quantity), else_=-staging_table.c.quantity).label("delta"),
+    ).subquery())
+    # The stock levels were added to the rollups when they were rebuilt. Prices are cast as
+    # they were when the lots were inserted.
+    adjust_stock_rollups(db, select(
+        staging_table.c.item_id,
+        staging_table.c.warehouse_id,
+        literal(0, BigInteger).label("quantity"),
+        (staging_table.c.quantity * cast(staging_table.c.price, Integer)).label("value"),
+    ).where(staging_table.c.movement_type == "inflow").subquery())
+    adjust_stock_rollups(db, [(*key, 0, value) for key, value in sorted(value_changes.items())])
+
+    return {"imported": staged, "keys": key_count}
@@ -0,0 +1,451 @@
+from bisect import insort
+from collections import defaultdict
+from typing import List
+
+from fastapi import HTTPException
+from models import (Item, Stock, StockMovement, StockMovementAllocation,
+                    Warehouse)
+from schemas import StockMovementBase
+from sqlalchemy import (BigInteger, Integer, Subquery, and_, case, column,
+                        func, insert, literal, select, tuple_, update, values)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .fifo import allocate_outflow, backdated_keys, reallocate_outflows
+from .stock_rollups import adjust_stock_rollups
+from .stock_snapshots import SNAPSHOT_LOCK_KEY, adjust_stock_snapshots
+
+
+def lock_stock_key(db: Session, item_id: int, warehouse_id: int):
+    """
+    Serialize writers of a single (item, warehouse) pair until the transaction ends.
+
+    Uses a transaction-scoped PostgreSQL advisory lock, so movements for other items
+    or warehouses never wait on each other and the lock is released on commit or rollback.
+    The snapshot lock is taken shared first, so a stock snapshot waits for the writer.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Select list items are evaluated in order: always the snapshot lock, then the key.
+        db.execute(select(
+            func.pg_advisory_xact_lock_shared(SNAPSHOT_LOCK_KEY),
+            func.pg_advisory_xact_lock(item_id, warehouse_id),
+        ))
+
+
+def apply_stock_delta(db: Session, item_id: int, warehouse_id: int, delta: int) -> int:
+    """
+    Atomically add `delta` to the stock level of an item in a warehouse.
+
+    - The level is changed with a single `stock_level = stock_level + delta` statement,
+      which also bumps the key's `version` for the valuation caches.
+    - Inflows upsert on the unique (item, warehouse) key, creating the stock row on the first one.
+    - Raises a 400 error if the row is missing or the level would go negative.
+    - Returns the new stock level.
+    """
+    if delta >= 0:
+        stmt = pg_insert(Stock).values(item_id=item_id, warehouse_id=warehouse_id, stock_level=delta)
+        return db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_stock_item_id_warehouse_id",
+                set_={"stock_level": Stock.stock_level + stmt.excluded.stock_level, "version": Stock.version + 1},
+            )
+            .returning(Stock.stock_level)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+
+    stock_level = db.execute(
+        update(Stock)
+        .where(
+            Stock.item_id == item_id,
+            Stock.warehouse_id == warehouse_id,
+            Stock.stock_level + delta >= 0,
+        )
+        .values(stock_level=Stock.stock_level + delta, version=Stock.version + 1)
+        .returning(Stock.stock_level)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if stock_level is not None:
+        return stock_level
+
+    if db.query(Stock.id).filter(Stock.item_id == item_id, Stock.warehouse_id == warehouse_id).first():
+        raise HTTPException(status_code=400, detail="Not enough stock available for outflow.")
+    raise HTTPException(status_code=400, detail="Stock not found for the specified item and warehouse.")
+
+
+def rebuild_stock_levels(db: Session, keys: Subquery):
+    """
+    Recompute the stock level of the given keys from the movement ledger.
+
+    `keys` is a subquery with `item_id` and `warehouse_id` columns. Missing stock rows are
+    created, and the change of every level is added to the stock rollups. Raises a 400
+    error if the ledger of any key ships more than it received.
+    """
+    levels = (
+        select(
+            StockMovement.item_id,
+            StockMovement.warehouse_id,
+            func.sum(case(
+                (StockMovement.movement_type == "inflow", StockMovement.quantity),
+                else_=-StockMovement.quantity,
+            )).label("stock_level"),
+        )
+        .join(keys, and_(StockMovement.item_id == keys.c.item_id, StockMovement.warehouse_id == keys.c.warehouse_id))
+        .group_by(StockMovement.item_id, StockMovement.warehouse_id)
+        .subquery()
+    )
+    oversold = db.execute(
+        select(levels.c.item_id, levels.c.warehouse_id).where(levels.c.stock_level < 0).limit(1)
+    ).first()
+    if oversold:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Not enough stock available for outflows of item {oversold.item_id} in warehouse {oversold.warehouse_id}.",
+        )
+
+    adjust_stock_rollups(db, (
+        select(
+            levels.c.item_id,
+            levels.c.warehouse_id,
+            (levels.c.stock_level - func.coalesce(Stock.stock_level, 0)).label("quantity"),
+            literal(0, BigInteger).label("value"),
+        )
+        .outerjoin(Stock, and_(Stock.item_id == levels.c.item_id, Stock.warehouse_id == levels.c.warehouse_id))
+        .subquery()
+    ))
+    upsert = pg_insert(Stock).from_select(
+        ["item_id", "warehouse_id", "stock_level"],
+        select(levels.c.item_id, levels.c.warehouse_id, levels.c.stock_level),
+    )
+    db.execute(upsert.on_conflict_do_update(
+        constraint="uq_stock_item_id_warehouse_id",
+        set_={"stock_level": upsert.excluded.stock_level, "version": Stock.version + 1},
+    ))
+
+
+def record_movement(db: Session, stock_movement: StockMovementBase) -> StockMovement:
+    """
+    Record a stock movement and update lots and stock levels, without committing.
+
+    - Locks the (item, warehouse) key first so concurrent outflows cannot oversell.
+    - Inflows open a new FIFO lot; outflows consume the oldest open lots and record
+      what they took from each as allocations.
+    - A movement dated before outflows already on the ledger replays the allocations of
+      the key from its date with `reallocate_outflows`.
+    - A movement dated on or before the latest stock snapshot is added to the snapshots.
+    - The change in stock and lot value is added to the item, warehouse and category rollups.
+    - Returns the new, flushed `StockMovement`.
+    """
+    lock_stock_key(db, stock_movement.item_id, stock_movement.warehouse_id)
+
+    if stock_movement.movement_type == "inflow":
+        new_stock_movement = StockMovement(
+            **stock_movement.model_dump(),
+            remaining_quantity=stock_movement.quantity
+        )
+        delta = stock_movement.quantity
+    elif stock_movement.movement_type == "outflow":
+        new_stock_movement = StockMovement(
+            **stock_movement.model_dump(),
+            remaining_quantity=0
+        )
+        delta = -stock_movement.quantity
+    else:
+        raise HTTPException(status_code=400, detail="Movement type must be 'inflow' or 'outflow'.")
+
+    # Flushed first, as allocations reference the outflow and a replay reads the new lot.
+    db.add(new_stock_movement)
+    db.flush()
+    key = (stock_movement.item_id, stock_movement.warehouse_id)
+    value = 0
+    if key in backdated_keys(db, {key: stock_movement.movement_date}):
+        value += reallocate_outflows(db, [(*key, stock_movement.movement_date)]).get(key, 0)
+    elif stock_movement.movement_type == "outflow":
+        allocations = allocate_outflow(
+            db,
+            stock_movement.item_id,
+            stock_movement.warehouse_id,
+            stock_movement.quantity,
+            stock_movement.movement_date,
+            new_stock_movement.id,
+        )
+        if sum(allocation.quantity for allocation in allocations) < stock_movement.quantity:
+            raise HTTPException(status_code=400, detail="Not enough stock available for outflow.")
+        value -= sum(allocation.quantity * allocation.unit_price for allocation in allocations)
+
+    apply_stock_delta(db, stock_movement.item_id, stock_movement.warehouse_id, delta)
+    adjust_stock_snapshots(db, [(stock_movement.item_id, stock_movement.warehouse_id, stock_movement.movement_date, delta)])
+    if stock_movement.movement_type == "inflow":
+        # The schema has already rounded the price to the whole one the lot is stored at.
+        value += stock_movement.quantity * int(stock_movement.price)
+    adjust_stock_rollups(db, [(stock_movement.item_id, stock_movement.warehouse_id, delta, value)])
+    db.flush()
+    return new_stock_movement
+
+
+def reverse_movement(db: Session, stock_movement_id: int) -> dict:
+    """
+    Reverse a stock movement by deleting it and undoing its effect on lots and stock levels, without committing.
+
+    - An outflow gives back to each lot exactly the units its allocations took from it,
+      in one statement, and the key's outflows dated on or after it are re-allocated
+      with `reallocate_outflows`, so the lots match a FIFO replay of the ledger.
+    - An inflow can only be reversed while no outflow has taken from its lot.
+    - The stock level is restored, and a movement dated on or before the latest stock
+      snapshot is taken out of the snapshots and the rollups.
+    - Returns the reversed movement, the new stock level and the restored lots.
+    """
+    key = db.execute(
+        select(StockMovement.item_id, StockMovement.warehouse_id).where(StockMovement.id == stock_movement_id)
+    ).first()
+    if key:
+        lock_stock_key(db, key.item_id, key.warehouse_id)
+    # Read again under the lock, as a concurrent request may have reversed it meanwhile.
+    stock_movement = db.get(StockMovement, stock_movement_id, populate_existing=True) if key else None
+    if not stock_movement:
+        raise HTTPException(status_code=404, detail="Stock movement not found.")
+
+    if stock_movement.movement_type == "inflow":
+        if stock_movement.remaining_quantity != stock_movement.quantity:
+            raise HTTPException(
+                status_code=400,
+                detail="Outflows have already taken from this lot. Reverse them first.",
+            )
+        lots = []
+        delta = -stock_movement.quantity
+        value = -stock_movement.quantity * stock_movement.price
+    else:
+        lots = db.execute(
+            update(StockMovement)
+            .where(
+                StockMovement.id == StockMovementAllocation.inflow_id,
+                StockMovementAllocation.outflow_id == stock_movement_id,
+            )
+            .values(remaining_quantity=StockMovement.remaining_quantity + StockMovementAllocation.quantity)
+            .returning(
+                StockMovementAllocation.inflow_id,
+                StockMovementAllocation.quantity,
+                StockMovementAllocation.unit_price,
+            )
+            .execution_options(synchronize_session=False)
+        ).mappings().all()
+        if sum(lot["quantity"] for lot in lots) != stock_movement.quantity:
+            raise HTTPException(status_code=400, detail="The lots this outflow took from are not recorded.")
+        delta = stock_movement.quantity
+        value = sum(lot["quantity"] * lot["unit_price"] for lot in lots)
+
+    reversed_movement = {
+        "id": stock_movement.id,
+        "item_id": stock_movement.item_id,
+        "warehouse_id": stock_movement.warehouse_id,
+        "movement_type": stock_movement.movement_type,
+        "quantity": stock_movement.quantity,
+        "movement_date": stock_movement.movement_date,
+    }
+    # The outflow's allocations are deleted with it.
+    db.delete(stock_movement)
+    db.flush()
+    if reversed_movement["movement_type"] == "outflow":
+        # Later outflows took from younger lots than the ones given back; replay them in FIFO order.
+        value += reallocate_outflows(db, [(key.item_id, key.warehouse_id, reversed_movement["movement_date"])]).get(
+            (key.item_id, key.warehouse_id), 0
+        )
+    stock_level = apply_stock_delta(db, key.item_id, key.warehouse_id, delta)
+    adjust_stock_snapshots(db, [(key.item_id, key.warehouse_id, reversed_movement["movement_date"], delta)])
+    adjust_stock_rollups(db, [(key.item_id, key.warehouse_id, delta, value)])
+    db.flush()
+    return {**reversed_movement, "stock_level": stock_level, "lots": sorted(lots, key=lambda lot: lot["inflow_id"])}
+
+
+def _load_needed_lots(db: Session, needed: dict) -> dict:
+    """
+    Load, for each (item, warehouse) key, the oldest open lots that can cover `needed[key]` units.
+
+    Lots past the running total a key needs can never be reached by its outflows, so they
+    are left in the database. Returns a list of `(sort_key, lot)` pairs per key, where `lot`
+    holds the lot `id`, its `remaining_quantity` and its `price`.
+    """
+    lots = defaultdict(list)
+    if not needed:
+        return lots
+
+    needs = values(
+        column("item_id", Integer), column("warehouse_id", Integer), column("needed", Integer), name="needs"
+    ).data([(item_id, warehouse_id, quantity) for (item_id, warehouse_id), quantity in needed.items()])
+    open_lots = (
+        select(
+            StockMovement.id,
+            StockMovement.item_id,
+            StockMovement.warehouse_id,
+            StockMovement.movement_date,
+            StockMovement.remaining_quantity,
+            StockMovement.price,
+            (
+                func.sum(StockMovement.remaining_quantity).over(
+                    partition_by=(StockMovement.item_id, StockMovement.warehouse_id),
+                    order_by=(StockMovement.movement_date, StockMovement.id),
+                ) - StockMovement.remaining_quantity
+            ).label("consumed_before"),
+        )
+        .where(
+            tuple_(StockMovement.item_id, StockMovement.warehouse_id).in_(list(needed)),
+            StockMovement.remaining_quantity > 0,
+            StockMovement.movement_type == "inflow",
+        )
+        .subquery()
+    )
+    rows = db.execute(
+        select(open_lots.c.id, open_lots.c.item_id, open_lots.c.warehouse_id, open_lots.c.movement_date,
+               open_lots.c.remaining_quantity, open_lots.c.price)
+        .join(needs, (needs.c.item_id == open_lots.c.item_id) & (needs.c.warehouse_id == open_lots.c.warehouse_id))
+        .where(open_lots.c.consumed_before < needs.c.needed)
+        .order_by(open_lots.c.item_id, open_lots.c.warehouse_id, open_lots.c.movement_date, open_lots.c.id)
+    )
+    for lot_id, item_id, warehouse_id, movement_date, remaining, price in rows:
+        # Existing lots sort before lots created by the request on the same date, since their ids are lower.
+        lots[(item_id, warehouse_id)].append(
+            ((movement_date, 0, lot_id), {"id": lot_id, "remaining_quantity": remaining, "price": price})
+        )
+    return lots
+
+
+def record_movements_bulk(db: Session, stock_movements: List[StockMovementBase]) -> List[dict]:
+    """
+    Record many stock movements with a fixed number of statements, without committing.
+
+    - Validates all items and warehouses with one `IN` query each.
+    - Locks every affected (item, warehouse) key, in a fixed order to avoid deadlocks.
+    - Applies the lines of each key in date order, running FIFO in memory over only the
+      open lots the key's outflows can reach. Keys with lines dated before outflows
+      already on the ledger are instead replayed from their first line's date with
+      `reallocate_outflows` once the lines are inserted.
+    - Inserts all movements in one executemany, updates consumed lots in another and
+      records the allocations of the outflows in a third.
+    - Adds movements dated on or before the latest stock snapshot to the snapshots, and the
+      change in stock and lot value of every key to the rollups.
+    - Returns one result per line, in request order.
+    """
+    item_ids = {stock_movement.item_id for stock_movement in stock_movements}
+    warehouse_ids = {stock_movement.warehouse_id for stock_movement in stock_movements}
+    known_items = set(db.scalars(select(Item.id).where(Item.id.in_(item_ids))))
+    known_warehouses = set(db.scalars(select(Warehouse.id).where(Warehouse.id.in_(warehouse_ids))))
+
+    lines_by_key = defaultdict(list)
+    needed = defaultdict(int)
+    for line, stock_movement in enumerate(stock_movements):
+        if stock_movement.item_id not in known_items:
+            raise HTTPException(status_code=404, detail=f"Line {line}: Item not found.")
+        if stock_movement.warehouse_id not in known_warehouses:
+            raise HTTPException(status_code=404, detail=f"Line {line}: Warehouse not found.")
+        if stock_movement.movement_type not in ("inflow", "outflow"):
+            raise HTTPException(status_code=400, detail=f"Line {line}: Movement type must be 'inflow' or 'outflow'.")
+        key = (stock_movement.item_id, stock_movement.warehouse_id)
+        lines_by_key[key].append(line)
+        if stock_movement.movement_type == "outflow":
+            needed[key] += stock_movement.quantity
+
+    for key in sorted(lines_by_key):
+        lock_stock_key(db, *key)
+    first_dates = {key: min(stock_movements[line].movement_date for line in lines) for key, lines in lines_by_key.items()}
+    replayed_keys = backdated_keys(db, first_dates)
+    lots_by_key = _load_needed_lots(db, {key: quantity for key, quantity in needed.items() if key not in replayed_keys})
+
+    new_rows = [None] * len(stock_movements)
+    lot_updates = {}
+    allocations = []
+    stock_deltas = {}
+    for key, lines in lines_by_key.items():
+        lots = lots_by_key[key]
+        delta = 0
+        for line in sorted(lines, key=lambda line: (stock_movements[line].movement_date, line)):
+            stock_movement = stock_movements[line]
+            row = {**stock_movement.model_dump(), "remaining_quantity": 0}
+            new_rows[line] = row
+            if stock_movement.movement_type == "inflow":
+                # The new movement row doubles as the lot, so later outflows update it before it is inserted.
+                row["remaining_quantity"] = stock_movement.quantity
+                insort(lots, ((stock_movement.movement_date, 1, line), row), key=lambda lot: lot[0])
+                delta += stock_movement.quantity
+                continue
+
+            if key in replayed_keys:
+                # Allocated with the outflows already on the ledger once the rows are inserted.
+                delta -= stock_movement.quantity
+                continue
+
+            remaining_quantity = stock_movement.quantity
+            exhausted = 0
+            for (lot_date, _, lot_ref), lot in lots:
+                if remaining_quantity <= 0 or lot_date >= stock_movement.movement_date:
+                    break
+                taken = min(lot["remaining_quantity"], remaining_quantity)
+                lot["remaining_quantity"] -= taken
+                remaining_quantity -= taken
+                # Lots of this request are referenced by their line until their ids are known.
+                allocations.append((line, lot_ref, "id" not in lot, taken, lot["price"]))
+                if "id" in lot:
+                    lot_updates[lot["id"]] = lot
+                if lot["remaining_quantity"] == 0:
+                    exhausted += 1
+            if remaining_quantity > 0:
+                raise HTTPException(status_code=400, detail=f"Line {line}: Not enough stock available for outflow.")
+            del lots[:exhausted]
+            delta -= stock_movement.quantity
+        stock_deltas[key] = delta
+
+    inserted = db.execute(
+        insert(StockMovement).returning(StockMovement.id, StockMovement.price, sort_by_parameter_order=True),
+        new_rows,
+    ).all()
+    new_ids = [new_id for new_id, _ in inserted]
+    # Lots are valued and costed at their prices as stored.
+    new_prices = [price for _, price in inserted]
+    value_changes = defaultdict(int)
+    for row, price in zip(new_rows, new_prices):
+        if row["movement_type"] == "inflow":
+            value_changes[(row["item_id"], row["warehouse_id"])] += row["quantity"] * price
+    if lot_updates:
+        db.execute(update(StockMovement), [
+            {"id": lot["id"], "remaining_quantity": lot["remaining_quantity"]} for lot in lot_updates.values()
+        ])
+    if allocations:
+        allocation_rows = []
+        for line, lot_ref, new_lot, taken, price in allocations:
+            unit_price = new_prices[lot_ref] if new_lot else price
+            allocation_rows.append({
+                "outflow_id": new_ids[line],
+                "inflow_id": new_ids[lot_ref] if new_lot else lot_ref,
+                "quantity": taken,
+                "unit_price": unit_price,
+            })
+            value_changes[(stock_movements[line].item_id, stock_movements[line].warehouse_id)] -= taken * unit_price
+        db.execute(insert(StockMovementAllocation), allocation_rows)
+    if replayed_keys:
+        for key, value in reallocate_outflows(db, [(*key, first_dates[key]) for key in sorted(replayed_keys)]).items():
+            value_changes[key] += value
+        replayed_rows = {
+            new_id: row for new_id, row in zip(new_ids, new_rows) if (row["item_id"], row["warehouse_id"]) in replayed_keys
+        }
+        for new_id, remaining_quantity in db.execute(
+            select(StockMovement.id, StockMovement.remaining_quantity).where(StockMovement.id.in_(replayed_rows))
+        ):
+            replayed_rows[new_id]["remaining_quantity"] = remaining_quantity
+    for (item_id, warehouse_id), delta in sorted(stock_deltas.items()):
+        apply_stock_delta(db, item_id, warehouse_id, delta)
+    daily_deltas = defaultdict(int)
+    for row in new_rows:
+        day = (row["item_id"], row["warehouse_id"], row["movement_date"])
+        daily_deltas[day] += row["quantity"] if row["movement_type"] == "inflow" else -row["quantity"]
+    adjust_stock_snapshots(db, [(*day, delta) for day, delta in daily_deltas.items()])
+    adjust_stock_rollups(db, [(*key, delta, value_changes[key]) for key, delta in sorted(stock_deltas.items())])
+    db.flush()
+
+    return [
+        {
+            "line": line,
+            "id": new_id,
+            "movement_type": row["movement_type"],
+            "quantity": row["quantity"],
+            "remaining_quantity": row["remaining_quantity"],
+        }
+        for line, (new_id, row) in enumerate(zip(new_ids, new_rows))
+    ]
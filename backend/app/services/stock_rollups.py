@@ -0,0 +1,238 @@
+from typing import List, Optional, Union
+
+from core import connection_slot
+from models import (Category, Item, Stock, StockCategoryRollup,
+                    StockItemRollup, StockMovement, StockWarehouseRollup,
+                    Warehouse)
+from sqlalchemy import (ARRAY, BigInteger, Integer, Select, Subquery, and_,
+                        bindparam, cast, delete, func, insert, literal, or_,
+                        select)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .stock_snapshots import SNAPSHOT_LOCK_KEY
+from .valuation import check_valuation_group
+
+# The rollup table, its key column and the table the key refers to, per grouping.
+ROLLUPS = {
+    "item": (StockItemRollup, StockItemRollup.item_id, Item),
+    "warehouse": (StockWarehouseRollup, StockWarehouseRollup.warehouse_id, Warehouse),
+    "category": (StockCategoryRollup, StockCategoryRollup.category_id, Category),
+}
+
+# Warehouse and category totals are spread over this many rows per group.
+ROLLUP_SLOTS = 64
+CONNECTION_SLOT = connection_slot(ROLLUP_SLOTS)
+
+
+def _rollup_upserts(changes: Subquery) -> list:
+    """
+    Build the upserts adding `changes` to the item, warehouse and category rollups, in lock order.
+    """
+    upserts = []
+    for group_by, group_id in (
+        ("item", changes.c.item_id),
+        ("warehouse", changes.c.warehouse_id),
+        ("category", Item.category_id),
+    ):
+        rollup, key, _ = ROLLUPS[group_by]
+        sums = (func.sum(changes.c.quantity), func.sum(changes.c.value))
+        if group_by == "item":
+            columns, totals = [key.name, "quantity", "value"], select(group_id, *sums)
+        else:
+            columns, totals = [key.name, "slot", "quantity", "value"], select(group_id, CONNECTION_SLOT, *sums)
+        totals = totals.select_from(changes)
+        if group_by == "category":
+            # Read after the item rollup was updated, so a concurrent category move has committed.
+            totals = totals.join(Item, Item.id == changes.c.item_id).where(Item.category_id.is_not(None))
+        # On the table rather than the model, so the bound arrays are not taken for bulk insert rows.
+        table = rollup.__table__
+        upsert = pg_insert(table).from_select(columns, totals.group_by(group_id).order_by(group_id))
+        upserts.append(upsert.on_conflict_do_update(
+            index_elements=columns[:-2],
+            set_={"quantity": table.c.quantity + upsert.excluded.quantity, "value": table.c.value + upsert.excluded.value},
+        ))
+    return upserts
+
+
+# Built once over four bound arrays, as building them costs more than running them for a single movement.
+_CHANGE_ROW_UPSERTS = _rollup_upserts(
+    select(
+        func.unnest(bindparam("item_ids", type_=ARRAY(Integer))).label("item_id"),
+        func.unnest(bindparam("warehouse_ids", type_=ARRAY(Integer))).label("warehouse_id"),
+        func.unnest(bindparam("quantities", type_=ARRAY(BigInteger))).label("quantity"),
+        func.unnest(bindparam("lot_values", type_=ARRAY(BigInteger))).label("value"),
+    ).subquery("changes")
+)
+
+
+def adjust_stock_rollups(db: Session, changes: Union[Subquery, List[tuple]]):
+    """
+    Add changes of stock levels and lot values to the item, warehouse and category rollups.
+
+    `changes` is a list of `(item_id, warehouse_id, quantity, value)` tuples, or a subquery
+    with those columns, where `value` is the change in units times lot price of the key's
+    open lots. One upsert per rollup table adds up the changes per group.
+
+    Every key's rows are locked item first, then warehouse, then category, each in id
+    order, so writers never deadlock on them. Only the item row is shared with other
+    connections; warehouse and category totals go to the connection's slot. A
+    transaction should make a single call, or later calls should only touch groups it
+    already locked; callers make it their last write so the locks are held until the
+    commit only.
+    """
+    if isinstance(changes, list):
+        if not changes:
+            return
+        item_ids, warehouse_ids, quantities, values = (list(column) for column in zip(*changes))
+        params = {"item_ids": item_ids, "warehouse_ids": warehouse_ids, "quantities": quantities, "lot_values": values}
+        upserts = _CHANGE_ROW_UPSERTS
+    else:
+        params, upserts = {}, _rollup_upserts(changes)
+    for upsert in upserts:
+        db.execute(upsert, params)
+
+
+def move_item_rollup(db: Session, item_id: int, old_category_id: Optional[int], new_category_id: Optional[int]):
+    """
+    Move the totals of an item from the rollup of its old category to the one of its new category.
+
+    The item's rollup row is created if missing and locked first, so movements of the item
+    that commit meanwhile are counted either before the move, under the old category, or
+    after it, under the new one.
+    """
+    upsert = pg_insert(StockItemRollup).values(item_id=item_id, quantity=0, value=0)
+    totals = db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=[StockItemRollup.item_id],
+            set_={"quantity": StockItemRollup.quantity},
+        )
+        .returning(StockItemRollup.quantity, StockItemRollup.value)
+    ).one()
+    moves = {}
+    if old_category_id is not None:
+        moves[old_category_id] = (-totals.quantity, -totals.value)
+    if new_category_id is not None:
+        moves[new_category_id] = (totals.quantity, totals.value)
+    if not (totals.quantity or totals.value) or not moves:
+        return
+
+    upsert = pg_insert(StockCategoryRollup).values([
+        {"category_id": category_id, "slot": CONNECTION_SLOT, "quantity": quantity, "value": value}
+        for category_id, (quantity, value) in sorted(moves.items())
+    ])
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[StockCategoryRollup.category_id, StockCategoryRollup.slot],
+        set_={
+            "quantity": StockCategoryRollup.quantity + upsert.excluded.quantity,
+            "value": StockCategoryRollup.value + upsert.excluded.value,
+        },
+    ))
+
+
+def stock_summary_query(group_by: str, group_id: int) -> Select:
+    """
+    Select the id, units on hand and their value of one item, warehouse or category from its rollup.
+
+    A primary key lookup of at most `ROLLUP_SLOTS` rows, whatever the number of stock rows.
+    Selects no row if the item, warehouse or category does not exist, and zeros if it has
+    nothing on hand.
+    """
+    check_valuation_group(group_by)
+    rollup, key, target = ROLLUPS[group_by]
+    return (
+        select(
+            target.id,
+            cast(func.coalesce(func.sum(rollup.quantity), 0), BigInteger).label("quantity"),
+            cast(func.coalesce(func.sum(rollup.value), 0), BigInteger).label("value"),
+        )
+        .outerjoin(rollup, key == target.id)
+        .where(target.id == group_id)
+        .group_by(target.id)
+    )
+
+
+def expected_rollup_query(group_by: str) -> Select:
+    """
+    Select the units on hand and their value per item, warehouse or category from the base tables.
+
+    Quantities are summed from `stock` and values from the open inflow lots, which is what
+    the rollups must hold. Groups with nothing on hand are left out.
+    """
+    check_valuation_group(group_by)
+    lots = (
+        select(
+            StockMovement.item_id,
+            StockMovement.warehouse_id,
+            func.sum(StockMovement.remaining_quantity * StockMovement.price).label("value"),
+        )
+        .where(StockMovement.movement_type == "inflow", StockMovement.remaining_quantity > 0)
+        .group_by(StockMovement.item_id, StockMovement.warehouse_id)
+        .subquery()
+    )
+    group_id = {"item": Stock.item_id, "warehouse": Stock.warehouse_id, "category": Item.category_id}[group_by]
+    quantity = func.sum(Stock.stock_level)
+    value = func.sum(func.coalesce(lots.c.value, 0))
+    return (
+        select(group_id.label("id"), quantity.label("quantity"), value.label("value"))
+        .select_from(Stock)
+        .join(Item, Item.id == Stock.item_id)
+        .outerjoin(lots, and_(lots.c.item_id == Stock.item_id, lots.c.warehouse_id == Stock.warehouse_id))
+        .where(group_id.is_not(None))
+        .group_by(group_id)
+        .having(or_(quantity != 0, value != 0))
+    )
+
+
+def stock_rollup_differences(db: Session, group_by: str) -> List[dict]:
+    """
+    Compare the rollups of one grouping with the base tables.
+
+    Returns one row per group whose rollup differs from `expected_rollup_query`, with the
+    expected and the stored `quantity` and `value`, ordered by id. A group missing on one
+    side counts as zero there.
+    """
+    rollup, key, _ = ROLLUPS[group_by]
+    expected = expected_rollup_query(group_by).subquery("expected")
+    stored = (
+        select(key.label("id"), func.sum(rollup.quantity).label("quantity"), func.sum(rollup.value).label("value"))
+        .group_by(key)
+        .subquery("stored")
+    )
+    group_id = func.coalesce(expected.c.id, stored.c.id)
+    return db.execute(
+        select(
+            group_id.label("id"),
+            func.coalesce(expected.c.quantity, 0).label("expected_quantity"),
+            func.coalesce(stored.c.quantity, 0).label("quantity"),
+            func.coalesce(expected.c.value, 0).label("expected_value"),
+            func.coalesce(stored.c.value, 0).label("value"),
+        )
+        .select_from(expected)
+        .join(stored, stored.c.id == expected.c.id, full=True)
+        .where(or_(
+            func.coalesce(expected.c.quantity, 0) != func.coalesce(stored.c.quantity, 0),
+            func.coalesce(expected.c.value, 0) != func.coalesce(stored.c.value, 0),
+        ))
+        .order_by(group_id)
+    ).mappings().all()
+
+
+def rebuild_stock_rollups(db: Session):
+    """
+    Recompute every rollup from the base tables, without committing.
+
+    Takes the snapshot lock exclusively, like a stock snapshot, so no movement writes
+    while the rollups are replaced. Warehouse and category totals go to slot 0.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(SNAPSHOT_LOCK_KEY)))
+    for group_by, (rollup, key, _) in ROLLUPS.items():
+        expected = expected_rollup_query(group_by).subquery("expected")
+        db.execute(delete(rollup))
+        if group_by == "item":
+            db.execute(insert(rollup).from_select([key.name, "quantity", "value"], select(expected)))
+        else:
+            db.execute(insert(rollup).from_select(
+                [key.name, "slot", "quantity", "value"],
+                select(expected.c.id, literal(0), expected.c.quantity, expected.c.value),
+            ))
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Union
+
+from core import SessionLocal, settings
+from models import Stock, StockMovement, StockSnapshot, StockSnapshotRun
+from sqlalchemy import (Date, Integer, Select, Subquery, and_, case, column,
+                        func, insert, literal, select, union_all, values)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("uvicorn")
+
+# Movement writers hold this advisory lock shared, the snapshot job exclusively, so a
+# snapshot never misses a backdated movement that commits while it is being taken.
+SNAPSHOT_LOCK_KEY = 0x736E617073686F74
+
+signed_quantity = case(
+    (StockMovement.movement_type == "inflow", StockMovement.quantity),
+    else_=-StockMovement.quantity,
+)
+
+
+def take_stock_snapshot(db: Session, snapshot_date: date) -> Optional[int]:
+    """
+    Store the stock level of every item and warehouse at the end of `snapshot_date`, without committing.
+
+    The levels are the current `stock` levels minus the movements dated after the
+    snapshot date, so a snapshot of a recent day reads few movements. Levels of zero
+    are not stored. Returns the number of stored levels, or None if the date already
+    has a snapshot.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(SNAPSHOT_LOCK_KEY)))
+    if db.get(StockSnapshotRun, snapshot_date):
+        return None
+
+    later = (
+        select(StockMovement.item_id, StockMovement.warehouse_id, func.sum(signed_quantity).label("delta"))
+        .where(StockMovement.movement_date > snapshot_date)
+        .group_by(StockMovement.item_id, StockMovement.warehouse_id)
+        .subquery()
+    )
+    level = Stock.stock_level - func.coalesce(later.c.delta, 0)
+    levels = (
+        select(literal(snapshot_date, Date), Stock.item_id, Stock.warehouse_id, level)
+        .outerjoin(later, and_(later.c.item_id == Stock.item_id, later.c.warehouse_id == Stock.warehouse_id))
+        .where(level != 0)
+    )
+
+    run = StockSnapshotRun(snapshot_date=snapshot_date, taken_at=datetime.now(timezone.utc), keys=0)
+    db.add(run)
+    db.flush()
+    run.keys = db.execute(
+        insert(StockSnapshot).from_select(["snapshot_date", "item_id", "warehouse_id", "stock_level"], levels)
+    ).rowcount
+    db.flush()
+    return run.keys
+
+
+def adjust_stock_snapshots(db: Session, changes: Union[Subquery, List[tuple]]):
+    """
+    Add backdated stock changes to the snapshots taken on or after their date.
+
+    `changes` is a list of `(item_id, warehouse_id, movement_date, delta)` tuples, or a
+    subquery with those columns. Changes dated after the latest snapshot, which is
+    nearly all of them, match no snapshot and leave the table untouched.
+    """
+    if isinstance(changes, list):
+        if not changes:
+            return
+        changes = values(
+            column("item_id", Integer), column("warehouse_id", Integer),
+            column("movement_date", Date), column("delta", Integer),
+            name="changes",
+        ).data(changes)
+
+    adjusted = (
+        select(
+            StockSnapshotRun.snapshot_date,
+            changes.c.item_id,
+            changes.c.warehouse_id,
+            func.sum(changes.c.delta),
+        )
+        .join(changes, StockSnapshotRun.snapshot_date >= changes.c.movement_date)
+        .group_by(StockSnapshotRun.snapshot_date, changes.c.item_id, changes.c.warehouse_id)
+    )
+    upsert = pg_insert(StockSnapshot).from_select(["snapshot_date", "item_id", "warehouse_id", "stock_level"], adjusted)
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[StockSnapshot.snapshot_date, StockSnapshot.item_id, StockSnapshot.warehouse_id],
+        set_={"stock_level": StockSnapshot.stock_level + upsert.excluded.stock_level},
+    ))
+
+
+def latest_snapshot_query(as_of: date) -> Select:
+    """The date of the latest snapshot on or before `as_of`, or NULL if there is none."""
+    return select(func.max(StockSnapshotRun.snapshot_date)).where(StockSnapshotRun.snapshot_date <= as_of)
+
+
+def stock_as_of_query(
+    as_of: date,
+    snapshot_date: Optional[date],
+    item_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+) -> Select:
+    """
+    Select the stock levels at the end of `as_of`, starting from the snapshot of `snapshot_date`.
+
+    Only the movements dated after the snapshot and up to `as_of` are read, so the
+    cost grows with the gap between the two dates rather than with the ledger. Without
+    a snapshot the whole ledger up to `as_of` is replayed. Levels of zero are left out;
+    rows are ordered by item and warehouse.
+    """
+    movements = select(
+        StockMovement.item_id, StockMovement.warehouse_id, signed_quantity.label("stock_level")
+    ).where(StockMovement.movement_date <= as_of)
+    if snapshot_date is not None:
+        movements = movements.where(StockMovement.movement_date > snapshot_date)
+    if item_id:
+        movements = movements.where(StockMovement.item_id == item_id)
+    if warehouse_id:
+        movements = movements.where(StockMovement.warehouse_id == warehouse_id)
+    parts = [movements]
+
+    if snapshot_date is not None:
+        snapshot = select(StockSnapshot.item_id, StockSnapshot.warehouse_id, StockSnapshot.stock_level).where(
+            StockSnapshot.snapshot_date == snapshot_date
+        )
+        if item_id:
+            snapshot = snapshot.where(StockSnapshot.item_id == item_id)
+        if warehouse_id:
+            snapshot = snapshot.where(StockSnapshot.warehouse_id == warehouse_id)
+        parts.append(snapshot)
+
+    levels = union_all(*parts).subquery()
+    stock_level = func.sum(levels.c.stock_level)
+    return (
+        select(levels.c.item_id, levels.c.warehouse_id, stock_level.label("stock_level"))
+        .group_by(levels.c.item_id, levels.c.warehouse_id)
+        .having(stock_level != 0)
+        .order_by(levels.c.item_id, levels.c.warehouse_id)
+    )
+
+
+def take_daily_snapshot() -> Optional[int]:
+    """Take the snapshot of yesterday, unless another worker already did."""
+    snapshot_date = date.today() - timedelta(days=1)
+    with SessionLocal() as db:
+        # Checked before taking the lock too, as the lock briefly holds up movement writers.
+        if db.get(StockSnapshotRun, snapshot_date):
+            return None
+        keys = take_stock_snapshot(db, snapshot_date)
+        db.commit()
+    if keys is not None:
+        logger.info(f"Stock snapshot of {snapshot_date} taken: {keys} stock levels")
+    return keys
+
+
+async def run_snapshot_schedule():
+    """Take the daily stock snapshot whenever it is missing, checking every `STOCK_SNAPSHOT_CHECK_INTERVAL` seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(take_daily_snapshot)
+        except Exception as e:
+            logger.error(f"Error taking the daily stock snapshot: {e}")
+        await asyncio.sleep(settings.STOCK_SNAPSHOT_CHECK_INTERVAL)
@@ -0,0 +1,225 @@
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date
+from typing import Dict, List, Tuple
+
+from core import settings
+from fastapi import HTTPException
+from models import Item, Stock, StockMovement, StockMovementAllocation
+from sqlalchemy import and_, func, select, true, tuple_
+from sqlalchemy.orm import Session
+
+VALUATION_GROUPS = ("item", "warehouse", "category")
+MAX_FILTERED_KEYS = 1000  # With more stale keys, every key is recomputed in one scan instead
+COGS_CACHE_RANGES = 32  # Date ranges whose COGS are kept per worker process
+
+Key = Tuple[int, int]
+
+
+class KeyedFigureCache:
+    """
+    Figures per (item, warehouse) key, tagged with the `stock.version` they were computed at.
+
+    Every movement bumps the version of its key, so an entry stays valid until a movement
+    touches that key, in any worker process, without any invalidation messages. Stock
+    rows are never deleted, so the cache holds at most one entry per key.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: Dict[Key, tuple] = {}
+
+    def split(self, versions: Dict[Key, int]) -> Tuple[Dict[Key, tuple], List[Key]]:
+        """Return the cached figures of the keys still at their version, and the keys that are stale."""
+        with self._lock:
+            entries = dict(self._entries) if self.enabled else {}
+        fresh, stale = {}, []
+        for key, version in versions.items():
+            entry = entries.get(key)
+            if entry is not None and entry[0] == version:
+                fresh[key] = entry[1]
+            else:
+                stale.append(key)
+        return fresh, stale
+
+    def update(self, entries: Dict[Key, tuple]):
+        """Store `(version, figures)` entries."""
+        if self.enabled:
+            with self._lock:
+                self._entries.update(entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+valuation_cache = KeyedFigureCache(settings.VALUATION_CACHE_ENABLED)
+_cogs_caches: "OrderedDict[Tuple[date, date], KeyedFigureCache]" = OrderedDict()
+_cogs_caches_lock = threading.Lock()
+
+
+def _cogs_cache(date_from: date, date_to: date) -> KeyedFigureCache:
+    """The COGS cache of one date range, evicting the least recently used ranges."""
+    with _cogs_caches_lock:
+        cache = _cogs_caches.get((date_from, date_to))
+        if cache is None:
+            cache = _cogs_caches[(date_from, date_to)] = KeyedFigureCache(settings.VALUATION_CACHE_ENABLED)
+            while len(_cogs_caches) > COGS_CACHE_RANGES:
+                _cogs_caches.popitem(last=False)
+        _cogs_caches.move_to_end((date_from, date_to))
+        return cache
+
+
+def clear_valuation_caches():
+    """Drop the cached valuation and COGS figures of this worker process."""
+    valuation_cache.clear()
+    with _cogs_caches_lock:
+        _cogs_caches.clear()
+
+
+def check_valuation_group(group_by: str):
+    """Reject unsupported groupings with a 400 error."""
+    if group_by not in VALUATION_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Unsupported grouping. Use one of: {', '.join(VALUATION_GROUPS)}.")
+
+
+def _stock_keys(db: Session) -> Dict[Key, tuple]:
+    """The version and item category of every stock key."""
+    rows = db.execute(
+        select(Stock.item_id, Stock.warehouse_id, Stock.version, Item.category_id).join(Item, Item.id == Stock.item_id)
+    )
+    return {(item_id, warehouse_id): (version, category_id) for item_id, warehouse_id, version, category_id in rows}
+
+
+def _key_filter(columns, stale: List[Key]):
+    """Restrict a query to the stale keys, or not at all if there are too many to list."""
+    if len(stale) > MAX_FILTERED_KEYS:
+        return true()
+    return tuple_(*columns).in_(stale)
+
+
+def _open_lot_figures(db: Session, stale: List[Key]) -> Dict[Key, tuple]:
+    """Units on hand and their value at FIFO cost per key, with the version they were read at."""
+    lots = (
+        select(
+            StockMovement.item_id,
+            StockMovement.warehouse_id,
+            func.sum(StockMovement.remaining_quantity).label("quantity"),
+            func.sum(StockMovement.remaining_quantity * StockMovement.price).label("value"),
+        )
+        .where(
+            StockMovement.movement_type == "inflow",
+            StockMovement.remaining_quantity > 0,
+            _key_filter((StockMovement.item_id, StockMovement.warehouse_id), stale),
+        )
+        .group_by(StockMovement.item_id, StockMovement.warehouse_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            Stock.item_id, Stock.warehouse_id, Stock.version,
+            func.coalesce(lots.c.quantity, 0), func.coalesce(lots.c.value, 0),
+        )
+        .outerjoin(lots, and_(lots.c.item_id == Stock.item_id, lots.c.warehouse_id == Stock.warehouse_id))
+        .where(_key_filter((Stock.item_id, Stock.warehouse_id), stale))
+    )
+    return {(item_id, warehouse_id): (version, (int(quantity), float(value))) for item_id, warehouse_id, version, quantity, value in rows}
+
+
+def _cogs_figures(db: Session, date_from: date, date_to: date, stale: List[Key]) -> Dict[Key, tuple]:
+    """
+    Units shipped between the dates and their cost at FIFO per key, with the version they were read at.
+
+    Each outflow of the range is costed with its allocations, the units it took from each
+    lot at that lot's price, so only the outflows of the range are read.
+    """
+    costs = (
+        select(
+            StockMovement.item_id,
+            StockMovement.warehouse_id,
+            func.sum(StockMovementAllocation.quantity).label("quantity"),
+            func.sum(StockMovementAllocation.quantity * StockMovementAllocation.unit_price).label("cost"),
+        )
+        .join(StockMovementAllocation, StockMovementAllocation.outflow_id == StockMovement.id)
+        .where(
+            StockMovement.movement_type == "outflow",
+            StockMovement.movement_date >= date_from,
+            StockMovement.movement_date <= date_to,
+            _key_filter((StockMovement.item_id, StockMovement.warehouse_id), stale),
+        )
+        .group_by(StockMovement.item_id, StockMovement.warehouse_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            Stock.item_id, Stock.warehouse_id, Stock.version,
+            func.coalesce(costs.c.quantity, 0), func.coalesce(costs.c.cost, 0),
+        )
+        .outerjoin(costs, and_(costs.c.item_id == Stock.item_id, costs.c.warehouse_id == Stock.warehouse_id))
+        .where(_key_filter((Stock.item_id, Stock.warehouse_id), stale))
+    )
+    return {(item_id, warehouse_id): (version, (int(quantity), float(cost))) for item_id, warehouse_id, version, quantity, cost in rows}
+
+
+def _figures(db: Session, cache: KeyedFigureCache, compute) -> Tuple[Dict[Key, tuple], Dict[Key, tuple]]:
+    """The stock keys and their figures, recomputing with `compute(stale)` only the keys whose version changed."""
+    keys = _stock_keys(db)
+    figures, stale = cache.split({key: version for key, (version, _) in keys.items()})
+    if stale:
+        computed = compute(stale)
+        cache.update(computed)
+        figures.update((key, entry[1]) for key, entry in computed.items())
+    return keys, figures
+
+
+def _grouped(keys: Dict[Key, tuple], figures: Dict[Key, tuple], group_by: str) -> dict:
+    """Add up per-key `(quantity, value)` figures by item, warehouse or category."""
+    groups = defaultdict(lambda: [0, 0.0])
+    for key, (quantity, value) in figures.items():
+        if not quantity and not value:
+            continue
+        if group_by == "item":
+            group_id = key[0]
+        elif group_by == "warehouse":
+            group_id = key[1]
+        else:
+            group_id = keys.get(key, (None, None))[1]
+        groups[group_id][0] += quantity
+        groups[group_id][1] += value
+    rows = [
+        {"id": group_id, "quantity": quantity, "value": value}
+        for group_id, (quantity, value) in sorted(groups.items(), key=lambda group: (group[0] is None, group[0] or 0))
+    ]
+    return {
+        "group_by": group_by,
+        "quantity": sum(row["quantity"] for row in rows),
+        "value": sum(row["value"] for row in rows),
+        "groups": rows,
+    }
+
+
+def stock_valuation(db: Session, group_by: str) -> dict:
+    """
+    Value the units on hand at FIFO cost, i.e. the price of the open lots they remain in.
+
+    The figures of each (item, warehouse) key are cached until a movement bumps the key's
+    version; only stale keys are recomputed, with one set-based query.
+    """
+    check_valuation_group(group_by)
+    keys, figures = _figures(db, valuation_cache, lambda stale: _open_lot_figures(db, stale))
+    return _grouped(keys, figures, group_by)
+
+
+def cost_of_goods_sold(db: Session, date_from: date, date_to: date, group_by: str) -> dict:
+    """
+    Compute the FIFO cost of the units shipped from `date_from` to `date_to`, inclusive.
+
+    Cached per date range and key like `stock_valuation`.
+    """
+    check_valuation_group(group_by)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="The start date must not be after the end date.")
+    cache = _cogs_cache(date_from, date_to)
+    keys, figures = _figures(db, cache, lambda stale: _cogs_figures(db, date_from, date_to, stale))
+    return {"date_from": date_from, "date_to": date_to, **_grouped(keys, figures, group_by)}
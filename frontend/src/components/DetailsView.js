@@ -46,7 +46,9 @@ const DetailsView = ({
 
     const fetchStock = async () => {
       try {
-        const response = await api.get(`${stockApiEndpoint}/${id}`);
+        const response = await api.get(`${stockApiEndpoint}/${id}`, {
+          params: { expand: "item" },
+        });
         setStock(response.data);
       } catch (error) {
         console.error(`Error fetching ${title.toLowerCase()} stock:`, error);
@@ -39,7 +39,7 @@ const ItemDetails = () => {
 
   const fetchStockEntries = async () => {
     try {
-      const response = await api.get(`/stock/get/item/${id}`);
+      const response = await api.get(`/stock/get/item/${id}`, { params: { expand: "warehouse" } });
       setStocks(response.data);
     } catch (error) {
       console.error("Error fetching stock entries:", error);
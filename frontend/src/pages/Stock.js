@@ -20,7 +20,7 @@ const Stock = () => {
 
   const fetchStockEntries = async () => {
     try {
-      const response = await api.get(`/stock/get`);
+      const response = await api.get(`/stock/get`, { params: { expand: "item,warehouse" } });
       setStocks(response.data);
     } catch (error) {
       console.error("Error fetching stock entries:", error);
@@ -24,7 +24,9 @@ const StockMovement = () => {
 
   const fetchStockMovements = async () => {
     try {
-      const response = await api.get(`/stock/movement/get`);
+      const response = await api.get(`/stock/movement/get`, {
+        params: { expand: "item,warehouse" },
+      });
       setMovements(response.data);
     } catch (error) {
       console.error("Error fetching stock movements:", error);